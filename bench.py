@@ -0,0 +1,369 @@
+"""
+Benchmarks for the navigation and rendering hot paths, run against SimulatedDirectOutput.
+
+Each case runs at every entry count given with --sizes and reports operations per second, mean
+latency per operation, DirectOutput calls per operation and, traced with tracemalloc over a
+further ALLOC_OPS operations, the bytes each operation allocates at its peak and retains. Use --output to save the report as
+JSON and --baseline to compare against a saved report: the exit status is 1 if any case lost more
+than --threshold of its throughput, or makes more than --threshold more DLL calls per operation.
+
+	python bench.py --sizes 10,1000 --output baseline.json
+	python bench.py --sizes 10,1000 --baseline baseline.json --threshold 0.2
+"""
+
+from __future__ import absolute_import, with_statement, print_function, division, unicode_literals
+
+import argparse
+import json
+import logging
+import platform
+import os
+import random
+import sys
+import tempfile
+import tracemalloc
+from time import perf_counter
+
+import x52pro
+
+
+DEFAULT_SIZES = (10, 100, 1000, 10000, 100000, 1000000)
+ALLOC_OPS = 200
+
+
+def make_entries(count):
+	"""
+	Returns count distinct entries in a fixed shuffled order, so sorting does real work
+	"""
+	entries = ["Entry {:07d}".format(n) for n in range(count)]
+	random.Random(count).shuffle(entries)
+	return entries
+
+
+class BenchScrollableMfd(x52pro.X52ProScrollableMfd):
+	def __init__(self, entries, **kwargs):
+		self.bench_entries = entries
+		super().__init__(**kwargs)
+
+	def update_mfd_data(self):
+		return self.bench_entries
+
+
+class BenchPageableMfd(x52pro.X52ProPageableMfd):
+	def __init__(self, entries, **kwargs):
+		self.bench_entries = entries
+		super().__init__(**kwargs)
+
+	def update_mfd_data(self):
+		detail = ["-- 1 -----------", "Line 1", "Line 2", "Line 3"]
+		return dict((entry, detail) for entry in self.bench_entries)
+
+
+def measure_allocations(operation, state, start, ops=ALLOC_OPS):
+	"""
+	Runs ops more operations under tracemalloc, returns the mean bytes allocated at the peak of an
+	operation and the mean bytes still allocated after it
+	"""
+	tracemalloc.start()
+	try:
+		before = tracemalloc.get_traced_memory()[0]
+		peaks = 0
+		for n in range(start, start + ops):
+			current = tracemalloc.get_traced_memory()[0]
+			tracemalloc.reset_peak()
+			operation(state, n)
+			peaks += tracemalloc.get_traced_memory()[1] - current
+		retained = tracemalloc.get_traced_memory()[0] - before
+	finally:
+		tracemalloc.stop()
+	return peaks / ops, retained / ops
+
+
+def run_case(name, count, setup, operation, direct_output, budget, max_ops):
+	"""
+	Runs operation until budget seconds have passed or max_ops operations have run, returns the result dict
+	"""
+	state = setup()
+	direct_output.calls.clear()
+	ops = 0
+	started = perf_counter()
+	elapsed = 0.0
+	while ops < max_ops and (ops == 0 or elapsed < budget):
+		operation(state, ops)
+		ops += 1
+		elapsed = perf_counter() - started
+	calls = dict(direct_output.calls)
+	alloc_peak, alloc_retained = measure_allocations(operation, state, ops)
+	return {
+		'case': name,
+		'entries': count,
+		'ops': ops,
+		'seconds': elapsed,
+		'ops_per_sec': ops / elapsed if elapsed else float('inf'),
+		'mean_latency_us': 1e6 * elapsed / ops,
+		'dll_calls_per_op': sum(calls.values()) / ops,
+		'dll_calls': calls,
+		'alloc_peak_bytes_per_op': alloc_peak,
+		'alloc_retained_bytes_per_op': alloc_retained,
+	}
+
+
+def scrollable_cases(count, direct_output):
+	mfd = BenchScrollableMfd(make_entries(count), direct_output=direct_output)
+
+	def scroll(state, n):
+		mfd.onScrollDown()
+		mfd.PageShow()
+
+	def select(state, n):
+		mfd.onScrollSelect()
+		mfd.PageShow()
+
+	def show(state, n):
+		mfd.PageShow()
+
+	yield 'scrollable.scroll', scroll, None
+	yield 'scrollable.select', select, None
+	yield 'scrollable.pageshow', show, None
+	yield None, None, mfd
+
+
+def pageable_cases(count, direct_output):
+	mfd = BenchPageableMfd(make_entries(count), direct_output=direct_output)
+
+	def scroll(state, n):
+		mfd.onScrollDown()
+		mfd.PageShow()
+
+	def select(state, n):
+		# Alternates between opening the detail view and returning to the overview
+		mfd.onScrollSelect()
+		mfd.PageShow()
+
+	def show(state, n):
+		mfd.PageShow()
+
+	yield 'pageable.scroll', scroll, None
+	yield 'pageable.select', select, None
+	yield 'pageable.pageshow', show, None
+	yield None, None, mfd
+
+
+def page_cases(count, direct_output):
+	"""
+	Page operations, count is the number of distinct strings cycled through
+	"""
+	device = x52pro.X52ProOutputDevice(direct_output=direct_output)
+	page = device.add_page("Bench")
+	strings = ["Line {}".format(n) for n in range(min(count, 1000))]
+
+	def setitem(state, n):
+		page[n % 3] = strings[n % len(strings)]
+
+	def setitem_unchanged(state, n):
+		page[1] = strings[0]
+
+	def refresh(state, n):
+		page.invalidate()
+		page.refresh()
+
+	def attention(state, n):
+		# Steps the attention animation directly, one frame per operation
+		state.step(n * x52pro.X52ProMfdDriver.ATTENTION.interval)
+
+	yield 'page.setitem', setitem, None
+	yield 'page.setitem_unchanged', setitem_unchanged, None
+	yield 'page.refresh', refresh, None
+	yield 'driver.attention', attention, lambda: x52pro.LedPlayback(device.scheduler, page, x52pro.X52ProMfdDriver.ATTENTION)
+	yield None, None, device
+
+
+def buttons_cases(count, direct_output):
+	def decode(state, n):
+		x52pro.DirectOutputDevice.Buttons(n & 7)
+
+	yield 'buttons.decode', decode, None
+	yield None, None, None
+
+
+def callback_cases(count, direct_output):
+	"""
+	Soft button and page callbacks as the DLL delivers them, and writes through DirectOutputDevice
+	"""
+	device = x52pro.DirectOutputDevice(direct_output=direct_output)
+	device.AddPage(0, "Bench", 1)
+	strings = ["Line {}".format(n) for n in range(min(count, 1000))]
+
+	def soft_button(state, n):
+		device.onSoftButton_closure(device.device_handle, n & 7, None)
+
+	def page(state, n):
+		device.onPage_closure(device.device_handle, 0, bool(n & 1), None)
+
+	def set_string(state, n):
+		device.SetString(0, n % 3, strings[n % len(strings)])
+
+	def set_led(state, n):
+		device.SetLed(0, n % 20, n & 1)
+
+	yield 'callback.softbutton', soft_button, None
+	yield 'callback.page', page, None
+	yield 'device.setstring', set_string, None
+	yield 'device.setled', set_led, None
+	yield None, None, device
+
+
+def startup_cases(count, direct_output):
+	"""
+	Time to first frame: creating a scrollable MFD of count entries until its ready future is resolved
+	"""
+	entries = make_entries(count)
+
+	def first_frame(state, n):
+		# A fresh simulated device each time, as a new process would see
+		direct_output.devices = {1: direct_output._new_device()}
+		mfd = BenchScrollableMfd(entries, direct_output=direct_output)
+		mfd.ready.result()
+		mfd.finish()
+
+	yield 'startup.first_frame', first_frame, None
+	yield None, None, None
+
+
+def telemetry_cases(count, direct_output):
+	"""
+	TelemetryFeed writes and the reads a page samples it with, over a local buffer
+	"""
+	fields = [("value{}".format(n), "d") for n in range(min(count, 32))]
+	feed = x52pro.TelemetryFeed(bytearray(x52pro.TelemetryFeed.size_of(fields)), fields, create=True)
+	values = [0.0] * len(fields)
+	feed.write(*values)
+
+	def write(state, n):
+		feed.write(*values)
+
+	def read(state, n):
+		feed.read()
+
+	def unchanged(state, n):
+		# What a page costs per frame while its feed is quiet
+		feed.read_changed(feed.sequence)
+
+	yield 'telemetry.write', write, None
+	yield 'telemetry.read', read, None
+	yield 'telemetry.unchanged', unchanged, None
+	yield None, None, None
+
+
+def daemon_cases(count, direct_output):
+	"""
+	Line updates from many clients through a local X52ProDisplayDaemon, count is the number of clients (at most 64)
+	"""
+	address = os.path.join(tempfile.mkdtemp(), "bench.sock") if os.name != 'nt' else r'\\.\pipe\x52pro-bench'
+	daemon = x52pro.X52ProDisplayDaemon(address=address, direct_output=direct_output)
+	clients = [x52pro.X52ProDisplayClient(address) for n in range(min(count, 64))]
+	pages = [client.add_page("Bench", active=n == 0) for n, client in enumerate(clients)]
+	for client in clients:
+		client.sync()
+	strings = ["Line {}".format(n) for n in range(1000)]
+
+	def set_line(state, n):
+		pages[n % len(pages)][n % 3] = strings[n % len(strings)]
+
+	def round_trip(state, n):
+		# A write the daemon has passed to the device by the time the operation ends
+		client = clients[n % len(clients)]
+		pages[n % len(pages)][0] = strings[n % len(strings)]
+		client.sync()
+
+	yield 'daemon.setline', set_line, None
+	yield 'daemon.roundtrip', round_trip, None
+	yield None, None, daemon
+
+
+CASE_GROUPS = {
+	'scrollable': scrollable_cases,
+	'pageable': pageable_cases,
+	'page': page_cases,
+	'buttons': buttons_cases,
+	'callbacks': callback_cases,
+	'startup': startup_cases,
+	'telemetry': telemetry_cases,
+	'daemon': daemon_cases,
+}
+
+
+def run(sizes, groups, budget, max_ops):
+	results = []
+	for group in groups:
+		for count in sizes:
+			direct_output = x52pro.SimulatedDirectOutput()
+			cases = CASE_GROUPS[group](count, direct_output)
+			for name, operation, setup in cases:
+				if name is None:
+					# Last item is the device to shut down
+					if setup is not None:
+						setup.finish()
+					break
+				result = run_case(name, count, setup or (lambda: None), operation, direct_output, budget, max_ops)
+				results.append(result)
+				print("{case:28} {entries:>8} {ops_per_sec:>14.1f} ops/s {mean_latency_us:>12.1f} us {dll_calls_per_op:>6.2f} calls/op {alloc_peak_bytes_per_op:>8.1f} B/op".format(**result), file=sys.stderr)
+	return results
+
+
+def compare(results, baseline, threshold):
+	"""
+	Returns a list of regressions against a baseline report
+	"""
+	previous = dict(((r['case'], r['entries']), r) for r in baseline['results'])
+	regressions = []
+	for result in results:
+		before = previous.get((result['case'], result['entries']))
+		if before is None:
+			continue
+		if result['ops_per_sec'] < before['ops_per_sec'] * (1 - threshold):
+			regressions.append("{case} at {entries}: {ops_per_sec:.1f} ops/s".format(**result) + " was {:.1f}".format(before['ops_per_sec']))
+		if result['dll_calls_per_op'] > before['dll_calls_per_op'] * (1 + threshold) + 1e-9:
+			regressions.append("{case} at {entries}: {dll_calls_per_op:.2f} calls/op".format(**result) + " was {:.2f}".format(before['dll_calls_per_op']))
+	return regressions
+
+
+def main(argv=None):
+	parser = argparse.ArgumentParser(description="Benchmark the MFD navigation and rendering hot paths against a simulated device")
+	parser.add_argument('--sizes', default=",".join(str(size) for size in DEFAULT_SIZES), help="comma separated entry counts")
+	parser.add_argument('--cases', default=",".join(CASE_GROUPS), help="comma separated case groups: " + ", ".join(CASE_GROUPS))
+	parser.add_argument('--budget', type=float, default=0.5, help="seconds to spend on each case")
+	parser.add_argument('--max-ops', type=int, default=100000, help="most operations to run per case")
+	parser.add_argument('--output', help="write the JSON report to this file instead of stdout")
+	parser.add_argument('--baseline', help="JSON report to compare against")
+	parser.add_argument('--threshold', type=float, default=0.2, help="allowed regression as a fraction of the baseline")
+	args = parser.parse_args(argv)
+
+	logging.disable(logging.WARNING)
+	sizes = [int(size) for size in args.sizes.split(",")]
+	groups = args.cases.split(",")
+	results = run(sizes, groups, args.budget, args.max_ops)
+	report = {
+		'python': platform.python_version(),
+		'platform': platform.platform(),
+		'results': results,
+	}
+	if args.output:
+		with open(args.output, 'w') as f:
+			json.dump(report, f, indent=1)
+	else:
+		json.dump(report, sys.stdout, indent=1)
+		print()
+
+	if args.baseline:
+		with open(args.baseline) as f:
+			regressions = compare(results, json.load(f), args.threshold)
+		for regression in regressions:
+			print("REGRESSION: " + regression, file=sys.stderr)
+		if regressions:
+			return 1
+	return 0
+
+
+if __name__ == '__main__':
+	sys.exit(main())
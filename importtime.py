@@ -0,0 +1,98 @@
+"""
+Import time check for the x52pro package, run with python -X importtime in a fresh interpreter.
+
+Imports --module --runs times, each in a new process, and reports the best total and the slowest
+modules it pulled in by cumulative time. The exit status is 1 if a forbidden module was imported
+(by default the DLL binding, asyncio and the display daemon, which the core must not need) or the
+best total is over --budget milliseconds.
+
+	python importtime.py
+	python importtime.py --module x52pro.navigation --budget 50
+"""
+
+from __future__ import absolute_import, with_statement, print_function, division, unicode_literals
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+
+DEFAULT_FORBIDDEN = ('ctypes', 'ctypes.wintypes', 'x52pro.dll', 'asyncio', 'x52pro.async_mfd', 'multiprocessing.connection', 'x52pro.daemon')
+
+
+def parse_importtime(output):
+	"""
+	Returns {module: (self_us, cumulative_us)} from the stderr of python -X importtime
+	"""
+	modules = {}
+	for line in output.splitlines():
+		if not line.startswith("import time:"):
+			continue
+		fields = line[len("import time:"):].split("|")
+		if len(fields) != 3 or not fields[0].strip().isdigit():
+			# The column header
+			continue
+		modules[fields[2].strip()] = (int(fields[0]), int(fields[1]))
+	return modules
+
+
+def measure(module):
+	"""
+	Imports module in a new interpreter, returns the parsed import times
+	"""
+	env = dict(os.environ)
+	# Without bytecode caching the figures would include compiling every module
+	env.pop('PYTHONDONTWRITEBYTECODE', None)
+	result = subprocess.run([sys.executable, "-X", "importtime", "-c", "import " + module],
+		env=env, stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True)
+	if result.returncode != 0:
+		raise RuntimeError("import {} failed:\n{}".format(module, result.stderr))
+	return parse_importtime(result.stderr)
+
+
+def main(argv=None):
+	parser = argparse.ArgumentParser(description="Check the import time and imported modules of the x52pro package")
+	parser.add_argument('--module', default='x52pro', help="module to import")
+	parser.add_argument('--runs', type=int, default=5, help="fresh interpreters to import in, the best is reported")
+	parser.add_argument('--budget', type=float, help="most milliseconds the import may take")
+	parser.add_argument('--forbid', default=",".join(DEFAULT_FORBIDDEN), help="comma separated modules that must not be imported")
+	parser.add_argument('--top', type=int, default=10, help="slowest modules to list")
+	parser.add_argument('--output', help="write the JSON report to this file")
+	args = parser.parse_args(argv)
+
+	# The first run also writes any missing bytecode, so it is not counted
+	measure(args.module)
+	runs = [measure(args.module) for _ in range(args.runs)]
+	best = min(runs, key=lambda modules: modules[args.module][1])
+	total_ms = best[args.module][1] / 1000
+
+	print("import {}: {:.1f} ms, {} modules".format(args.module, total_ms, len(best)), file=sys.stderr)
+	for name, (self_us, cumulative_us) in sorted(best.items(), key=lambda item: -item[1][1])[:args.top]:
+		print("{:40} {:>10} us self {:>10} us cumulative".format(name, self_us, cumulative_us), file=sys.stderr)
+
+	failures = []
+	forbidden = [name for name in args.forbid.split(",") if name]
+	for name in forbidden:
+		if name in best:
+			failures.append("{} imported {}".format(args.module, name))
+	if args.budget is not None and total_ms > args.budget:
+		failures.append("import {} took {:.1f} ms, budget {:.1f} ms".format(args.module, total_ms, args.budget))
+
+	if args.output:
+		with open(args.output, 'w') as f:
+			json.dump({
+				'module': args.module,
+				'total_ms': total_ms,
+				'modules': dict((name, {'self_us': s, 'cumulative_us': c}) for name, (s, c) in best.items()),
+				'failures': failures,
+			}, f, indent=1)
+
+	for failure in failures:
+		print("FAILED: " + failure, file=sys.stderr)
+	return 1 if failures else 0
+
+
+if __name__ == '__main__':
+	sys.exit(main())
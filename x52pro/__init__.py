@@ -0,0 +1,52 @@
+"""
+Python control of the Saitek / Logitech X52 Pro MFD through DirectOutput.dll.
+
+Importing the package loads only pure Python: the text layout, navigation and scheduler modules
+can be used anywhere, without a device. The ctypes binding in x52pro.dll is imported when a
+device is first created without a direct_output backend, or when DirectOutput is looked up here,
+the asyncio front-end when AsyncX52ProMfd is and the display daemon when X52ProDisplayDaemon or
+X52ProDisplayClient is.
+"""
+
+from __future__ import absolute_import, with_statement, print_function, division, unicode_literals
+
+import __future__
+import importlib
+import types
+
+from .constants import *
+from .errors import *
+from .backend import (DirectOutputBackend, InstrumentedDirectOutput, LatencyHistogram, SimulatedDirectOutput)
+from .layout import (MFD_CHARSET, MfdCharset, marquee_frames, normalise_text, wrap_lines, wrap_text)
+from .navigation import (JsonFileDataSource, LineFileDataSource, MfdDataSource, SequenceDataSource, SortedIndex, WindowedCache)
+from .scheduler import (CoalescingTrack, FrameScheduler, LedAnimation, LedPlayback, MarqueeTrack, SoftButtonQueue,
+	TelemetryTrack)
+from .telemetry import TelemetryFeed
+from .device import (DirectOutputDevice, OutputWriter, X52ProDevicePool, X52ProOutputDevice)
+from .driver import (DummyMfdDriver, X52ProMfdDriver)
+from .mfd import (X52ProActionMfd, X52ProDataMfd, X52ProJsonMfd, X52ProJsonPageableMfd, X52ProJsonScrollableMfd,
+	X52ProMfd, X52ProPageableMfd, X52ProProfileMfd, X52ProScrollableMfd, X52ProTreeMfd)
+
+
+# from x52pro import * brings in the asyncio front-end and the display daemon, but not the DLL binding,
+# nor the __future__ features imported above
+__all__ = [name for name, value in list(globals().items())
+	if not name.startswith('_') and not isinstance(value, (types.ModuleType, __future__._Feature))]
+__all__ += ['AsyncX52ProMfd', 'X52ProDisplayClient', 'X52ProDisplayDaemon']
+
+# Imported when first asked for: the DLL binding, and the asyncio front-end and display daemon since
+# asyncio and multiprocessing.connection are slow to import
+_LAZY = {
+	'DirectOutput': 'dll',
+	'WideStringBuffer': 'dll',
+	'AsyncX52ProMfd': 'async_mfd',
+	'X52ProDisplayClient': 'daemon',
+	'X52ProDisplayDaemon': 'daemon',
+}
+
+
+def __getattr__(name):
+	if name in _LAZY:
+		module = importlib.import_module("." + _LAZY[name], __name__)
+		return getattr(module, name)
+	raise AttributeError("module {!r} has no attribute {!r}".format(__name__, name))
@@ -0,0 +1,142 @@
+"""
+asyncio front-end
+"""
+
+from __future__ import absolute_import, with_statement, print_function, division, unicode_literals
+
+import asyncio
+import concurrent.futures
+
+from .device import X52ProOutputDevice
+
+
+class AsyncX52ProMfd(object):
+	"""
+		asyncio front-end for an X52ProOutputDevice page. DirectOutput calls run on a single worker
+		thread so they never block the event loop, and updates made while a call is in flight are
+		merged into the next one, so any number of coroutines can share the device. Soft button and
+		page callbacks are delivered into the loop as async iterators:
+
+			mfd = await AsyncX52ProMfd.open()
+			await mfd.display("Speed", "> 250 kn")
+			async for buttons in mfd.buttons():
+				...
+	"""
+	def __init__(self, device, page_name="Async", loop=None):
+		"""
+		Wraps an existing device. Must be called from the event loop thread unless loop is given.
+		Required Arguments:
+		device -- X52ProOutputDevice to drive
+		Optional Arguments:
+		page_name -- name of the page to display on, added to the device if it doesn't exist
+		loop -- event loop to deliver events to, defaults to the running loop
+		"""
+		self.device = device
+		self.loop = loop or asyncio.get_running_loop()
+		self.page = device.pages.get(page_name) or device.add_page(page_name)
+		self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix="AsyncX52ProMfd")
+		self._pending_lines = None
+		self._pending_leds = {}
+		self._next_flush = None
+		self._flusher = None
+		self._button_queues = set()
+		self._page_queues = set()
+
+		device_on_page = device.OnPage
+
+		def on_page(page_id, activated):
+			device_on_page(page_id, activated)
+			self.loop.call_soon_threadsafe(self._publish, self._page_queues, (page_id, activated))
+
+		def on_soft_button(buttons):
+			self.loop.call_soon_threadsafe(self._publish, self._button_queues, buttons)
+
+		device.OnPage = on_page
+		device.OnSoftButton = on_soft_button
+
+	@classmethod
+	async def open(cls, page_name="Async", **kwargs):
+		"""
+		Creates the X52ProOutputDevice on a worker thread and wraps it. Keyword arguments are passed to X52ProOutputDevice.
+		"""
+		loop = asyncio.get_running_loop()
+		device = await loop.run_in_executor(None, lambda: X52ProOutputDevice(**kwargs))
+		return cls(device, page_name, loop)
+
+	async def display(self, line1, line2="", line3=""):
+		"""
+		Displays up to three lines. Returns once they have been sent, or superseded by a later display() call.
+		"""
+		self._pending_lines = (line1, line2, line3)
+		await self._flush()
+
+	async def set_led(self, led, value):
+		"""
+		Sets LED state. Returns once it has been sent, or superseded by a later call for the same LED.
+		Required Arguments:
+		led -- ID of LED to change
+		value -- True for on, False for off
+		"""
+		self._pending_leds[led] = value
+		await self._flush()
+
+	def _flush(self):
+		if self._next_flush is None:
+			self._next_flush = self.loop.create_future()
+		if self._flusher is None:
+			self._flusher = self.loop.create_task(self._run_flushes())
+		return asyncio.shield(self._next_flush)
+
+	async def _run_flushes(self):
+		try:
+			while self._next_flush is not None:
+				flushed, self._next_flush = self._next_flush, None
+				lines, self._pending_lines = self._pending_lines, None
+				leds, self._pending_leds = self._pending_leds, {}
+				try:
+					await self.loop.run_in_executor(self._executor, self.page.commit, lines, leds)
+				except Exception as e:
+					flushed.set_exception(e)
+				else:
+					flushed.set_result(None)
+		finally:
+			self._flusher = None
+
+	def _publish(self, queues, event):
+		for queue in queues:
+			queue.put_nowait(event)
+
+	def _events(self, queues):
+		# Subscribe now rather than on first iteration, so no event after this call is missed
+		queue = asyncio.Queue()
+		queues.add(queue)
+
+		async def events():
+			try:
+				while True:
+					yield await queue.get()
+			finally:
+				queues.discard(queue)
+
+		return events()
+
+	def buttons(self):
+		"""
+		Returns an async iterator of Buttons objects, one per soft button change from now on
+		"""
+		return self._events(self._button_queues)
+
+	def pages(self):
+		"""
+		Returns an async iterator of (page_id, activated) tuples, one per page change from now on
+		"""
+		return self._events(self._page_queues)
+
+	async def close(self):
+		"""
+		Sends pending updates, then de-initializes the device on the worker thread
+		"""
+		if self._next_flush is not None or self._flusher is not None:
+			await self._flush()
+		await self.loop.run_in_executor(self._executor, self.device.finish)
+		self._executor.shutdown()
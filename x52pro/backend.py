@@ -0,0 +1,502 @@
+"""
+DirectOutput backends: the interface DirectOutputDevice drives, a pure-Python simulator and an
+instrumenting proxy
+"""
+
+from __future__ import absolute_import, with_statement, print_function, division, unicode_literals
+
+import collections
+import logging
+import queue
+import threading
+from time import (monotonic, perf_counter, sleep)
+
+from .constants import *
+
+
+class DirectOutputBackend(object):
+	"""
+		Interface DirectOutputDevice uses to reach a device. DirectOutput implements it on top of
+		DirectOutput.dll, SimulatedDirectOutput in pure Python. Methods return S_OK or an error code,
+		callbacks are plain Python callables with the DLL's argument lists.
+	"""
+	def Initialize(self, application_name):
+		raise NotImplementedError()
+
+	def Deinitialize(self):
+		raise NotImplementedError()
+
+	def RegisterDeviceCallback(self, function):
+		raise NotImplementedError()
+
+	def Enumerate(self, function):
+		raise NotImplementedError()
+
+	def RegisterSoftButtonCallback(self, device_handle, function):
+		raise NotImplementedError()
+
+	def RegisterPageCallback(self, device_handle, function):
+		raise NotImplementedError()
+
+	def SetProfile(self, device_handle, profile):
+		raise NotImplementedError()
+
+	def AddPage(self, device_handle, page, name, active):
+		raise NotImplementedError()
+
+	def RemovePage(self, device_handle, page):
+		raise NotImplementedError()
+
+	def SetLed(self, device_handle, page, led, value):
+		raise NotImplementedError()
+
+	def SetString(self, device_handle, page, line, string):
+		raise NotImplementedError()
+
+
+class SimulatedDirectOutput(DirectOutputBackend):
+	"""
+		Pure-Python DirectOutput backend for running headless. Keeps the lines, LEDs and active page of
+		every page it is given, and answers like the DLL does, including E_PAGENOTACTIVE for writes to
+		a page that isn't active. Device, page and soft button callbacks are fired from the
+		simulator's own thread, as the DLL fires them from its own.
+
+		Optional Arguments:
+		latency -- seconds each call takes, either a number or a dict of method name to seconds
+		devices -- number of devices to present
+	"""
+	def __init__(self, latency=0, devices=1):
+		self.latency = latency
+		self.calls = collections.Counter()
+		self.call_time = collections.Counter()
+		self.devices = {handle: self._new_device() for handle in range(1, devices + 1)}
+		self.profiles = {}
+		self._failures = {}
+		self._device_callback = None
+		self._page_callbacks = {}
+		self._soft_button_callbacks = {}
+		self._lock = threading.RLock()
+		self._events = queue.Queue()
+		self._thread = None
+
+	@staticmethod
+	def _new_device():
+		return {'pages': {}, 'active': None}
+
+	def _call(self, method):
+		"""
+		Counts a call, waits out its latency, and returns an injected error code or None
+		"""
+		self.calls[method] += 1
+		latency = self.latency.get(method, 0) if isinstance(self.latency, dict) else self.latency
+		if latency:
+			started = monotonic()
+			sleep(latency)
+			self.call_time[method] += monotonic() - started
+		with self._lock:
+			failure = self._failures.get(method)
+			if failure:
+				error_code, remaining = failure
+				if remaining is not None:
+					if remaining <= 1:
+						del self._failures[method]
+					else:
+						self._failures[method] = (error_code, remaining - 1)
+				return error_code
+		return None
+
+	def fail(self, method, error_code, count=1):
+		"""
+		Makes the next count calls to method return error_code
+		Required Arguments:
+		method -- name of the DirectOutput method, e.g. "SetString"
+		error_code -- value to return, e.g. E_PAGENOTACTIVE or E_HANDLE
+		Optional Arguments:
+		count -- number of calls to fail, None fails every call until fail() is called again with count=0
+		"""
+		with self._lock:
+			if count == 0:
+				self._failures.pop(method, None)
+			else:
+				self._failures[method] = (error_code, count)
+
+	def _page(self, device_handle, page):
+		"""
+		Returns (error_code, page state)
+		"""
+		device = self.devices.get(device_handle)
+		if device is None:
+			return E_HANDLE, None
+		if page not in device['pages']:
+			return E_INVALIDARG, None
+		if device['active'] != page:
+			return E_PAGENOTACTIVE, None
+		return S_OK, device['pages'][page]
+
+	def Initialize(self, application_name):
+		error_code = self._call('Initialize')
+		if error_code is not None:
+			return error_code
+		self.application_name = application_name
+		if self._thread is None:
+			self._thread = threading.Thread(target=self._run, name="SimulatedDirectOutput", daemon=True)
+			self._thread.start()
+		return S_OK
+
+	def Deinitialize(self):
+		error_code = self._call('Deinitialize')
+		if error_code is not None:
+			return error_code
+		if self._thread is None:
+			return E_HANDLE
+		self._events.put(None)
+		if threading.current_thread() is not self._thread:
+			self._thread.join()
+		self._thread = None
+		return S_OK
+
+	def RegisterDeviceCallback(self, function):
+		error_code = self._call('RegisterDeviceCallback')
+		if error_code is not None:
+			return error_code
+		self._device_callback = function
+		return S_OK
+
+	def Enumerate(self, function):
+		error_code = self._call('Enumerate')
+		if error_code is not None:
+			return error_code
+		for device_handle in list(self.devices):
+			function(device_handle, None)
+		return S_OK
+
+	def RegisterSoftButtonCallback(self, device_handle, function):
+		error_code = self._call('RegisterSoftButtonCallback')
+		if error_code is not None:
+			return error_code
+		if device_handle not in self.devices:
+			return E_HANDLE
+		self._soft_button_callbacks[device_handle] = function
+		return S_OK
+
+	def RegisterPageCallback(self, device_handle, function):
+		error_code = self._call('RegisterPageCallback')
+		if error_code is not None:
+			return error_code
+		if device_handle not in self.devices:
+			return E_HANDLE
+		self._page_callbacks[device_handle] = function
+		return S_OK
+
+	def SetProfile(self, device_handle, profile):
+		error_code = self._call('SetProfile')
+		if error_code is not None:
+			return error_code
+		if device_handle not in self.devices:
+			return E_HANDLE
+		self.profiles[device_handle] = profile
+		return S_OK
+
+	def AddPage(self, device_handle, page, name, active):
+		error_code = self._call('AddPage')
+		if error_code is not None:
+			return error_code
+		with self._lock:
+			device = self.devices.get(device_handle)
+			if device is None:
+				return E_HANDLE
+			if page in device['pages']:
+				return E_INVALIDARG
+			device['pages'][page] = {'name': name, 'lines': ['', '', ''], 'leds': 0}
+			# As with the DLL, no page callback when a page is added as the active page
+			if active or device['active'] is None:
+				device['active'] = page
+		return S_OK
+
+	def RemovePage(self, device_handle, page):
+		error_code = self._call('RemovePage')
+		if error_code is not None:
+			return error_code
+		with self._lock:
+			device = self.devices.get(device_handle)
+			if device is None:
+				return E_HANDLE
+			if page not in device['pages']:
+				return E_INVALIDARG
+			del device['pages'][page]
+			if device['active'] == page:
+				device['active'] = next(iter(device['pages']), None)
+				if device['active'] is not None:
+					# The device shows another page at once, the page callback follows on the simulator thread
+					self._events.put(('shown', device_handle, device['active']))
+		return S_OK
+
+	def SetLed(self, device_handle, page, led, value):
+		error_code = self._call('SetLed')
+		if error_code is not None:
+			return error_code
+		with self._lock:
+			result, state = self._page(device_handle, page)
+			if result != S_OK:
+				return result
+			if not 0 <= led < LED_COUNT:
+				return E_INVALIDARG
+			state['leds'] = (state['leds'] & ~(1 << led)) | ((1 if value else 0) << led)
+		return S_OK
+
+	def SetString(self, device_handle, page, line, string):
+		error_code = self._call('SetString')
+		if error_code is not None:
+			return error_code
+		with self._lock:
+			result, state = self._page(device_handle, page)
+			if result != S_OK:
+				return result
+			if not 0 <= line < len(state['lines']):
+				return E_INVALIDARG
+			state['lines'][line] = string
+		return S_OK
+
+	"""
+	Inspection
+	"""
+
+	def line(self, page, line, device_handle=1):
+		"""
+		Returns the string shown on a line of a page
+		"""
+		with self._lock:
+			return self.devices[device_handle]['pages'][page]['lines'][line]
+
+	def leds(self, page, device_handle=1):
+		"""
+		Returns the LED states of a page as a bitmask, bit n is LED n
+		"""
+		with self._lock:
+			return self.devices[device_handle]['pages'][page]['leds']
+
+	def active_page(self, device_handle=1):
+		with self._lock:
+			return self.devices[device_handle]['active']
+
+	"""
+	Input, delivered on the simulator thread
+	"""
+
+	def press(self, buttons, device_handle=1):
+		"""
+		Fires the soft button callback
+		Required Arguments:
+		buttons -- bitmask of SOFTBUTTON_SELECT, SOFTBUTTON_UP and SOFTBUTTON_DOWN, 0 for released
+		"""
+		self._events.put(('softbutton', device_handle, buttons))
+
+	def activate_page(self, page, device_handle=1):
+		"""
+		Makes page the active page, as the user paging on the device would, firing the page callback for the old and new page
+		"""
+		self._events.put(('page', device_handle, page))
+
+	def plug(self, device_handle):
+		"""
+		Adds a device and fires the device callback
+		"""
+		self._events.put(('plug', device_handle, True))
+
+	def unplug(self, device_handle=1):
+		"""
+		Removes a device, along with its pages, and fires the device callback
+		"""
+		self._events.put(('plug', device_handle, False))
+
+	def wait_idle(self, timeout=None):
+		"""
+		Blocks until every queued callback has been delivered. Returns False if timeout expired first.
+		"""
+		done = threading.Event()
+		self._events.put(('call', None, done.set))
+		return done.wait(timeout)
+
+	def _activate(self, device_handle, page):
+		device = self.devices[device_handle]
+		previous, device['active'] = device['active'], page
+		callback = self._page_callbacks.get(device_handle)
+		if callback and previous != page:
+			if previous is not None:
+				callback(device_handle, previous, False, None)
+			callback(device_handle, page, True, None)
+
+	def _run(self):
+		while True:
+			event = self._events.get()
+			if event is None:
+				return
+			kind, device_handle, value = event
+			try:
+				if kind == 'softbutton':
+					callback = self._soft_button_callbacks.get(device_handle)
+					if callback:
+						callback(device_handle, value, None)
+				elif kind == 'page':
+					with self._lock:
+						if device_handle in self.devices and value in self.devices[device_handle]['pages']:
+							self._activate(device_handle, value)
+				elif kind == 'shown':
+					callback = self._page_callbacks.get(device_handle)
+					if callback:
+						callback(device_handle, value, True, None)
+				elif kind == 'plug':
+					with self._lock:
+						if value:
+							self.devices.setdefault(device_handle, self._new_device())
+						else:
+							self.devices.pop(device_handle, None)
+							self._page_callbacks.pop(device_handle, None)
+							self._soft_button_callbacks.pop(device_handle, None)
+					if self._device_callback:
+						self._device_callback(device_handle, value, None)
+				elif kind == 'call':
+					value()
+			except Exception:
+				logging.exception("SimulatedDirectOutput {} callback raised".format(kind))
+
+
+class LatencyHistogram(object):
+	"""
+		Histogram of durations in power of two buckets of microseconds: bucket n counts durations
+		under 2**n microseconds, the last bucket everything longer
+	"""
+	BUCKETS = 24
+
+	def __init__(self):
+		self.counts = [0] * self.BUCKETS
+		self.count = 0
+		self.total = 0.0
+		self.max = 0.0
+
+	def add(self, seconds):
+		self.counts[min(int(seconds * 1e6).bit_length(), self.BUCKETS - 1)] += 1
+		self.count += 1
+		self.total += seconds
+		if seconds > self.max:
+			self.max = seconds
+
+	def percentile(self, fraction):
+		"""
+		Returns the upper bound in seconds of the bucket holding the given fraction of durations
+		"""
+		if not self.count:
+			return 0.0
+		target = fraction * self.count
+		seen = 0
+		for bucket, count in enumerate(self.counts):
+			seen += count
+			if seen >= target:
+				return min((1 << bucket) / 1e6, self.max)
+		return self.max
+
+	def snapshot(self):
+		return {
+			'count': self.count,
+			'mean': self.total / self.count if self.count else 0.0,
+			'p50': self.percentile(0.5),
+			'p99': self.percentile(0.99),
+			'max': self.max,
+			'buckets_us': dict((1 << bucket, count) for bucket, count in enumerate(self.counts) if count),
+		}
+
+
+class InstrumentedDirectOutput(DirectOutputBackend):
+	"""
+		DirectOutputBackend that passes every call through to another, counting calls and error
+		codes, and timing the methods in HISTOGRAMS. Soft button and page callbacks are counted too,
+		and the time from one to the next SetString or SetLed is kept as callback to render latency.
+		Anything else is looked up on the wrapped backend. DirectOutputDevice only puts this in front
+		of its backend when created with instrument=True, so it costs nothing otherwise.
+	"""
+	HISTOGRAMS = ('SetString', 'SetLed', 'AddPage', 'SetProfile')
+
+	def __init__(self, backend):
+		self.backend = backend
+		self.started = monotonic()
+		self.calls = collections.Counter()
+		self.errors = collections.defaultdict(collections.Counter)
+		self.callbacks = collections.Counter()
+		self.latency = dict((method, LatencyHistogram()) for method in self.HISTOGRAMS)
+		self.callback_to_render = LatencyHistogram()
+		self._callback_at = None
+		self._lock = threading.Lock()
+
+	def __getattr__(self, name):
+		return getattr(self.backend, name)
+
+	def _call(self, method, *args):
+		started = perf_counter()
+		result = getattr(self.backend, method)(*args)
+		finished = perf_counter()
+		with self._lock:
+			self.calls[method] += 1
+			if result != S_OK:
+				self.errors[method][result] += 1
+			if method in self.latency:
+				self.latency[method].add(finished - started)
+			if self._callback_at is not None and method in ('SetString', 'SetLed'):
+				self.callback_to_render.add(finished - self._callback_at)
+				self._callback_at = None
+		return result
+
+	def _callback(self, kind, function):
+		def func(*args):
+			with self._lock:
+				self.callbacks[kind] += 1
+				if kind in ('softbutton', 'page'):
+					self._callback_at = perf_counter()
+			return function(*args)
+		return func
+
+	def Initialize(self, application_name):
+		return self._call('Initialize', application_name)
+
+	def Deinitialize(self):
+		return self._call('Deinitialize')
+
+	def RegisterDeviceCallback(self, function):
+		return self._call('RegisterDeviceCallback', self._callback('device', function))
+
+	def Enumerate(self, function):
+		return self._call('Enumerate', self._callback('enumerate', function))
+
+	def RegisterSoftButtonCallback(self, device_handle, function):
+		return self._call('RegisterSoftButtonCallback', device_handle, self._callback('softbutton', function))
+
+	def RegisterPageCallback(self, device_handle, function):
+		return self._call('RegisterPageCallback', device_handle, self._callback('page', function))
+
+	def SetProfile(self, device_handle, profile):
+		return self._call('SetProfile', device_handle, profile)
+
+	def AddPage(self, device_handle, page, name, active):
+		return self._call('AddPage', device_handle, page, name, active)
+
+	def RemovePage(self, device_handle, page):
+		return self._call('RemovePage', device_handle, page)
+
+	def SetLed(self, device_handle, page, led, value):
+		return self._call('SetLed', device_handle, page, led, value)
+
+	def SetString(self, device_handle, page, line, string):
+		return self._call('SetString', device_handle, page, line, string)
+
+	def snapshot(self):
+		"""
+		Returns the counters and histograms as a dict of plain values
+		"""
+		with self._lock:
+			return {
+				'uptime': monotonic() - self.started,
+				'calls': dict(self.calls),
+				'errors': dict((method, dict((hex(code & 0xffffffff), count) for code, count in codes.items())) for method, codes in self.errors.items()),
+				'callbacks': dict(self.callbacks),
+				'latency': dict((method, histogram.snapshot()) for method, histogram in self.latency.items()),
+				'callback_to_render': self.callback_to_render.snapshot(),
+			}
@@ -0,0 +1,69 @@
+"""
+DirectOutput result codes and soft button bits.
+
+Saitek / Logitech functions listed in the DLL:
+
+DirectOutput_Initialize
+DirectOutput_Deinitialize
+DirectOutput_AddPage
+DirectOutput_DeleteFile
+DirectOutput_DisplayFile
+DirectOutput_Enumerate
+DirectOutput_GetDeviceInstance
+DirectOutput_GetDeviceType
+DirectOutput_RegisterDeviceCallback
+DirectOutput_RegisterPageCallback
+DirectOutput_RegisterSoftButtonCallback
+DirectOutput_RemovePage
+DirectOutput_SaveFile
+DirectOutput_SendServerFile
+DirectOutput_SendServerMsg
+DirectOutput_SetImage
+DirectOutput_SetImageFromFile
+DirectOutput_SetLed
+DirectOutput_SetProfile
+DirectOutput_SetString
+DirectOutput_StartServer
+DirectOutput_CloseServer
+"""
+
+from __future__ import absolute_import, with_statement, print_function, division, unicode_literals
+
+
+S_OK = 0x00000000
+E_HANDLE = 0x80070006
+E_INVALIDARG = 0x80070057
+E_OUTOFMEMORY = 0x8007000E
+E_PAGENOTACTIVE = -0xfbffff        # Something munges it from it's actual value
+E_BUFFERTOOSMALL = -0xfc0000
+E_NOTIMPL = 0x80004001
+ERROR_DEV_NOT_EXIST = 55
+
+SOFTBUTTON_SELECT = 0x00000001
+SOFTBUTTON_UP = 0x00000002
+SOFTBUTTON_DOWN = 0x00000004
+
+# X52 Pro MFD and LEDs
+MFD_WIDTH = 16
+LED_COUNT = 20
+# (red, green) components of the two-colour LEDs
+LED_COLOURS = {
+	"red": (1, 0),
+	"green": (0, 1),
+	"orange": (1, 1),
+	"off": (0, 0),
+}
+# Named LED groups, (red, green) for two-colour LEDs or a single on/off LED
+LED_GROUPS = {
+	"fire": (0,),
+	"fire_a": (1, 2),
+	"fire_b": (3, 4),
+	"fire_d": (5, 6),
+	"fire_e": (7, 8),
+	"toggle_1_2": (9, 10),
+	"toggle_3_4": (11, 12),
+	"toggle_5_6": (13, 14),
+	"pov_2": (15, 16),
+	"clutch": (17, 18),
+	"throttle_axis": (19,),
+}
@@ -0,0 +1,531 @@
+"""
+Local display daemon: one process owns the device, any number of client processes draw on it.
+
+DirectOutput is initialised once per application and a DirectOutputDevice assumes its process
+owns the throttle, so only one program could use the MFD at a time. X52ProDisplayDaemon owns the
+device and listens on a Unix socket, or a named pipe on Windows. Each X52ProDisplayClient gets
+its own namespace of pages, added to the device as pages of their own, and sends line and LED
+updates as compact binary records. The daemon coalesces updates per line and LED and writes each
+at most once a frame.
+
+	python -m x52pro.daemon
+
+	client = X52ProDisplayClient()
+	page = client.add_page("Route")
+	page[0] = "Next: Sol"
+
+Each message is a run of records: a RECORD header of operation, page, slot and payload size,
+then the payload. The slot is the line, the LED, the active flag of an added page, the protocol
+version of a hello or the button bitmask of an event.
+"""
+
+from __future__ import absolute_import, with_statement, print_function, division, unicode_literals
+
+import argparse
+import collections
+import contextlib
+import getpass
+import itertools
+import logging
+import os
+import queue
+import socket
+import stat
+import struct
+import sys
+import tempfile
+import threading
+from multiprocessing.connection import (Client, Listener)
+from time import monotonic
+
+from .device import (DirectOutputDevice, X52ProOutputDevice)
+from .scheduler import CoalescingTrack
+
+
+PROTOCOL_VERSION = 1
+RECORD = struct.Struct("<BHBH")
+
+# Client to daemon
+OP_HELLO = 1
+OP_ADD_PAGE = 2
+OP_REMOVE_PAGE = 3
+OP_SET_STRING = 4
+OP_SET_LED = 5
+OP_SYNC = 6
+# Daemon to client
+EVENT_SYNC = 64
+EVENT_PAGE = 65
+EVENT_BUTTONS = 66
+
+# Each user gets a daemon of their own: the socket is in a directory only its owner can enter,
+# $XDG_RUNTIME_DIR or one made under the temp directory, and the pipe is named after the user
+if os.name == 'nt':
+	DEFAULT_ADDRESS = r'\\.\pipe\x52pro-' + getpass.getuser()
+else:
+	DEFAULT_ADDRESS = os.path.join(os.environ.get('XDG_RUNTIME_DIR') or os.path.join(tempfile.gettempdir(), 'x52pro-{}'.format(os.getuid())), 'x52pro.sock')
+
+
+def private_directory(path, create=False):
+	"""
+	Checks that the directory holding the socket path belongs to this user and no one else can
+	use it, creating it with mode 0700 first if create is True. Raises OSError otherwise.
+	"""
+	directory = os.path.dirname(os.path.abspath(path))
+	if create:
+		os.makedirs(directory, mode=0o700, exist_ok=True)
+	info = os.lstat(directory)
+	if not stat.S_ISDIR(info.st_mode) or info.st_uid != os.getuid() or info.st_mode & 0o077:
+		raise OSError("{} must be a directory of user {} with mode 0700".format(directory, os.getuid()))
+	return directory
+
+
+def iter_records(data):
+	"""
+	Yields the operation, page, slot and payload of each record in a message
+	"""
+	view = memoryview(data)
+	offset = 0
+	while offset < len(view):
+		op, page, slot, size = RECORD.unpack_from(view, offset)
+		offset += RECORD.size
+		yield op, page, slot, view[offset:offset + size]
+		offset += size
+
+
+class DaemonOutputDevice(X52ProOutputDevice):
+	"""
+		X52ProOutputDevice that reports page changes and soft buttons to the daemon owning it
+	"""
+	daemon = None
+
+	def OnPage(self, page_id, activated):
+		super().OnPage(page_id, activated)
+		if self.daemon:
+			self.daemon.page_event(page_id, activated)
+
+	def OnSoftButton(self, buttons):
+		if self.daemon:
+			self.daemon.button_event(buttons)
+
+
+class X52ProDisplayDaemon(object):
+	"""
+		Owns the device and serves clients connecting to address, each on a thread of its own.
+		Line and LED updates go through a CoalescingTrack, adding and removing pages happens as the
+		records arrive. A client's pages are removed when it disconnects.
+
+		Optional Arguments:
+		address -- Unix socket path or named pipe to listen on, DEFAULT_ADDRESS by default, in a
+			directory that is created for the user with mode 0700 and refused if anyone else can use it
+		authkey -- bytes clients must present, see multiprocessing.connection. Give one when the
+			address can be reached by other users, e.g. a named pipe or a socket in a shared directory.
+		interval -- seconds updates are collected for before a frame is written
+		device_class -- DaemonOutputDevice, or a subclass
+		Any other keyword arguments are passed to the device, e.g. direct_output.
+	"""
+	class Session(object):
+		"""
+			A connected client. Records for it are queued and sent by a thread of its own, so the
+			DirectOutput callback thread reporting page and button events never waits for a client
+			that isn't reading. Events beyond OUTBOX_SIZE unsent records are dropped.
+		"""
+		OUTBOX_SIZE = 256
+		SEND_TIMEOUT = 5.0
+
+		def __init__(self, session_id, connection):
+			self.session_id = session_id
+			self.connection = connection
+			# Virtual page id: device page
+			self.pages = {}
+			self.records = 0
+			self.dropped = 0
+			self._outbox = queue.Queue(self.OUTBOX_SIZE)
+			self._closed = threading.Event()
+			self._sender = threading.Thread(target=self._send_loop, name="X52ProDisplaySender", daemon=True)
+			self._sender.start()
+
+		def send(self, op, page, slot, payload=b"", block=False):
+			"""
+			Queues a record for the client. It is dropped if the outbox is full, or still full
+			after SEND_TIMEOUT seconds if block is True.
+			"""
+			try:
+				self._outbox.put(RECORD.pack(op, page, slot, len(payload)) + payload, block, self.SEND_TIMEOUT)
+			except queue.Full:
+				self.dropped += 1
+
+		def _send_loop(self):
+			connected = True
+			while not self._closed.is_set():
+				try:
+					message = self._outbox.get(timeout=0.2)
+				except queue.Empty:
+					continue
+				# Whatever queued up meanwhile goes in the same message
+				with contextlib.suppress(queue.Empty):
+					while True:
+						message += self._outbox.get_nowait()
+				if not connected:
+					continue
+				try:
+					self.connection.send_bytes(message)
+				except (OSError, EOFError):
+					# The session ends when its reader sees the connection close, until then
+					# records are discarded so nobody waits for room in the outbox
+					connected = False
+
+		def close(self):
+			self._closed.set()
+			self._sender.join(1)
+			self.connection.close()
+
+	def __init__(self, address=None, authkey=None, interval=0.02, device_class=None, **kwargs):
+		self.address = address or DEFAULT_ADDRESS
+		self.authkey = authkey
+		if self.address == DEFAULT_ADDRESS and os.name != 'nt':
+			private_directory(self.address, create=True)
+		self.device = (device_class or DaemonOutputDevice)(**kwargs)
+		self.device.daemon = self
+		self.updates = CoalescingTrack(self.device.scheduler, interval)
+		self.sessions = {}
+		# Device page id: (session, virtual page id)
+		self._owners = {}
+		self._session_ids = itertools.count(1)
+		self._threads = []
+		self._lock = threading.RLock()
+		self._running = True
+		self._remove_stale_socket()
+		self.listener = Listener(self.address, authkey=authkey)
+		self.thread = threading.Thread(target=self._accept_loop, name="X52ProDisplayDaemon", daemon=True)
+		self.thread.start()
+
+	def _remove_stale_socket(self):
+		"""
+		Removes a Unix socket left behind by a daemon that didn't exit cleanly
+		"""
+		try:
+			if not stat.S_ISSOCK(os.stat(self.address).st_mode):
+				return
+		except (OSError, ValueError):
+			return
+		probe = socket.socket(socket.AF_UNIX)
+		try:
+			probe.connect(self.address)
+		except ConnectionRefusedError:
+			os.unlink(self.address)
+			return
+		finally:
+			probe.close()
+		raise OSError("A daemon is already listening on {}".format(self.address))
+
+	def _accept_loop(self):
+		while self._running:
+			try:
+				connection = self.listener.accept()
+			except Exception:
+				if self._running:
+					logging.exception("Accepting a client failed")
+				continue
+			if not self._running:
+				connection.close()
+				return
+			session = self.Session(next(self._session_ids), connection)
+			with self._lock:
+				self.sessions[session.session_id] = session
+			thread = threading.Thread(target=self._serve, args=(session,), name="X52ProDisplaySession", daemon=True)
+			self._threads.append(thread)
+			thread.start()
+
+	def _serve(self, session):
+		try:
+			while self._running:
+				if session.connection.poll(0.2):
+					self.handle(session, session.connection.recv_bytes())
+		except (OSError, EOFError):
+			pass
+		except Exception:
+			logging.exception("Client {} sent a bad message".format(session.session_id))
+		finally:
+			self._end_session(session)
+
+	def handle(self, session, data):
+		"""
+		Applies the records of a message from session
+		"""
+		for op, page_id, slot, payload in iter_records(data):
+			session.records += 1
+			if op == OP_SET_STRING or op == OP_SET_LED:
+				page = session.pages.get(page_id)
+				if page is None:
+					logging.warning("Client {} wrote to page {} it hasn't added".format(session.session_id, page_id))
+				elif op == OP_SET_STRING and slot < len(page._lines):
+					self.updates.set_line(page, slot, bytes(payload).decode('utf-8'))
+				elif op == OP_SET_LED and slot < page.LED_COUNT:
+					self.updates.set_led(page, slot, payload[0] if len(payload) else 0)
+				else:
+					logging.warning("Client {} wrote to slot {} of page {}".format(session.session_id, slot, page_id))
+			elif op == OP_ADD_PAGE:
+				self._add_page(session, page_id, bytes(payload).decode('utf-8'), slot)
+			elif op == OP_REMOVE_PAGE:
+				self._remove_page(session, page_id)
+			elif op == OP_SYNC:
+				self.updates.flush()
+				# Only the session's own reader waits for room, a sync reply is never dropped
+				session.send(EVENT_SYNC, page_id, 0, block=True)
+			elif op == OP_HELLO:
+				if slot != PROTOCOL_VERSION:
+					raise ValueError("protocol version {}, expected {}".format(slot, PROTOCOL_VERSION))
+			else:
+				raise ValueError("unknown operation {}".format(op))
+
+	def _add_page(self, session, page_id, name, active):
+		with self._lock:
+			if page_id in session.pages:
+				self._remove_page(session, page_id)
+			hidden = [page.page_id for page in self.device.pages.values() if page.active] if active else []
+			page = self.device.add_page("{}/{}:{}".format(session.session_id, page_id, name), active=bool(active))
+			session.pages[page_id] = page
+			self._owners[page.page_id] = (session, page_id)
+			# The DLL doesn't call back when a page is added as the active page, so the clients
+			# owning the pages it hides are told here. The session adding it knows already.
+			for device_page_id in hidden:
+				owner = self._owners.get(device_page_id)
+				if owner is not None and owner[0] is not session:
+					owner[0].send(EVENT_PAGE, owner[1], 0)
+
+	def _remove_page(self, session, page_id):
+		with self._lock:
+			page = session.pages.pop(page_id, None)
+			if page is None:
+				return
+			self.updates.discard(page)
+			del self._owners[page.page_id]
+			self.device.remove_page(page.name)
+
+	def _end_session(self, session):
+		with self._lock:
+			for page_id in list(session.pages):
+				self._remove_page(session, page_id)
+			self.sessions.pop(session.session_id, None)
+		session.close()
+
+	def page_event(self, device_page_id, activated):
+		"""
+		Tells the client owning a page that it was activated or deactivated
+		"""
+		owner = self._owners.get(device_page_id)
+		if owner is not None:
+			owner[0].send(EVENT_PAGE, owner[1], 1 if activated else 0)
+
+	def button_event(self, buttons):
+		"""
+		Sends soft button changes to the client owning the active page
+		"""
+		with self._lock:
+			owners = [self._owners.get(page.page_id) for page in self.device.pages.values() if page.active]
+		for owner in owners:
+			if owner is not None:
+				owner[0].send(EVENT_BUTTONS, owner[1], buttons.bitmask)
+
+	def stats(self):
+		"""
+		Returns a dict of clients, pages, records received, how many updates were coalesced and
+		how many events were dropped for clients that fell behind
+		"""
+		with self._lock:
+			sessions = list(self.sessions.values())
+		return {
+			'clients': len(sessions),
+			'pages': sum(len(session.pages) for session in sessions),
+			'records': sum(session.records for session in sessions),
+			'updates': self.updates.updates,
+			'coalesced': self.updates.coalesced,
+			'frames': self.updates.frames,
+			'dropped': sum(session.dropped for session in sessions),
+		}
+
+	def finish(self):
+		"""
+		Disconnects every client, stops listening and finishes the device
+		"""
+		if not self._running:
+			return
+		self._running = False
+		# Wakes the accept loop
+		with contextlib.suppress(OSError, EOFError):
+			Client(self.address, authkey=self.authkey).close()
+		self.thread.join()
+		for thread in self._threads:
+			thread.join()
+		self.listener.close()
+		self.updates.flush()
+		self.device.finish()
+
+
+class X52ProDisplayClient(object):
+	"""
+		Connection to an X52ProDisplayDaemon. Pages are numbered by the client, so adding one and
+		writing to it never waits for the daemon. Each write is sent as it is made, or, inside
+		batch() or a page's frame(), together when the block ends.
+
+			client = X52ProDisplayClient()
+			page = client.add_page("Route")
+			with page.frame():
+				page[0] = "Next: Sol"
+				page.set_led(0, True)
+			client.sync()
+	"""
+	class Page(object):
+		def __init__(self, client, page_id, name, active):
+			self.client = client
+			self.page_id = page_id
+			self.name = name
+			self.active = active
+			self._lines = [str(), str(), str()]
+			client._put(OP_ADD_PAGE, page_id, 1 if active else 0, name.encode('utf-8'))
+
+		def __getitem__(self, key):
+			return self._lines[key]
+
+		def __setitem__(self, key, value):
+			if self._lines[key] == value:
+				return
+			self._lines[key] = value
+			self.client._put(OP_SET_STRING, self.page_id, key, value.encode('utf-8'))
+
+		def set_led(self, led, value):
+			self.client._put(OP_SET_LED, self.page_id, led, b"\x01" if value else b"\x00")
+
+		def frame(self):
+			return self.client.batch()
+
+	def __init__(self, address=None, authkey=None):
+		self.address = address or DEFAULT_ADDRESS
+		if self.address == DEFAULT_ADDRESS and os.name != 'nt':
+			# Not a socket another user put in our way
+			private_directory(self.address)
+		self.connection = Client(self.address, authkey=authkey)
+		self.pages = {}
+		self._page_ids = {}
+		self._page_counter = 0
+		self._buffer = bytearray()
+		self._batch_depth = 0
+		self._events = collections.deque()
+		self._sync_tokens = itertools.count(1)
+		self._put(OP_HELLO, 0, PROTOCOL_VERSION)
+
+	def _put(self, op, page, slot, payload=b""):
+		self._buffer += RECORD.pack(op, page, slot, len(payload))
+		self._buffer += payload
+		if not self._batch_depth:
+			self.flush()
+
+	def flush(self):
+		"""
+		Sends the records collected by batch()
+		"""
+		if self._buffer:
+			self.connection.send_bytes(self._buffer)
+			del self._buffer[:]
+
+	@contextlib.contextmanager
+	def batch(self):
+		"""
+		Sends the writes made in the with block as a single message when it ends
+		"""
+		self._batch_depth += 1
+		try:
+			yield self
+		finally:
+			self._batch_depth -= 1
+			if not self._batch_depth:
+				self.flush()
+
+	def add_page(self, name, active=True):
+		if name in self.pages:
+			self.remove_page(name)
+		page = self.pages[name] = self.Page(self, self._page_counter, name, active)
+		self._page_ids[page.page_id] = page
+		for other in self.pages.values():
+			if active and other is not page:
+				other.active = False
+		self._page_counter = (self._page_counter + 1) & 0xFFFF
+		return page
+
+	def remove_page(self, name):
+		page = self.pages.pop(name)
+		del self._page_ids[page.page_id]
+		self._put(OP_REMOVE_PAGE, page.page_id, 0)
+
+	def sync(self, timeout=None):
+		"""
+		Waits until the daemon has written everything sent so far to the device. Returns False on timeout.
+		"""
+		token = next(self._sync_tokens) & 0xFFFF
+		self._put(OP_SYNC, token, 0)
+		deadline = None if timeout is None else monotonic() + timeout
+		while True:
+			remaining = None if deadline is None else max(0, deadline - monotonic())
+			if not self.connection.poll(remaining):
+				return False
+			for op, page_id, slot, payload in iter_records(self.connection.recv_bytes()):
+				if op == EVENT_SYNC and page_id == token:
+					return True
+				self._queue_event(op, page_id, slot)
+
+	def _queue_event(self, op, page_id, slot):
+		page = self._page_ids.get(page_id)
+		if page is None:
+			return
+		if op == EVENT_PAGE:
+			page.active = bool(slot)
+			self._events.append(('page', page, page.active))
+		elif op == EVENT_BUTTONS:
+			self._events.append(('buttons', page, DirectOutputDevice.Buttons(slot)))
+
+	def poll_event(self, timeout=0):
+		"""
+		Returns the next event, ('page', page, activated) or ('buttons', page, Buttons), or None
+		if there is none within timeout seconds
+		"""
+		deadline = None if timeout is None else monotonic() + timeout
+		while not self._events:
+			remaining = None if deadline is None else max(0, deadline - monotonic())
+			if not self.connection.poll(remaining):
+				return None
+			for op, page_id, slot, payload in iter_records(self.connection.recv_bytes()):
+				self._queue_event(op, page_id, slot)
+		return self._events.popleft()
+
+	def close(self):
+		self.flush()
+		self.connection.close()
+
+
+def main(argv=None):
+	parser = argparse.ArgumentParser(description="Own the X52 Pro and let other processes draw on its MFD")
+	parser.add_argument('--address', default=DEFAULT_ADDRESS, help="Unix socket path or named pipe to listen on")
+	parser.add_argument('--authkey', help="secret clients must present, for an address other users can reach")
+	parser.add_argument('--interval', type=float, default=0.02, help="seconds updates are collected for before a frame is written")
+	parser.add_argument('--simulate', action='store_true', help="drive a SimulatedDirectOutput instead of the device")
+	args = parser.parse_args(argv)
+
+	logging.basicConfig(level=logging.INFO, format='%(asctime)s %(name)s [%(filename)s:%(lineno)d] %(message)s')
+	kwargs = {}
+	if args.simulate:
+		from .backend import SimulatedDirectOutput
+		kwargs['direct_output'] = SimulatedDirectOutput()
+	authkey = args.authkey.encode('utf-8') if args.authkey else None
+	daemon = X52ProDisplayDaemon(address=args.address, authkey=authkey, interval=args.interval, **kwargs)
+	print("Listening on {}, press Ctrl+C to exit".format(daemon.address))
+	try:
+		while True:
+			daemon.thread.join(1)
+	except KeyboardInterrupt:
+		pass
+	daemon.finish()
+	return 0
+
+
+if __name__ == '__main__':
+	sys.exit(main())
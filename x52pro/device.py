@@ -0,0 +1,1192 @@
+"""
+Devices, their pages and output
+"""
+
+from __future__ import absolute_import, with_statement, print_function, division, unicode_literals
+
+import collections
+import contextlib
+import json
+import logging
+import os
+import platform
+import threading
+from time import monotonic
+
+from .backend import InstrumentedDirectOutput
+from .constants import *
+from .errors import *
+from .layout import (marquee_frames, normalise_text)
+from .scheduler import (FrameScheduler, MarqueeTrack, TelemetryTrack)
+
+
+class OutputWriter(object):
+	"""
+		Sends SetString, SetLed, AddPage and RemovePage calls to DirectOutput from a dedicated thread.
+		Pending SetString and SetLed calls are kept per (page, slot), so a burst of updates to the
+		same slot collapses to its latest value. Page calls keep their order relative to the writes
+		around them, and removing a page drops any writes still pending for it.
+	"""
+	def __init__(self, device):
+		self.device = device
+		self.calls_sent = 0
+		self.calls_coalesced = 0
+		self.calls_dropped = 0
+		self.errors = collections.Counter()
+		self._pending = collections.OrderedDict()
+		self._condition = threading.Condition()
+		self._busy = False
+		self._running = True
+		self._page_calls = 0
+		self.thread = threading.Thread(target=self._run, name="DirectOutputWriter", daemon=True)
+		self.thread.start()
+
+	def SetString(self, page, line, string):
+		self._submit(('string', page, line), 'SetString', page, line, string)
+
+	def SetLed(self, page, led, value):
+		self._submit(('led', page, led), 'SetLed', page, led, value)
+
+	def AddPage(self, page, name, active):
+		self._submit_page_call('AddPage', page, name, active)
+
+	def RemovePage(self, page):
+		with self._condition:
+			for key in [key for key in self._pending if key[0] in ('string', 'led') and key[1] == page]:
+				del self._pending[key]
+				self.calls_coalesced += 1
+			self._submit_page_call('RemovePage', page)
+
+	def _submit_page_call(self, method, *args):
+		with self._condition:
+			self._page_calls += 1
+			self._submit(('page', args[0], self._page_calls), method, *args)
+
+	def _submit(self, key, method, *args):
+		with self._condition:
+			if not self._running:
+				raise RuntimeError("OutputWriter has been stopped")
+			if key in self._pending:
+				# Re-inserting moves the slot behind any page call queued since its last write
+				del self._pending[key]
+				self.calls_coalesced += 1
+			self._pending[key] = (method, args)
+			self._condition.notify_all()
+
+	def _run(self):
+		while True:
+			with self._condition:
+				while self._running and not self._pending:
+					self._condition.wait()
+				if not self._pending:
+					return
+				key, (method, args) = self._pending.popitem(last=False)
+				self._busy = True
+			try:
+				if self.device.device_handle is None:
+					# The device has been removed, its pages are replayed when it is added again
+					self.calls_dropped += 1
+					continue
+				result = getattr(self.device.direct_output, method)(self.device.device_handle, *args)
+				self.calls_sent += 1
+				if result != S_OK:
+					logging.warning("{}{} failed: {}".format(method, args, result))
+					self.errors[result] += 1
+					self.device._write_failed(method, args)
+			except Exception:
+				logging.exception("{}{} raised".format(method, args))
+				self.device._write_failed(method, args)
+			finally:
+				with self._condition:
+					self._busy = False
+					self._condition.notify_all()
+
+	def pending(self):
+		"""
+		Returns the number of calls waiting to be sent
+		"""
+		with self._condition:
+			return len(self._pending)
+
+	def flush(self, timeout=None):
+		"""
+		Blocks until every pending call has been sent. Returns False if timeout expired first.
+		"""
+		with self._condition:
+			return self._condition.wait_for(lambda: not self._pending and not self._busy, timeout)
+
+	def stop(self):
+		"""
+		Sends any pending calls and stops the writer thread
+		"""
+		with self._condition:
+			self._running = False
+			self._condition.notify_all()
+		if threading.current_thread() is not self.thread:
+			self.thread.join()
+
+
+class DirectOutputDevice(object):
+	class Buttons(object):
+		"""
+			Immutable soft button state. The eight states of the select, up and down bits are
+			created once and shared, so decoding a callback allocates nothing.
+		"""
+		__slots__ = ('bitmask', 'select', 'up', 'down')
+		_states = {}
+
+		def __new__(cls, bitmask):
+			state = cls._states.get(bitmask)
+			if state is None:
+				state = object.__new__(cls)
+				object.__setattr__(state, 'bitmask', bitmask)
+				object.__setattr__(state, 'select', bool(bitmask & SOFTBUTTON_SELECT))
+				object.__setattr__(state, 'up', bool(bitmask & SOFTBUTTON_UP))
+				object.__setattr__(state, 'down', bool(bitmask & SOFTBUTTON_DOWN))
+				if 0 <= bitmask <= 7:
+					cls._states[bitmask] = state
+			return state
+
+		def __setattr__(self, name, value):
+			raise AttributeError("Buttons are immutable")
+
+		def __reduce__(self):
+			return (type(self), (self.bitmask,))
+
+		def __repr__(self):
+			return "Select: " + str(self.select) + " Up: " + str(self.up) + " Down: " + str(self.down)
+
+	application_name = "GenericDevice"
+	device_handle = None
+	direct_output = None
+	writer = None
+	debug_level = 0
+	owns_direct_output = True
+	instrumentation = None
+	_dump_stop = None
+	# Last profile passed to SetProfile, set again when the device is reconnected
+	profile_path = None
+	# Set once the device has been removed, so the next device added is taken as it coming back
+	removed = False
+	reconnects = 0
+	recovery_time = None
+
+	def __init__(self, debug_level=0, name=None, direct_output=None, threaded_output=False, device_handle=None, instrument=False):
+		"""
+		Initialises device, creates internal state (device_handle) and registers callbacks.
+
+		Optional Arguments:
+		direct_output -- DirectOutputBackend to use in place of DirectOutput.dll, e.g. SimulatedDirectOutput
+		threaded_output -- if True, SetString, SetLed, AddPage and RemovePage return immediately and are sent by an OutputWriter thread
+		device_handle -- handle of a device on an already initialised direct_output, as used by X52ProDevicePool. The
+		                 device callback and Deinitialize are then left to whoever initialised it.
+		instrument -- if True, DLL calls go through an InstrumentedDirectOutput, whose counters snapshot() includes
+		"""
+		logging.info("DirectOutputDevice.__init__")
+
+		self.application_name = name or DirectOutputDevice.application_name
+		self.debug_level = debug_level
+
+		if direct_output is not None:
+			self.direct_output = direct_output
+		else:
+			self.direct_output = self._load_direct_output()
+		if instrument:
+			self.instrumentation = self.direct_output = InstrumentedDirectOutput(self.direct_output)
+
+		if device_handle is not None:
+			self.owns_direct_output = False
+			self.device_handle = device_handle
+		else:
+			result = self.direct_output.Initialize(self.application_name)
+			if result != S_OK:
+				logging.warning("direct_output.Initialize returned {}".format(result))
+				raise DirectOutputError(result)
+
+		logging.info("Creating callback closures.")
+		self.onDevice_closure = self._OnDeviceClosure()
+		logging.debug("onDevice_closure is {}".format(self.onDevice_closure))
+		self.onEnumerate_closure = self._OnEnumerateClosure()
+		logging.debug("onEnumerate_closure is {}".format(self.onEnumerate_closure))
+		self.onPage_closure = self._OnPageClosure()
+		logging.debug("onPage_closure is {}".format(self.onPage_closure))
+		self.onSoftButton_closure = self._OnSoftButtonClosure()
+		logging.debug("onSoftButton_closure is {}".format(self.onSoftButton_closure))
+
+		if self.owns_direct_output:
+			result = self.direct_output.RegisterDeviceCallback(self.onDevice_closure)
+			if result != S_OK:
+				logging.warning("RegisterDeviceCallback failed: {}".format(result))
+				self.finish()
+				raise DirectOutputError(result)
+
+			result = self.direct_output.Enumerate(self.onEnumerate_closure)
+			if result != S_OK:
+				logging.warning("Enumerate failed: {}".format(result))
+				self.finish()
+				raise DirectOutputError(result)
+
+		if not self.device_handle:
+			logging.warning("No device handle")
+			self.finish()
+			raise MissingDeviceError()
+
+		result = self._register_device_callbacks()
+		if result != S_OK:
+			self.finish()
+			raise DirectOutputError(result)
+
+		if threaded_output:
+			self.writer = OutputWriter(self)
+
+	def __del__(self, *args, **kwargs):
+		logging.debug("DirectOutputDevice.__del__")
+		self.finish()
+
+	@staticmethod
+	def _load_direct_output():
+		"""
+		Locates DirectOutput.dll and returns a DirectOutput object bound to it
+		"""
+		prog_dir = os.environ["ProgramFiles"]
+		if platform.machine().endswith('86'):
+			# 32-bit machine, nothing to worry about
+			pass
+		elif platform.machine().endswith('64'):
+			# 64-bit machine, are we a 32-bit python?
+			if platform.architecture()[0] == '32bit':
+				prog_dir = os.environ["ProgramFiles(x86)"]
+		dll_path = os.path.join(prog_dir, "Logitech\\DirectOutput\\DirectOutput.dll")
+
+		if os.path.isfile(dll_path) == False:
+			dll_path = os.path.join('.\\', "Logitech\\DirectOutput\\DirectOutput.dll")
+
+		try:
+			logging.debug("DirectOutputDevice -> DirectOutput: {}".format(dll_path))
+			# Imported here, so nothing platform specific is loaded until a device needs the DLL
+			from .dll import DirectOutput
+			direct_output = DirectOutput(dll_path)
+			logging.debug("direct_output = {}".format(direct_output))
+		except WindowsError as e:
+			logging.warning("DLLError: {}: {}".format(dll_path, e.winerror))
+			raise DLLError(e.winerror) from None
+		return direct_output
+
+	def finish(self):
+		"""
+		De-initializes DLL. Must be called before program exit
+		"""
+		self.stop_dump()
+		if self.writer:
+			self.writer.stop()
+			self.writer = None
+		if self.direct_output:
+			if self.owns_direct_output:
+				logging.info("DirectOutputDevice deinitializing")
+				self.direct_output.Deinitialize()
+			self.direct_output = None
+		else:
+			logging.debug("nothing to do in finish()")
+
+	def snapshot(self):
+		"""
+		Returns the instrumentation counters, if instrumented, and the output writer's counters as a
+		dict of plain values, ready for json.dump()
+		"""
+		snapshot = self.instrumentation.snapshot() if self.instrumentation else {}
+		writer = self.writer
+		if writer:
+			snapshot['writer'] = {
+				'calls_sent': writer.calls_sent,
+				'calls_coalesced': writer.calls_coalesced,
+				'calls_dropped': writer.calls_dropped,
+				'pending': writer.pending(),
+				'errors': dict(writer.errors),
+			}
+		return snapshot
+
+	def start_dump(self, path, interval=10.0):
+		"""
+		Writes snapshot() as JSON to path every interval seconds on a background thread, replacing the
+		file each time so readers never see a partial one
+		"""
+		self.stop_dump()
+		self._dump_stop = stop = threading.Event()
+
+		def run():
+			while not stop.wait(interval):
+				try:
+					with open(path + ".tmp", "w") as f:
+						json.dump(self.snapshot(), f, indent=1)
+					os.replace(path + ".tmp", path)
+				except Exception:
+					logging.exception("Writing instrumentation to {} failed".format(path))
+
+		self._dump_thread = threading.Thread(target=run, name="InstrumentationDump", daemon=True)
+		self._dump_thread.start()
+
+	def stop_dump(self):
+		if self._dump_stop is not None:
+			self._dump_stop.set()
+			if threading.current_thread() is not self._dump_thread:
+				self._dump_thread.join()
+			self._dump_stop = None
+
+	def _register_device_callbacks(self):
+		"""
+		Registers the soft button and page callbacks for device_handle. Returns S_OK or the first failing result.
+		"""
+		result = self.direct_output.RegisterSoftButtonCallback(self.device_handle, self.onSoftButton_closure)
+		if result != S_OK:
+			logging.warning("RegisterSoftButtonCallback failed")
+			return result
+		result = self.direct_output.RegisterPageCallback(self.device_handle, self.onPage_closure)
+		if result != S_OK:
+			logging.warning("RegisterPageCallback failed")
+		return result
+
+	def _OnDeviceClosure(self):
+		"""
+		Returns a function that calls self._OnDevice method. DirectOutput wraps it in a ctypes prototype so it can be called from within DirectOutput.dll
+		http://stackoverflow.com/questions/7259794/how-can-i-get-methods-to-work-as-callbacks-with-python-ctypes
+		"""
+		def func(hDevice, bAdded, pvContext):
+			logging.info("device callback closure func: {}, {}, {}".format(hDevice, bAdded, pvContext))
+			self._OnDevice(hDevice, bAdded, pvContext)
+
+		return func
+
+	def _OnEnumerateClosure(self):
+		"""
+		Returns a function that calls self._OnEnumerate method. DirectOutput wraps it in a ctypes prototype so it can be called from within DirectOutput.dll
+		http://stackoverflow.com/questions/7259794/how-can-i-get-methods-to-work-as-callbacks-with-python-ctypes
+		"""
+		def func(hDevice, pvContext):
+			logging.info("enumerate callback closure func: {}, {}".format(hDevice, pvContext))
+			self._OnEnumerate(hDevice, pvContext)
+
+		return func
+
+	def _OnPageClosure(self):
+		"""
+		Returns a function that calls self._OnPage method. DirectOutput wraps it in a ctypes prototype so it can be called from within DirectOutput.dll
+		http://stackoverflow.com/questions/7259794/how-can-i-get-methods-to-work-as-callbacks-with-python-ctypes
+		"""
+		def func(hDevice, dwPage, bActivated, pvContext):
+			if logging.root.isEnabledFor(logging.INFO):
+				logging.info("page callback closure: {}, {}, {}, {}".format(hDevice, dwPage, bActivated, pvContext))
+			self._OnPage(hDevice, dwPage, bActivated, pvContext)
+
+		return func
+
+	def _OnSoftButtonClosure(self):
+		"""
+		Returns a function that calls self._OnSoftButton method. DirectOutput wraps it in a ctypes prototype so it can be called from within DirectOutput.dll
+		http://stackoverflow.com/questions/7259794/how-can-i-get-methods-to-work-as-callbacks-with-python-ctypes
+		"""
+		def func(hDevice, dwButtons, pvContext):
+			if logging.root.isEnabledFor(logging.INFO):
+				logging.info("soft button callback closure: {}, {}, {}".format(hDevice, dwButtons, pvContext))
+			self._OnSoftButton(hDevice, dwButtons, pvContext)
+
+		return func
+
+	def _OnDevice(self, hDevice, bAdded, pvContext):
+		"""
+		Internal function to register device handle
+		"""
+		if not bAdded:
+			if hDevice == self.device_handle:
+				logging.warning("Device removed, waiting for it to be added again")
+				self._disconnect()
+				self.OnDevice(False)
+			return
+		if self.device_handle and self.device_handle != hDevice:
+			raise IndexError("Too many Saitek devices present")
+		logging.info("_OnDevice")
+		if not self.removed:
+			self.device_handle = hDevice
+			return
+		started = monotonic()
+		result = self._reconnect(hDevice)
+		if result != S_OK:
+			logging.error("Reconnecting device failed: {}".format(result))
+			return
+		self.reconnects += 1
+		self.recovery_time = monotonic() - started
+		logging.info("Device reconnected in {:.1f} ms".format(1e3 * self.recovery_time))
+		self.OnDevice(True)
+
+	def _disconnect(self):
+		"""
+		Drops the handle of a removed device. Output is skipped until the device is added again.
+		"""
+		self.device_handle = None
+		self.removed = True
+
+	def _reconnect(self, device_handle):
+		"""
+		Takes the handle of a device added again after being removed, registers its callbacks and
+		sets the last profile again. Returns S_OK or the first failing result.
+		"""
+		self.device_handle = device_handle
+		self.removed = False
+		result = self._register_device_callbacks()
+		if result == S_OK and self.profile_path is not None:
+			result = self.direct_output.SetProfile(self.device_handle, self.profile_path)
+		return result
+
+	def _OnEnumerate(self, hDevice, pvContext):
+		"""
+		Internal function to process a device enumeration
+		"""
+		logging.info("_OnEnumerate")
+		self._OnDevice(hDevice, True, pvContext)
+
+	def _OnPage(self, hDevice, dwPage, bActivated, pvContext):
+		"""
+		Method called when page changes. Calls self.OnPage to hide hDevice and pvContext from end-user
+		"""
+		if logging.root.isEnabledFor(logging.INFO):
+			logging.info("_OnPage")
+		self.OnPage(dwPage, bActivated)
+
+	def _OnSoftButton(self, hDevice, dwButtons, pvContext):
+		"""
+		Method called when soft button changes. Calls self.OnSoftButton to hide hDevice and pvContext from end-user. Also hides change of page softbutton and press-up.
+		"""
+		if logging.root.isEnabledFor(logging.INFO):
+			logging.info("_OnSoftButton")
+		self.OnSoftButton(self.Buttons(dwButtons))
+
+	def _write_failed(self, method, args):
+		"""
+		Called by the OutputWriter when a call it sent failed, with the method name and its arguments after the device handle
+		"""
+		pass
+
+	def OnPage(self, page, activated):
+		"""
+		Method called when a page changes. This should be overwritten by inheriting class
+		Required Arguments:
+		page -- page_id passed to AddPage
+		activated -- true if this page has become the active page, false if this page was the active page
+		"""
+		if logging.root.isEnabledFor(logging.INFO):
+			logging.info("OnPage({}, {})".format(page, activated))
+
+	def OnDevice(self, connected):
+		"""
+		Method called when the device is removed, or added again and restored. This should be overwritten by inheriting class
+		Required Arguments:
+		connected -- True if the device has been added again, False if it was removed
+		"""
+		logging.info("OnDevice({})".format(connected))
+
+	def OnSoftButton(self, buttons):
+		"""
+		Method called when a soft button changes. This should be overwritten by inheriting class
+		Required Arguments:
+		buttons - Buttons object representing button state
+		"""
+		if logging.root.isEnabledFor(logging.INFO):
+			logging.info("OnSoftButton({})".format(buttons))
+
+	def SetProfile(self, profile):
+		"""
+		Sets the profile used on the device.
+		Required Arguments:
+		device_handle -- ID of device
+		profile -- full path of the profile to activate. passing None will clear the profile.
+		"""
+		logging.debug("SetProfile({})".format(profile))
+		self.profile_path = profile
+		if self.device_handle is None:
+			return S_OK
+		return self.direct_output.SetProfile(self.device_handle, profile)
+
+	def AddPage(self, page, name, active):
+		"""
+		Adds a page to the MFD. If overriden by a derived class, you should
+		call super().AddPage(*args, **kwargs)
+		Required Arguments:
+		page -- page ID to add
+		name -- String specifying page name
+		active -- True if page is to become the active page, if False this will not change the active page
+		"""
+		logging.info("AddPage({}, {}, {})".format(page, name, active))
+		if self.writer:
+			return self.writer.AddPage(page, name, active)
+		if self.device_handle is None:
+			return
+		self.direct_output.AddPage(self.device_handle, page, name, active)
+
+	def RemovePage(self, page):
+		"""
+		Removes a page from the MFD
+		Required Arguments:
+		page -- page ID to remove
+		"""
+		logging.info("RemovePage({})".format(page))
+		if self.writer:
+			return self.writer.RemovePage(page)
+		if self.device_handle is None:
+			return
+		result = self.direct_output.RemovePage(self.device_handle, page)
+		if result != S_OK:
+			logging.error("RemovePage failed: {}".format(result))
+			self.finish()
+			raise DirectOutputError(result)
+
+	def SetString(self, page, line, string):
+		"""
+		Sets a string to display on the MFD
+		Required Arguments:
+		page -- the ID of the page to add the string to
+		line -- the line to display the string on (0 = top, 1 = middle, 2 = bottom)
+		string -- the string to display
+		"""
+		if logging.root.isEnabledFor(logging.DEBUG):
+			logging.debug("SetString({}, {}, {})".format(page, line, string))
+		if self.writer:
+			return self.writer.SetString(page, line, string)
+		if self.device_handle is None:
+			return
+		result = self.direct_output.SetString(self.device_handle, page, line, string)
+		if result != S_OK:
+			logging.warning("SetString failed: {}".format(result))
+			self.finish()
+			raise DirectOutputError(result)
+
+	def SetLed(self, page, led, value):
+		"""
+		Sets LED state on a given page
+		Required Arguments:
+		page -- page number
+		led -- ID of LED to change
+		value -- value to set LED (1 = on, 0 = off)
+		"""
+		if logging.root.isEnabledFor(logging.DEBUG):
+			logging.debug("SetLed({}, {}, {})".format(page, led, value))
+		if self.writer:
+			return self.writer.SetLed(page, led, value)
+		if self.device_handle is None:
+			return
+		result = self.direct_output.SetLed(self.device_handle, page, led, value)
+		if result != S_OK:
+			logging.warning("SetLed failed: {}".format(result))
+			self.finish()
+			raise DirectOutputError(result)
+
+
+class X52ProOutputDevice(DirectOutputDevice):
+	class Page(object):
+		WIDTH = MFD_WIDTH
+		LED_COUNT = LED_COUNT
+		ALL_LEDS = (1 << LED_COUNT) - 1
+		LED_COLOURS = LED_COLOURS
+		LED_GROUPS = LED_GROUPS
+
+		def __init__(self, device, page_id, name, active):
+			self.device = device
+			self.page_id = page_id
+			self.name = name
+			self._lines = [str(), str(), str()]
+			# Shadow copy of the lines the device is showing, None where unknown
+			self._shown = [None, None, None]
+			# LED state as bitmasks, bit n is LED n: what the page wants, what the device shows,
+			# which bits of that are known, which LEDs have ever been set and which were set since the last flush
+			self._led_state = 0
+			self._led_shown = 0
+			self._led_known = 0
+			self._led_touched = 0
+			self._led_requested = 0
+			# Text is always folded to the MFD character set, clip cuts lines to the display width
+			# and pad fills them out to it
+			self.clip = False
+			self.pad = False
+			self.marquee = False
+			self._marquee_start = [0, 0, 0]
+			self.lines_sent = 0
+			self.lines_skipped = 0
+			self.leds_sent = 0
+			self.leds_skipped = 0
+			# Open frame() blocks hold back writes until the outermost one ends
+			self._lock = threading.RLock()
+			self._frame_depth = 0
+			self.device.AddPage(self.page_id, name, 1 if active else 0)
+			self.active = active
+
+		def __del__(self, *args, **kwargs):
+			try:
+				self.device.RemovePage(self.page_id)
+			except AttributeError:
+				pass
+
+		def __getitem__(self, key):
+			return self._lines[key]
+
+		def __setitem__(self, key, value):
+			with self._lock:
+				changed = self._lines[key] != value
+				self._lines[key] = value
+				if self.marquee and changed:
+					self._update_marquee(key)
+				if self.active and not self._frame_depth:
+					self._flush_line(key)
+
+		def _update_marquee(self, key):
+			"""
+			Starts scrolling a line from its first frame if it overflows the display, otherwise stops scrolling it
+			"""
+			if self.marquee and len(normalise_text(self._lines[key])) > self.WIDTH:
+				self._marquee_start[key] = self.device.marquee.tick
+				self.device.marquee.add(self, key)
+			elif self.device._marquee:
+				self.device.marquee.discard(self, key)
+
+		def set_layout(self, clip=None, pad=None):
+			"""
+			Changes whether lines are clipped to the display width and padded to it, leaving out an argument keeps its setting
+			"""
+			with self._lock:
+				if clip is not None:
+					self.clip = clip
+				if pad is not None:
+					self.pad = pad
+				if self.active and not self._frame_depth:
+					self.refresh()
+
+		def set_marquee(self, enabled=True):
+			"""
+			Scrolls lines wider than the display when enabled, otherwise they are sent whole
+			"""
+			with self._lock:
+				self.marquee = enabled
+				for lineNo in range(len(self._lines)):
+					self._update_marquee(lineNo)
+				if self.active and not self._frame_depth:
+					self.refresh()
+
+		def set_telemetry(self, feed, render=None):
+			"""
+			Shows the latest values of a TelemetryFeed, sampled by the device's TelemetryTrack and
+			rendered only when they have changed. render turns the values into the lines to show, by
+			default feed.lines(). A feed of None stops sampling.
+			"""
+			if feed is not None:
+				self.device.telemetry.add(self, feed, render or feed.lines)
+			elif self.device._telemetry:
+				self.device.telemetry.discard(self)
+
+		def displayed(self, key):
+			"""
+			Returns the text sent for a line: the line normalised by normalise_text(), or the current
+			marquee frame if it overflows
+			"""
+			value = normalise_text(self._lines[key])
+			if self.marquee and len(value) > self.WIDTH:
+				frames = marquee_frames(value, self.WIDTH)
+				value = frames[(self.device.marquee.tick - self._marquee_start[key]) % len(frames)]
+			if self.clip or self.pad:
+				value = normalise_text(value, self.WIDTH, self.clip, self.pad)
+			return value
+
+		def _flush_line(self, key):
+			"""
+			Sends a line to the device unless the shadow copy shows it is already displayed
+			"""
+			value = self.displayed(key)
+			if self._shown[key] == value:
+				self.lines_skipped += 1
+				return
+			self.device.SetString(self.page_id, key, value)
+			self._shown[key] = value
+			self.lines_sent += 1
+
+		@contextlib.contextmanager
+		def frame(self):
+			"""
+			Collects line and LED changes made inside the with block and sends them
+			as one ordered burst when it ends: lines top to bottom, then LEDs in ID
+			order. Only lines and LEDs whose final value differs from what the device
+			shows are sent. Frames may be nested, the outermost one sends the burst.
+
+				with page.frame():
+					page[0] = "Title"
+					page.fire_a("green")
+			"""
+			with self._lock:
+				self._frame_depth += 1
+				try:
+					yield self
+				finally:
+					self._frame_depth -= 1
+					if not self._frame_depth:
+						self._flush_frame()
+
+		def commit(self, lines=None, leds=None):
+			"""
+			Sets several lines and LEDs and sends them as a single frame
+			Optional Arguments:
+			lines -- sequence of strings for lines 0, 1 and 2, or a dict of line number to string. None entries are left unchanged
+			leds -- dict of LED ID to value
+			"""
+			if isinstance(lines, dict):
+				lines = [lines.get(lineNo) for lineNo in range(len(self._lines))]
+			with self.frame():
+				for lineNo, string in enumerate(lines or ()):
+					if string is not None:
+						self[lineNo] = string
+				for led, value in (leds or {}).items():
+					self.set_led(led, value)
+
+		def _flush_frame(self):
+			if self.active:
+				self.refresh()
+
+		def _flush_leds(self):
+			"""
+			Sends the LEDs whose state differs from what the device shows, found by XOR of the two bitmasks
+			"""
+			requested, self._led_requested = self._led_requested, 0
+			dirty = ((self._led_state ^ self._led_shown) | ~self._led_known) & self._led_touched
+			self.leds_skipped += bin(requested & ~dirty).count("1")
+			while dirty:
+				bit = dirty & -dirty
+				dirty ^= bit
+				self.device.SetLed(self.page_id, bit.bit_length() - 1, 1 if self._led_state & bit else 0)
+				self._led_shown = (self._led_shown & ~bit) | (self._led_state & bit)
+				self._led_known |= bit
+				self.leds_sent += 1
+
+		def dirty_lines(self):
+			"""
+			Returns the line numbers whose text differs from what the device is showing
+			"""
+			return [lineNo for lineNo in range(len(self._lines)) if self._shown[lineNo] != self.displayed(lineNo)]
+
+		def invalidate(self):
+			"""
+			Forgets what the device is showing, so the next refresh resends every line and LED that has been set
+			"""
+			self._shown = [None, None, None]
+			self._led_known = 0
+
+		def replay(self):
+			"""
+			Adds the page again to a device that has been reconnected. The new page starts blank, so
+			only lines that aren't empty and LEDs that are lit are sent, and only if the page is active.
+			"""
+			with self._lock:
+				self.device.AddPage(self.page_id, self.name, 1 if self.active else 0)
+				self._shown = ['', '', '']
+				self._led_shown = 0
+				self._led_known = self.ALL_LEDS
+				if self.active and not self._frame_depth:
+					self.refresh()
+
+		def activate(self):
+			if self.active == True:
+				return
+			self.device.AddPage(self.page_id, self.name, 1)
+
+		def refresh(self):
+			# Send changed strings and LEDs to the display
+			with self._lock:
+				for lineNo in range(len(self._lines)):
+					self._flush_line(lineNo)
+				self._flush_leds()
+
+		@property
+		def leds(self):
+			"""
+			LED state as a bitmask, bit n is LED n
+			"""
+			return self._led_state
+
+		def get_led(self, led):
+			return bool(self._led_state >> led & 1)
+
+		def set_leds(self, mask, bits):
+			"""
+			Sets several LEDs in one state transition. Only LEDs whose state flips are sent.
+			Required Arguments:
+			mask -- bitmask of the LEDs to change, bit n is LED n
+			bits -- bitmask of the new states of those LEDs
+			"""
+			with self._lock:
+				self._led_state = (self._led_state & ~mask) | (bits & mask)
+				self._led_touched |= mask
+				self._led_requested |= mask
+				if self.active and not self._frame_depth:
+					self._flush_leds()
+
+		def set_led(self, led, value):
+			bit = 1 << led
+			self.set_leds(bit, bit if value else 0)
+
+		def set_led_colour(self, value, led_red, led_green):
+			if value not in self.LED_COLOURS:
+				return
+			red, green = self.LED_COLOURS[value]
+			self.set_leds((1 << led_red) | (1 << led_green), (red << led_red) | (green << led_green))
+
+		def fire(self, value):
+			self.set_led(0, value)
+
+		def fire_a(self, value):
+			self.set_led_colour(value, 1, 2)
+
+		def fire_b(self, value):
+			self.set_led_colour(value, 3, 4)
+
+		def fire_d(self, value):
+			self.set_led_colour(value, 5, 6)
+
+		def fire_e(self, value):
+			self.set_led_colour(value, 7, 8)
+
+		def toggle_1_2(self, value):
+			self.set_led_colour(value, 9, 10)
+
+		def toggle_3_4(self, value):
+			self.set_led_colour(value, 11, 12)
+
+		def toggle_5_6(self, value):
+			self.set_led_colour(value, 13, 14)
+
+		def pov_2(self, value):
+			self.set_led_colour(value, 15, 16)
+
+		def clutch(self, value):
+			self.set_led_colour(value, 17, 18)
+
+		def throttle_axis(self, value):
+			self.set_led(19, value)
+
+		def play(self, animation, duration=None):
+			"""
+			Plays an LedAnimation on this page from the device's FrameScheduler. Returns the LedPlayback.
+			Optional Arguments:
+			duration -- seconds to play for, None plays until stopped (or to the end if the animation does not repeat)
+			"""
+			return self.device.scheduler.play(self, animation, duration)
+
+	_scheduler = None
+	_marquee = None
+	_telemetry = None
+
+	def __init__(self, **kwargs):
+		self.pages = {}
+		self._page_counter = 0
+		self._scheduler_lock = threading.Lock()
+		super().__init__(**kwargs)
+
+	@property
+	def scheduler(self):
+		"""
+		FrameScheduler shared by every page of this device, started on first use
+		"""
+		with self._scheduler_lock:
+			if self._scheduler is None:
+				self._scheduler = FrameScheduler()
+			return self._scheduler
+
+	@property
+	def marquee(self):
+		"""
+		MarqueeTrack scrolling the overflowing lines of every marquee page, created on first use
+		"""
+		if self._marquee is None:
+			scheduler = self.scheduler
+			with self._scheduler_lock:
+				if self._marquee is None:
+					self._marquee = MarqueeTrack(scheduler)
+		return self._marquee
+
+	@property
+	def telemetry(self):
+		"""
+		TelemetryTrack sampling the feeds of every telemetry page, created on first use
+		"""
+		if self._telemetry is None:
+			scheduler = self.scheduler
+			with self._scheduler_lock:
+				if self._telemetry is None:
+					self._telemetry = TelemetryTrack(scheduler)
+		return self._telemetry
+
+	def add_page(self, name, active=True):
+		if active:
+			# The DLL doesn't call back when a page is added as the active page
+			for page in self.pages.values():
+				page.active = False
+		page = self.pages[name] = self.Page(self, self._page_counter, name, active=active)
+		self._page_counter += 1
+		return page
+
+	def remove_page(self, name):
+		del self.pages[name]
+
+	def snapshot(self):
+		"""
+		Adds what each page has sent and skipped, and the totals, to DirectOutputDevice.snapshot()
+		"""
+		snapshot = super().snapshot()
+		pages = snapshot['pages'] = {}
+		for name, page in list(self.pages.items()):
+			pages[name] = {
+				'lines_sent': page.lines_sent,
+				'lines_skipped': page.lines_skipped,
+				'leds_sent': page.leds_sent,
+				'leds_skipped': page.leds_skipped,
+			}
+		snapshot['writes_skipped'] = sum(page['lines_skipped'] + page['leds_skipped'] for page in pages.values())
+		if self._scheduler:
+			snapshot['scheduler'] = self._scheduler.stats()
+		return snapshot
+
+	def _reconnect(self, device_handle):
+		"""
+		Replays every page onto the reconnected device from its shadow state, the active page last
+		so it is active again. Holds every page lock, so no page is written to half way through.
+		"""
+		with contextlib.ExitStack() as stack:
+			pages = sorted(self.pages.values(), key=lambda page: page.page_id)
+			for page in pages:
+				stack.enter_context(page._lock)
+			result = super()._reconnect(device_handle)
+			if result != S_OK:
+				return result
+			for page in sorted(pages, key=lambda page: page.active):
+				page.replay()
+		return S_OK
+
+	def _write_failed(self, method, args):
+		"""
+		Forgets what the page of a failed SetString or SetLed is showing in that slot, so the next
+		flush or refresh sends it again
+		"""
+		if method not in ('SetString', 'SetLed'):
+			return
+		page_id, slot = args[0], args[1]
+		for page in list(self.pages.values()):
+			if page.page_id == page_id:
+				if method == 'SetString':
+					page._shown[slot] = None
+				else:
+					page._led_known &= ~(1 << slot)
+
+	def OnPage(self, page_id, activated):
+		for page in self.pages.values():
+			if page.page_id == page_id:
+				logging.debug("Found the page {} {}".format(page_id, activated))
+				if activated:
+					page.active = True
+					page.refresh()
+				else:
+					page.active = False
+				return
+
+	def OnSoftButton(self, *args, **kwargs):
+		logging.debug("*** ON SOFT BUTTON {} {}".format(args, kwargs))
+
+	def finish(self):
+		if self._scheduler:
+			self._scheduler.stop()
+			self._scheduler = None
+			self._marquee = None
+			self._telemetry = None
+		for page in self.pages:
+			del page
+		super().finish()
+
+
+class X52ProDevicePool(object):
+	"""
+		Drives every X52 Pro present from one DirectOutput instance. Each device is a device_class
+		instance with its own handle, pages and callbacks, and with threaded_output its own
+		OutputWriter thread, so a slow device doesn't hold up the others. Devices added later are
+		given the pool's pages, and a device removed and added again is replayed as a single
+		X52ProOutputDevice would be.
+
+			pool = X52ProDevicePool()
+			page = pool.add_page("Status")
+			page[0] = "On every device"
+			pool.device(handle).pages["Status"][1] = "On one device"
+
+		Optional Arguments:
+		direct_output -- DirectOutputBackend to use in place of DirectOutput.dll, e.g. SimulatedDirectOutput
+		threaded_output -- give every device its own OutputWriter thread
+		device_class -- X52ProOutputDevice, or a subclass, to create for each device
+	"""
+	class Page(object):
+		"""
+			A page added to every device of the pool. Lines, frames and any other Page method are
+			fanned out to the page of each device.
+		"""
+		def __init__(self, pool, name, active):
+			self.pool = pool
+			self.name = name
+			self.active = active
+
+		def pages(self):
+			return [device.pages[self.name] for device in self.pool.devices() if self.name in device.pages]
+
+		def __getitem__(self, key):
+			pages = self.pages()
+			return pages[0][key] if pages else ''
+
+		def __setitem__(self, key, value):
+			for page in self.pages():
+				page[key] = value
+
+		@contextlib.contextmanager
+		def frame(self):
+			with contextlib.ExitStack() as stack:
+				for page in self.pages():
+					stack.enter_context(page.frame())
+				yield self
+
+		def __getattr__(self, name):
+			# Only methods of the device pages fan out, anything else is a mistake
+			if name.startswith('_') or not callable(getattr(self.pool.device_class.Page, name, None)):
+				raise AttributeError("{!r} object has no attribute {!r}".format(type(self).__name__, name))
+
+			def fan_out(*args, **kwargs):
+				return [getattr(page, name)(*args, **kwargs) for page in self.pages()]
+			return fan_out
+
+	def __init__(self, debug_level=0, name=None, direct_output=None, threaded_output=True, device_class=None):
+		self.application_name = name or DirectOutputDevice.application_name
+		self.debug_level = debug_level
+		self.threaded_output = threaded_output
+		self.device_class = device_class or X52ProOutputDevice
+		self.direct_output = direct_output if direct_output is not None else DirectOutputDevice._load_direct_output()
+		self._devices = []
+		self._pages = collections.OrderedDict()
+		self._lock = threading.RLock()
+
+		result = self.direct_output.Initialize(self.application_name)
+		if result != S_OK:
+			logging.warning("direct_output.Initialize returned {}".format(result))
+			raise DirectOutputError(result)
+
+		handles = []
+		# Kept so the callbacks stay alive as long as the pool
+		self.onDevice_closure = self._OnDevice
+		self.onEnumerate_closure = lambda hDevice, pvContext: handles.append(hDevice)
+		result = self.direct_output.RegisterDeviceCallback(self.onDevice_closure)
+		if result == S_OK:
+			result = self.direct_output.Enumerate(self.onEnumerate_closure)
+		if result != S_OK:
+			logging.warning("Enumerating devices failed: {}".format(result))
+			self.finish()
+			raise DirectOutputError(result)
+		if not handles:
+			logging.warning("No device handle")
+			self.finish()
+			raise MissingDeviceError()
+		for device_handle in handles:
+			self._add_device(device_handle)
+
+	def _add_device(self, device_handle):
+		device = self.device_class(debug_level=self.debug_level, name=self.application_name,
+			direct_output=self.direct_output, threaded_output=self.threaded_output, device_handle=device_handle)
+		with self._lock:
+			for page in self._pages.values():
+				added = device.add_page(page.name, active=page.active)
+				template = next(iter(page.pages()), None)
+				if template is not None:
+					with added.frame():
+						for lineNo in range(3):
+							added[lineNo] = template[lineNo]
+						added.set_leds(template._led_touched, template.leds)
+			self._devices.append(device)
+		return device
+
+	def _OnDevice(self, hDevice, bAdded, pvContext):
+		"""
+		Routes a device being removed or added to the device it belongs to, creating one for a new device
+		"""
+		logging.info("X52ProDevicePool._OnDevice({}, {})".format(hDevice, bAdded))
+		with self._lock:
+			device = self.device(hDevice)
+			if not bAdded:
+				if device is not None:
+					device._OnDevice(hDevice, False, pvContext)
+				return
+			if device is not None:
+				return
+			removed = next((device for device in self._devices if device.device_handle is None), None)
+		if removed is not None:
+			removed._OnDevice(hDevice, True, pvContext)
+		else:
+			self._add_device(hDevice)
+		self.OnDevice(hDevice, True)
+
+	def OnDevice(self, device_handle, added):
+		"""
+		Method called after a device is added to the pool. This should be overwritten by inheriting class
+		"""
+		logging.info("OnDevice({}, {})".format(device_handle, added))
+
+	def devices(self):
+		"""
+		Returns the devices of the pool, connected or not
+		"""
+		with self._lock:
+			return list(self._devices)
+
+	def device(self, device_handle):
+		"""
+		Returns the device with device_handle, None if there isn't one
+		"""
+		with self._lock:
+			for device in self._devices:
+				if device.device_handle == device_handle:
+					return device
+		return None
+
+	def __len__(self):
+		with self._lock:
+			return len(self._devices)
+
+	def add_page(self, name, active=True):
+		"""
+		Adds a page to every device, and to any device added later. Returns an X52ProDevicePool.Page.
+		"""
+		with self._lock:
+			page = self._pages[name] = self.Page(self, name, active)
+			for device in self._devices:
+				device.add_page(name, active=active)
+		return page
+
+	def remove_page(self, name):
+		with self._lock:
+			del self._pages[name]
+			for device in self._devices:
+				device.remove_page(name)
+
+	def flush(self, timeout=None):
+		"""
+		Blocks until every device has sent its pending output. Returns False if timeout expired first.
+		"""
+		deadline = None if timeout is None else monotonic() + timeout
+		for device in self.devices():
+			if device.writer and not device.writer.flush(None if deadline is None else max(deadline - monotonic(), 0)):
+				return False
+		return True
+
+	def finish(self):
+		"""
+		Finishes every device and de-initializes the DLL. Must be called before program exit
+		"""
+		for device in self.devices():
+			device.finish()
+		with self._lock:
+			self._devices = []
+		if self.direct_output:
+			self.direct_output.Deinitialize()
+			self.direct_output = None
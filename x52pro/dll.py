@@ -0,0 +1,254 @@
+"""
+DLL Mapping classes, bound to DirectOutput.dll with ctypes. Only imported when a device is created
+without a direct_output backend.
+"""
+
+from __future__ import absolute_import, with_statement, print_function, division, unicode_literals
+
+import ctypes
+import ctypes.wintypes
+import logging
+import threading
+
+from .backend import DirectOutputBackend
+
+
+class WideStringBuffer(threading.local):
+	"""
+		Wide character buffer, one per thread, that strings are copied into to pass to the DLL, so
+		writing a string allocates nothing unless it is longer than any string before it
+	"""
+	def __init__(self, size=64):
+		self.buffer = ctypes.create_unicode_buffer(size)
+
+	def __call__(self, string):
+		if len(string) >= len(self.buffer):
+			self.buffer = ctypes.create_unicode_buffer(2 * len(string))
+		self.buffer.value = string
+		return self.buffer
+
+
+class DirectOutput(DirectOutputBackend):
+	def __init__(self, dll_path):
+		"""
+		Creates python object to interact with DirecOutput.dll
+
+		Required Arguments:
+		dll_path -- String containing DirectOutput.dll location.
+
+		"""
+		logging.debug("DirectOutput.__init__")
+		self.DirectOutputDLL = ctypes.WinDLL(dll_path, use_last_error=True)
+
+		# Prototypes from DirectOutput.h, so arguments are converted by ctypes rather than passed as HMODULE
+		handle, dword, context = ctypes.c_void_p, ctypes.wintypes.DWORD, ctypes.c_void_p
+		self.OnDevice_Proto = ctypes.WINFUNCTYPE(None, handle, ctypes.c_bool, context)
+		self.OnEnumerate_Proto = ctypes.WINFUNCTYPE(None, handle, context)
+		self.OnSoftButton_Proto = ctypes.WINFUNCTYPE(None, handle, dword, context)
+		self.OnPage_Proto = ctypes.WINFUNCTYPE(None, handle, dword, ctypes.c_bool, context)
+		prototypes = {
+			'Initialize': [ctypes.c_wchar_p],
+			'Deinitialize': [],
+			'RegisterDeviceCallback': [self.OnDevice_Proto, context],
+			'Enumerate': [self.OnEnumerate_Proto, context],
+			'RegisterSoftButtonCallback': [handle, self.OnSoftButton_Proto, context],
+			'RegisterPageCallback': [handle, self.OnPage_Proto, context],
+			'SetProfile': [handle, dword, ctypes.c_wchar_p],
+			'AddPage': [handle, dword, dword],
+			'RemovePage': [handle, dword],
+			'SetLed': [handle, dword, dword, dword],
+			'SetString': [handle, dword, dword, dword, ctypes.c_wchar_p],
+		}
+		for name, argtypes in prototypes.items():
+			function = getattr(self.DirectOutputDLL, "DirectOutput_" + name)
+			function.argtypes = argtypes
+			function.restype = ctypes.c_long
+		self._SetString = self.DirectOutputDLL.DirectOutput_SetString
+		self._SetLed = self.DirectOutputDLL.DirectOutput_SetLed
+		self._string_buffer = WideStringBuffer()
+
+		# ctypes function pointers handed to the DLL must outlive the call that registered them
+		self.callbacks = {}
+
+	def Initialize(self, application_name):
+		"""
+		Function to call DirectOutput_Initialize
+
+		Required Arguments:
+		application_name -- String representing name of applicaiton - must be unique per-application
+
+		Returns:
+		S_OK: The call completed sucesfully
+		E_OUTOFMEMORY: There was insufficient memory to complete this call.
+		E_INVALIDARG: The argument is invalid
+		E_HANDLE: The DirectOutputManager process could not be found
+
+		"""
+		logging.debug("DirectOutput.Initialize")
+		return self.DirectOutputDLL.DirectOutput_Initialize(application_name)
+
+	def Deinitialize(self):
+		"""
+		Direct function call to DirectOutput_Deinitialize
+
+		Returns:
+		S_OK: The call completed successfully.
+		E_HANDLE:  DirectOutput was not initialized or was already deinitialized.
+		"""
+		logging.debug("DirectOutput.Deinitialize")
+		return self.DirectOutputDLL.DirectOutput_Deinitialize()
+
+	def RegisterDeviceCallback(self, function):
+		"""
+		Registers self.DeviceCallback to be called when devices get registered
+
+		Required Arugments:
+		function -- Function to call when a device registers
+
+		Returns:
+		S_OK: The call completed successfully
+		E_HANDLE: DirectOutput was not initialized.
+
+		"""
+		logging.debug("DirectOutput.RegisterDeviceCallback")
+		self.callbacks['device'] = self.OnDevice_Proto(function)
+		return self.DirectOutputDLL.DirectOutput_RegisterDeviceCallback(self.callbacks['device'], None)
+
+	def Enumerate(self, function):
+		"""
+		Direct call to DirectOutput_Enumerate
+
+		Returns:
+		S_OK: The call completed successfully
+		E_HANDLE: DirectOutput was not initialized.
+
+		"""
+		logging.debug("DirectOutput.Enumerate")
+		self.callbacks['enumerate'] = self.OnEnumerate_Proto(function)
+		return self.DirectOutputDLL.DirectOutput_Enumerate(self.callbacks['enumerate'], None)
+
+	def RegisterSoftButtonCallback(self, device_handle, function):
+		"""
+		Registers a function to be called when a soft button changes
+
+		Required Arugments:
+		device_handle -- ID of device
+		function -- Function to call when a soft button changes
+
+		Returns:
+		S_OK: The call completed successfully.
+		E_HANDLE: The device handle specified is invalid.
+
+		"""
+		logging.debug("DirectOutput.RegisterSoftButtonCallback({}, {})".format(device_handle, function))
+		# Kept per device, as a pool registers every device on this one DirectOutput and the DLL calls back into the thunk
+		callback = self.callbacks[('softbutton', device_handle)] = self.OnSoftButton_Proto(function)
+		return self.DirectOutputDLL.DirectOutput_RegisterSoftButtonCallback(device_handle, callback, None)
+
+	def RegisterPageCallback(self, device_handle, function):
+		"""
+		Registers a function to be called when page changes
+
+		Required Arugments:
+		device_handle -- ID of device
+		function -- Function to call when a page changes
+
+		Returns:
+		S_OK: The call completed successfully.
+		E_HANDLE: The device handle specified is invalid.
+		"""
+		logging.debug("DirectOutput.RegisterPageCallback({}, {})".format(device_handle, function))
+		callback = self.callbacks[('page', device_handle)] = self.OnPage_Proto(function)
+		return self.DirectOutputDLL.DirectOutput_RegisterPageCallback(device_handle, callback, None)
+
+	def SetProfile(self, device_handle, profile):
+		"""
+		Sets the profile used on the device.
+
+		Required Arguments:
+		device_handle -- ID of device
+		profile -- full path of the profile to activate. passing None will clear the profile.
+		"""
+		logging.debug("DirectOutput.SetProfile({}, {})".format(device_handle, profile))
+		if profile:
+			return self.DirectOutputDLL.DirectOutput_SetProfile(device_handle, len(profile), profile)
+		else:
+			return self.DirectOutputDLL.DirectOutput_SetProfile(device_handle, 0, None)
+
+	def AddPage(self, device_handle, page, name, active):
+		"""
+		Adds a page to the MFD
+
+		Required Arguments:
+		device_handle -- ID of device
+		page -- page ID to add
+		name -- String specifying page name
+		active -- True if page is to become the active page, if False this will not change the active page
+
+		Returns:
+		S_OK: The call completed successfully.
+		E_OUTOFMEMORY: Insufficient memory to complete the request.
+		E_INVALIDARG: The dwPage parameter already exists.
+		E_HANDLE: The device handle specified is invalid.
+
+		"""
+		logging.debug("DirectOutput.AddPage({}, {}, {}, {})".format(device_handle, page, name, active))
+		return self.DirectOutputDLL.DirectOutput_AddPage(device_handle, page, active)
+
+	def RemovePage(self, device_handle, page):
+		"""
+		Removes a page from the MFD
+
+		Required Arguments:
+		device_handle -- ID of device
+		page -- page ID to remove
+
+		Returns:
+		S_OK: The call completed successfully.
+		E_INVALIDARG: The dwPage argument does not reference a valid page id.
+		E_HANDLE: The device handle specified is invalid.
+
+		"""
+		logging.debug("DirectOutput.RemovePage({}, {})".format(device_handle, page))
+		return self.DirectOutputDLL.DirectOutput_RemovePage(device_handle, page)
+
+	def SetLed(self, device_handle, page, led, value):
+		"""
+		Sets LED state on a given page
+
+		Required Arguments:
+		device_handle -- ID of device
+		page -- page number
+		led -- ID of LED to change
+		value -- value to set LED (1 = on, 0 = off)
+
+		Returns:
+		S_OK: The call completes successfully.
+		E_INVALIDARG: The dwPage argument does not reference a valid page id, or the dwLed argument does not specifiy a valid LED id.
+		E_HANDLE: The device handle specified is invalid
+
+		"""
+		if logging.root.isEnabledFor(logging.DEBUG):
+			logging.debug("DirectOutput.SetLed({}, {}, {}, {})".format(device_handle, page, led, value))
+		return self._SetLed(device_handle, page, led, value)
+
+	def SetString(self, device_handle, page, line, string):
+		"""
+		Sets a string to display on the MFD
+
+		Required Arguments:
+		device_handle -- ID of device
+		page -- the ID of the page to add the string to
+		line -- the line to display the string on (0 = top, 1 = middle, 2 = bottom)
+		string -- the string to display
+
+		Returns:
+		S_OK: The call completes successfully.
+		E_INVALIDARG: The dwPage argument does not reference a valid page id, or the dwString argument does not reference a valid string id.
+		E_OUTOFMEMORY: Insufficient memory to complete the request.
+		E_HANDLE: The device handle specified is invalid.
+
+		"""
+		if logging.root.isEnabledFor(logging.DEBUG):
+			logging.debug("DirectOutput.SetString({}, {}, {}, {})".format(device_handle, page, line, string))
+		return self._SetString(device_handle, page, line, len(string), self._string_buffer(string))
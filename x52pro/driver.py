@@ -0,0 +1,78 @@
+"""
+Driver classes
+"""
+
+from __future__ import absolute_import, with_statement, print_function, division, unicode_literals
+
+import sys
+from time import sleep
+
+from .device import X52ProOutputDevice
+from .errors import *
+from .scheduler import LedAnimation
+
+
+class DummyMfdDriver(object):
+	def __init__(self):
+		pass
+
+	def finish(self):
+		"""
+			Close down the driver.
+		"""
+		pass
+
+	def display(self, line1, line2="", line3="", delay=None):
+		"""
+			Display data to the MFD.
+			Arguments: 1-3 lines of text plus optional pause in seconds.
+		"""
+		pass
+
+	def attention(self, duration):
+		"""
+			Draw the user's attention.
+		"""
+		print("\a")
+
+
+class X52ProMfdDriver(DummyMfdDriver):
+	def __init__(self, doObj=None):
+		super().__init__()
+		try:
+			if doObj is None:
+				from .mfd import X52ProMfd
+				doObj = X52ProMfd()
+			self.doObj = doObj
+		except MissingDeviceError:
+			print("{}: error: Could not find any X52 Pro devices attached to the system - please ensure your device is connected and drivers are installed.".format(__name__))
+			sys.exit(1)
+		except DLLError as e:
+			print("{}: error#{}: Unable to initialize the Saitek X52 Pro module: {}".format(__name__, e.error_code, e.msg), file=sys.stderr)
+			sys.exit(1)
+
+		self.page = self.doObj.add_page('TD')
+		self.display('TradeDangerous', 'INITIALIZING')
+
+
+	def finish(self):
+		self.doObj.finish()
+
+
+	def display(self, line1, line2="", line3="", delay=None):
+		self.page.commit((line1, line2, line3))
+		if delay:
+			sleep(delay)
+
+	# Every LED but one in four lit, the unlit ones marching along every 20 ms
+	ATTENTION = LedAnimation(
+		X52ProOutputDevice.Page.ALL_LEDS,
+		[sum(1 << ledNo for ledNo in range(X52ProOutputDevice.Page.LED_COUNT) if (iterNo + ledNo) % 4) for iterNo in range(4)],
+		0.02,
+	)
+
+	def attention(self, duration):
+		"""
+			Plays the attention animation for duration seconds without blocking. Returns the LedPlayback.
+		"""
+		return self.page.play(self.ATTENTION, duration)
@@ -0,0 +1,54 @@
+"""
+Errors
+"""
+
+from __future__ import absolute_import, with_statement, print_function, division, unicode_literals
+
+from .constants import *
+
+
+class MissingDeviceError(Exception):
+	"""
+		Throw when no instance of a device cannot be found.
+	"""
+	pass
+
+
+class DLLError(Exception):
+	def __init__(self, error_code):
+		self.error_code = error_code
+		if error_code == 126:
+			self.msg = "specified file does not exist"
+		elif error_code == 193:
+			self.msg = "possible 32/64 bit mismatch between Python interpreter and DLL. Make sure you have installed both the 32- and 64-bit driver from Saitek's website"
+		else:
+			self.msg = "unspecified error"
+
+	def __str__(self):
+		return "Unable to load DirectOutput.dll - " + self.msg
+
+
+class DirectOutputError(Exception):
+	Errors = {
+		E_HANDLE: "Invalid device handle specified.",
+		E_INVALIDARG: "An argument is invalid, and I don't mean it has a poorly leg.",
+		E_OUTOFMEMORY: "Download more RAM.",
+		E_PAGENOTACTIVE: "Page not active, stupid page.",
+		E_BUFFERTOOSMALL: "Buffer used was too small. Use a bigger buffer. See also E_OUTOFMEMORY.",
+		E_NOTIMPL: "Feature not implemented, allegedly"
+	}
+
+	def __init__(self, error_code):
+		self.error_code = error_code
+		if error_code in self.Errors:
+			self.msg = self.Errors[error_code]
+		else:
+			self.msg = "Unspecified DirectOutput Error - " + str(hex(error_code))
+
+	def __str__(self):
+		return self.msg
+
+
+class DeviceNotFoundError(Exception):
+	def __str__(self):
+		return "No Compatible Device Found"
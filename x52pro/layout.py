@@ -0,0 +1,140 @@
+"""
+Text layout for the MFD: character set folding, clipping, word wrapping and marquee frames
+"""
+
+from __future__ import absolute_import, with_statement, print_function, division, unicode_literals
+
+import functools
+import itertools
+import unicodedata
+
+
+class MfdCharset(dict):
+	"""
+		Translation table for str.translate() folding text into the printable ASCII the MFD can show.
+		Accented letters lose their accents, typographic punctuation becomes its ASCII look-alike,
+		whitespace becomes a space, control characters and combining marks are dropped and anything
+		else becomes replacement. Latin-1 and general punctuation are folded up front, any other
+		character the first time it is seen.
+	"""
+	SPECIAL = {
+		"\u2018": "'", "\u2019": "'", "\u201a": "'", "\u201b": "'", "\u2032": "'",
+		"\u201c": '"', "\u201d": '"', "\u201e": '"', "\u2033": '"',
+		"\u2010": "-", "\u2011": "-", "\u2012": "-", "\u2013": "-", "\u2014": "-", "\u2212": "-",
+		"\u2026": "...", "\u2022": "*", "\u00b7": ".", "\u00ab": "<<", "\u00bb": ">>",
+		"\u00d7": "x", "\u00f7": "/", "\u00b0": "o", "\u00df": "ss",
+		"\u00e6": "ae", "\u00c6": "AE", "\u0153": "oe", "\u0152": "OE",
+		"\u00f8": "o", "\u00d8": "O", "\u0111": "d", "\u0110": "D", "\u0142": "l", "\u0141": "L",
+		"\u2190": "<", "\u2192": ">", "\u2191": "^", "\u2193": "v",
+	}
+
+	def __init__(self, replacement="?"):
+		super().__init__()
+		self.replacement = replacement
+		for codepoint in itertools.chain(range(0x300), range(0x2000, 0x2070)):
+			self[codepoint] = self.fold(chr(codepoint))
+
+	def __missing__(self, codepoint):
+		folded = self[codepoint] = self.fold(chr(codepoint))
+		return folded
+
+	def fold(self, character):
+		"""
+		Returns the ASCII for character, None to drop it
+		"""
+		if " " <= character <= "~":
+			return character
+		if character in self.SPECIAL:
+			return self.SPECIAL[character]
+		if character.isspace():
+			return " "
+		category = unicodedata.category(character)
+		if category in ("Cc", "Cf", "Mn", "Me"):
+			return None
+		folded = "".join(c for c in unicodedata.normalize("NFKD", character) if " " <= c <= "~")
+		return folded or self.replacement
+
+
+MFD_CHARSET = MfdCharset()
+
+
+@functools.lru_cache(maxsize=1024)
+def normalise_text(text, width=16, clip=False, pad=False):
+	"""
+	Returns text folded into the MFD character set by MFD_CHARSET, cut to width characters with
+	clip and space padded to width with pad. Results are cached, so showing the same strings
+	again returns the same objects without translating them.
+	"""
+	if not text.isascii() or not text.isprintable():
+		text = text.translate(MFD_CHARSET)
+	if clip:
+		text = text[:width]
+	if pad:
+		text = text.ljust(width)
+	return text
+
+
+@functools.lru_cache(maxsize=4096)
+def wrap_text(text, width=16, hyphenate=False, align='left'):
+	"""
+	Returns a paragraph reflowed into rows no wider than width, as a tuple. Newlines are kept as
+	hard breaks. Words longer than a row are split, and with hyphenate the word that would overflow
+	a row is split with a hyphen where at least two letters fit either side. align pads each row
+	'left', 'right' or 'center'. Results are cached per arguments, so unchanged text is wrapped once.
+	"""
+	rows = []
+	for line in text.split("\n"):
+		row = ""
+		for word in line.split():
+			if row and len(row) + 1 + len(word) <= width:
+				row += " " + word
+				continue
+			if hyphenate and len(word) >= 4:
+				room = width - len(row) - (1 if row else 0) - 1
+				if room >= 2 and len(word) - room >= 2:
+					rows.append((row + " " if row else "") + word[:room] + "-")
+					row, word = "", word[room:]
+			if row:
+				rows.append(row)
+			while len(word) > width:
+				if hyphenate:
+					rows.append(word[:width - 1] + "-")
+					word = word[width - 1:]
+				else:
+					rows.append(word[:width])
+					word = word[width:]
+			row = word
+		rows.append(row)
+	if align == 'right':
+		return tuple(row.rjust(width) for row in rows)
+	if align == 'center':
+		return tuple(row.center(width).rstrip() for row in rows)
+	return tuple(rows)
+
+
+def wrap_lines(lines, width=16, hyphenate=False, align='left'):
+	"""
+	Returns a list of paragraphs reflowed into rows no wider than width. Lines that already fit are
+	kept exactly as they are, so hand laid out lines and separators are unchanged.
+	"""
+	rows = []
+	for line in lines:
+		if len(line) <= width and "\n" not in line:
+			rows.append(line)
+		else:
+			rows.extend(wrap_text(line, width, hyphenate, align))
+	return rows
+
+
+@functools.lru_cache(maxsize=256)
+def marquee_frames(text, width=16, gap="   "):
+	"""
+	Returns the frames of text scrolling left through a window width characters wide, one
+	character per frame, with gap between the end of the text and its start coming round again.
+	Text that fits is its own single frame. Results are cached, so each string is cut up once.
+	"""
+	if len(text) <= width:
+		return (text,)
+	loop = text + gap
+	doubled = loop + loop
+	return tuple(doubled[position:position + width] for position in range(len(loop)))
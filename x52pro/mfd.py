@@ -0,0 +1,657 @@
+"""
+MFD classes
+"""
+
+from __future__ import absolute_import, with_statement, print_function, division, unicode_literals
+
+import collections
+import concurrent.futures
+import contextlib
+import logging
+import os
+import threading
+from time import (monotonic, time)
+
+from .constants import *
+from .device import X52ProOutputDevice
+from .driver import X52ProMfdDriver
+from .layout import wrap_lines
+from .navigation import (JsonFileDataSource, MfdDataSource, SortedIndex, WindowedCache)
+from .scheduler import SoftButtonQueue
+
+
+class X52ProMfd(X52ProOutputDevice):
+	"""
+		MFD showing one page. The first frame is shown as soon as the page is known to accept writes:
+		the driver's first write to it went through, or the device called back to activate it. That
+		is waited for up to READY_TIMEOUT seconds. ready is a concurrent.futures.Future resolved with
+		the MFD once the first frame is shown. With wait_ready=False the constructor returns without
+		waiting, and the first frame is shown from a background thread.
+	"""
+	READY_TIMEOUT = 1.0
+
+	def __init__(self, wait_ready=True, **kwargs):
+		self.ready = concurrent.futures.Future()
+		self._page_activated = threading.Event()
+		super().__init__(**kwargs)
+		self.mfd_driver = X52ProMfdDriver(self)
+		if wait_ready:
+			self._startup()
+		else:
+			threading.Thread(target=self._startup, name="X52ProMfdStartup", daemon=True).start()
+
+	def _startup(self):
+		try:
+			if not self._wait_page_active(self.READY_TIMEOUT):
+				logging.warning("Page not active after {} s, showing the first frame anyway".format(self.READY_TIMEOUT))
+			with getattr(self, '_state_lock', None) or contextlib.nullcontext():
+				self.PageShow()
+		except BaseException as e:
+			self.ready.set_exception(e)
+			raise
+		self.ready.set_result(self)
+
+	def _wait_page_active(self, timeout):
+		"""
+		Returns True once the driver's page accepts writes, False if timeout expired first
+		"""
+		if self.writer:
+			# The driver's first write is queued, the page is active if it reached the DLL without E_PAGENOTACTIVE
+			deadline = monotonic() + timeout
+			if self.writer.flush(timeout) and not self.writer.errors[E_PAGENOTACTIVE]:
+				return True
+			timeout = max(deadline - monotonic(), 0)
+		elif self.mfd_driver.page.lines_sent:
+			# Written directly, which raises unless the page is active
+			return True
+		return self._page_activated.wait(timeout)
+
+	def _OnPage(self, hDevice, dwPage, bActivated, pvContext):
+		mfd_driver = getattr(self, 'mfd_driver', None)
+		if bActivated and (mfd_driver is None or dwPage == mfd_driver.page.page_id):
+			self._page_activated.set()
+		super()._OnPage(hDevice, dwPage, bActivated, pvContext)
+	
+	def display(self, line1, line2="", line3="", delay=None):
+		self.mfd_driver.display(line1, line2, line3, delay)
+
+
+class X52ProActionMfd(X52ProMfd):
+	"""
+		MFD driven by the soft buttons. Button states go through a SoftButtonQueue, so no press is
+		dropped, and holding up or down repeats after REPEAT_DELAY seconds, every REPEAT_INTERVAL
+		seconds, moving by the step of the last (held seconds, step) pair in REPEAT_STEPS reached.
+		Every move made in one step of the queue is applied before the page is rendered once.
+	"""
+	REPEAT_DELAY = 0.4
+	REPEAT_INTERVAL = 0.1
+	REPEAT_STEPS = ((0, 1), (2, 10), (4, 100))
+	soft_buttons = None
+
+	def __init__(self, **kwargs):
+		self.lastinput = self.nowmillis()
+		# Held while handling input or swapping in new data, which may happen on different threads
+		self._state_lock = threading.RLock()
+		super().__init__(**kwargs)
+		self.soft_buttons = SoftButtonQueue(self.scheduler, self._on_button_moves,
+			self.REPEAT_DELAY, self.REPEAT_INTERVAL, self.REPEAT_STEPS)
+
+	def nowmillis(self):
+		millis = int(round(time() * 1000))
+		return millis
+	
+	def addToClipBoard(text):
+		command = 'echo ' + text.strip() + '| clip'
+		os.system(command)
+
+	def OnPage(self, page_id, activated):
+		if page_id == 0 and activated:
+			with self._state_lock:
+				self.PageShow()
+
+	def OnSoftButton(self, *args, **kwargs):
+		self.lastinput = self.nowmillis()
+		if self.soft_buttons:
+			self.soft_buttons.put(args[0].bitmask)
+
+	def _on_button_moves(self, moves):
+		with self._state_lock:
+			for bit, count in moves:
+				for n in range(count):
+					if bit == SOFTBUTTON_SELECT:
+						self.onScrollSelect()
+					elif bit == SOFTBUTTON_UP:
+						self.onScrollUp()
+					elif bit == SOFTBUTTON_DOWN:
+						self.onScrollDown()
+			self.PageShow()
+	
+	def onScrollUp(self):
+		pass
+	
+	def onScrollDown(self):
+		pass
+
+	def onScrollSelect(self):
+		pass
+
+
+class X52ProProfileMfd(X52ProActionMfd):
+	def __init__(self, **kwargs):
+		self.profile = self.update_profile_data()
+		super().__init__(**kwargs)
+		self.update_profile_data()
+
+	def update_profile_data(self):
+		self.profile = ''
+
+	def use_profile_data(self):
+		if self.profile is not None and self.profile.strip() != '':
+			self.SetProfile(os.path.abspath(self.profile))
+
+
+class X52ProDataMfd(X52ProProfileMfd):
+	"""
+		Base for MFDs that show the entries returned by update_mfd_data(). The entries are sorted
+		into a SortedIndex once per data version, when first needed after being assigned, so
+		scrolling and rendering never sort. If update_mfd_data() returns an MfdDataSource, it is
+		read through a WindowedCache instead and nothing is loaded up front.
+
+		start_refresh() polls update_mfd_data() and update_profile_data() on a background thread
+		to bring live data to the MFD.
+	"""
+	refresh_thread = None
+
+	def __init__(self, **kwargs):
+		self.cursor = 0
+		self.entries = self.update_mfd_data()
+		super().__init__(**kwargs)
+
+	def update_mfd_data(self):
+		return []
+
+	@property
+	def entries(self):
+		return self._entries
+
+	@entries.setter
+	def entries(self, entries):
+		self._entries = entries
+		self._index = None
+
+	@property
+	def index(self):
+		"""
+		SortedIndex of the entries (of the keys, if entries is a dict), or a WindowedCache over an MfdDataSource
+		"""
+		if self._index is None:
+			self._index = self._build_index(self._entries)
+		return self._index
+
+	@staticmethod
+	def _build_index(entries):
+		if isinstance(entries, MfdDataSource):
+			return WindowedCache(entries)
+		return SortedIndex(entries)
+
+	def visible_lines(self):
+		"""
+		Returns the three lines PageShow() displays
+		"""
+		if not len(self.index):
+			return "", "", ""
+		above, current, below = self.index.window(self.cursor)
+		return above, "> " + current, below
+
+	def PageShow(self):
+		self.display(*self.visible_lines())
+
+	def mfd_data_fingerprint(self, entries):
+		"""
+		Returns a cheap fingerprint of entries returned by update_mfd_data(), used to skip refreshes
+		that changed nothing. Data sources with a version attribute are fingerprinted by it. None
+		means the entries can't be fingerprinted and are always treated as changed.
+		"""
+		if isinstance(entries, MfdDataSource):
+			return getattr(entries, 'version', None)
+		try:
+			if isinstance(entries, dict):
+				return hash(tuple((key, tuple(value) if isinstance(value, list) else value) for key, value in entries.items()))
+			return hash(tuple(entries))
+		except TypeError:
+			return None
+
+	def start_refresh(self, interval=5.0):
+		"""
+		Starts polling update_mfd_data() and update_profile_data() every interval seconds on a background thread
+		"""
+		if self.refresh_thread:
+			return
+		self._refresh_stop = threading.Event()
+		self._fingerprint = self.mfd_data_fingerprint(self._entries)
+		self.refresh_thread = threading.Thread(target=self._refresh_loop, args=(interval,), name="MfdRefresh", daemon=True)
+		self.refresh_thread.start()
+
+	def stop_refresh(self):
+		if not self.refresh_thread:
+			return
+		self._refresh_stop.set()
+		if threading.current_thread() is not self.refresh_thread:
+			self.refresh_thread.join()
+		self.refresh_thread = None
+
+	def _refresh_loop(self, interval):
+		while not self._refresh_stop.wait(interval):
+			try:
+				self.refresh_mfd_data()
+			except Exception:
+				logging.exception("refresh_mfd_data failed")
+
+	def refresh_mfd_data(self):
+		"""
+		Polls update_mfd_data() and update_profile_data() once. New entries are indexed before taking
+		the state lock, then swapped in with the cursor kept on the same entry. Returns True if the
+		visible lines changed and were re-rendered.
+		"""
+		profile = self.update_profile_data()
+		if profile and profile != self.profile:
+			self.profile = profile
+			self.use_profile_data()
+
+		entries = self.update_mfd_data()
+		fingerprint = self.mfd_data_fingerprint(entries)
+		if fingerprint is not None and fingerprint == getattr(self, '_fingerprint', None):
+			return False
+		index = self._build_index(entries)
+		with self._state_lock:
+			before = self.visible_lines()
+			self._swap_entries(entries, index)
+			self._fingerprint = fingerprint
+			if self.visible_lines() == before:
+				return False
+			self.PageShow()
+			return True
+
+	def _swap_entries(self, entries, index):
+		current = self.index[self.cursor] if len(self.index) else None
+		self._entries, self._index = entries, index
+		self.cursor = self._position_of(current, self.cursor)
+
+	def _position_of(self, entry, fallback):
+		"""
+		Returns the position of entry in the index, or fallback clamped to the index when it has gone
+		"""
+		if entry is not None:
+			try:
+				return self._index.index_of(entry)
+			except ValueError:
+				pass
+		return min(fallback, max(len(self._index) - 1, 0))
+
+	def finish(self):
+		self.stop_refresh()
+		super().finish()
+
+	def add_entry(self, entry, value=None):
+		"""
+		Adds an entry without rebuilding the index, keeping the cursor on the same entry
+		Required Arguments:
+		entry -- entry to add
+		Optional Arguments:
+		value -- value to store under entry, if entries is a dict. An existing key only has its value replaced.
+		"""
+		with self._state_lock:
+			if isinstance(self._entries, dict):
+				known = entry in self._entries
+				self._entries[entry] = value
+				if known:
+					return
+			else:
+				self._entries.append(entry)
+			if self._index is not None:
+				position = self._index.add(entry)
+				if position <= self.cursor and len(self._index) > 1:
+					self.cursor += 1
+
+	def remove_entry(self, entry):
+		"""
+		Removes an entry without rebuilding the index, keeping the cursor on the same entry where possible
+		"""
+		with self._state_lock:
+			if isinstance(self._entries, dict):
+				del self._entries[entry]
+			else:
+				self._entries.remove(entry)
+			if self._index is not None:
+				position = self._index.remove(entry)
+				if position < self.cursor:
+					self.cursor -= 1
+				if self.cursor >= len(self._index):
+					self.cursor = 0
+
+
+class X52ProScrollableMfd(X52ProDataMfd):
+	def onScrollUp(self):
+		if len(self.index):
+			self.cursor = (self.cursor - 1) % len(self.index)
+
+	def onScrollDown(self):
+		if len(self.index):
+			self.cursor = (self.cursor + 1) % len(self.index)
+
+	def onScrollSelect(self):
+		if len(self.index):
+			self.entry = self.index[self.cursor]
+		self.cursor = 0
+
+
+class X52ProPageableMfd(X52ProDataMfd):
+	"""
+		Detail lines wider than the display, or holding newlines, are reflowed into rows by
+		wrap_lines(). Set wrap_width to None to send them as they are, and hyphenate or align
+		to change how they are wrapped. The rows of the last LAYOUT_CACHE_SIZE entries viewed
+		are kept, so scrolling or re-entering a detail view never wraps again.
+	"""
+	wrap_width = X52ProOutputDevice.Page.WIDTH
+	hyphenate = False
+	align = 'left'
+	LAYOUT_CACHE_SIZE = 64
+
+	def __init__(self, **kwargs):
+		self.mode = '0'
+		self.entry = ''
+		self._layouts = collections.OrderedDict()
+		super().__init__(**kwargs)
+
+	def update_mfd_data(self):
+		return {}
+
+	def detail_lines(self, entry):
+		"""
+		Returns the lines shown in the detail view of entry, wrapped to wrap_width
+		"""
+		if isinstance(self.entries, MfdDataSource):
+			lines = self.entries.detail(entry)
+		else:
+			lines = self.entries[entry]
+		if not self.wrap_width:
+			return lines
+		layout = self._layouts.get(entry)
+		if layout is not None and layout[0] is lines:
+			self._layouts.move_to_end(entry)
+			return layout[1]
+		rows = wrap_lines(lines, self.wrap_width, self.hyphenate, self.align)
+		self._layouts[entry] = (lines, rows)
+		if len(self._layouts) > self.LAYOUT_CACHE_SIZE:
+			self._layouts.popitem(last=False)
+		return rows
+
+	def onScrollUp(self):
+		if self.mode == '1':
+			lines = self.detail_lines(self.entry)
+			if len(lines):
+				self.cursor = (self.cursor - 1) % len(lines)
+		elif len(self.index):
+			self.cursor = (self.cursor - 1) % len(self.index)
+
+	def onScrollDown(self):
+		if self.mode == '1':
+			lines = self.detail_lines(self.entry)
+			if len(lines):
+				self.cursor = (self.cursor + 1) % len(lines)
+		elif len(self.index):
+			self.cursor = (self.cursor + 1) % len(self.index)
+
+	def onScrollSelect(self):
+		if self.mode == '1':
+			# if in detail view, switch to system view and focus current system
+			self.cursor = self.index.index_of(self.entry)
+			self.mode = '0'
+		elif len(self.index):
+			# else if main view, switch to detail for selected and jump to line 0
+			self.entry = self.index[self.cursor]
+			self.mode = '1'
+			self.cursor = 0
+
+	def visible_lines(self):
+		if self.mode == '1':
+			lines = self.detail_lines(self.entry)
+			if not len(lines):
+				return "", "", ""
+			cursor = self.cursor
+			#for x in range(-1, 1):
+				#if re.match(r'^-- \d', lines[(cursor + x) % len(lines)]):
+					#addToClipBoard(lines[(cursor + x + 1) % len(lines)])
+			return lines[(cursor + 0) % len(lines)], lines[(cursor + 1) % len(lines)], lines[(cursor + 2) % len(lines)]
+		return super().visible_lines()
+
+	def _swap_entries(self, entries, index):
+		if self.mode != '1':
+			return super()._swap_entries(entries, index)
+		self._entries, self._index = entries, index
+		self._keep_detail()
+
+	def add_entry(self, entry, value=None):
+		with self._state_lock:
+			if self.mode != '1':
+				return super().add_entry(entry, value)
+			# The cursor is on a line of the detail view, not on a position in the overview
+			cursor = self.cursor
+			super().add_entry(entry, value)
+			self.cursor = cursor
+			self._keep_detail()
+
+	def remove_entry(self, entry):
+		with self._state_lock:
+			if self.mode != '1':
+				return super().remove_entry(entry)
+			cursor = self.cursor
+			super().remove_entry(entry)
+			self.cursor = cursor
+			self._keep_detail()
+
+	def _keep_detail(self):
+		"""
+		Keeps the cursor on a line of the detail view after the entries changed, or returns to the
+		overview if the entry shown in detail has gone
+		"""
+		try:
+			lines = self.detail_lines(self.entry)
+		except (KeyError, ValueError, NotImplementedError):
+			lines = None
+		if lines:
+			self.cursor = min(self.cursor, len(lines) - 1)
+		else:
+			self.mode = '0'
+			self.cursor = 0
+
+
+class X52ProJsonMfd(X52ProDataMfd):
+	"""
+		Base for MFDs showing the records of a JSON file, read through a JsonFileDataSource so
+		large route and market dumps open instantly. Set json_path on the class or pass it in.
+		While watch_interval is set the file is polled that often, and records appended to it
+		appear on the MFD without the rest of the file being parsed again.
+
+		Use X52ProJsonScrollableMfd for a list of the records, or X52ProJsonPageableMfd to open
+		their detail lines.
+	"""
+	json_path = None
+	name_key = "name"
+	detail_key = "detail"
+	watch_interval = 1.0
+
+	def __init__(self, json_path=None, **kwargs):
+		if json_path is not None:
+			self.json_path = json_path
+		self.json_source = JsonFileDataSource(self.json_path, name_key=self.name_key, detail_key=self.detail_key)
+		super().__init__(**kwargs)
+		if self.watch_interval:
+			self.start_refresh(self.watch_interval)
+
+	def update_mfd_data(self):
+		# A replaced file comes back as a new source, which refresh_mfd_data() swaps in under the state lock
+		self.json_source = self.json_source.poll()
+		return self.json_source
+
+	def _swap_entries(self, entries, index):
+		previous = self._entries
+		super()._swap_entries(entries, index)
+		if previous is not entries and isinstance(previous, JsonFileDataSource):
+			previous.close()
+
+	def finish(self):
+		super().finish()
+		if self._entries is not self.json_source:
+			self._entries.close()
+		self.json_source.close()
+
+
+class X52ProJsonScrollableMfd(X52ProJsonMfd, X52ProScrollableMfd):
+	pass
+
+
+class X52ProJsonPageableMfd(X52ProJsonMfd, X52ProPageableMfd):
+	pass
+
+
+class X52ProTreeMfd(X52ProProfileMfd):
+	"""
+		MFD navigating a tree of any depth returned by update_mfd_data(). Branches are dicts, whose
+		keys are listed in sorted order; a value may also be a function returning the branch, which
+		is only called when that level is first entered. Leaves are lists of lines, scrolled like
+		the detail view of X52ProPageableMfd, or a single string.
+
+		Select enters the entry under the cursor. Below the top level the first row is "..", and
+		selecting it, or selecting anywhere in a leaf, goes back up to where the cursor was.
+
+			def update_mfd_data(self):
+				return {
+					"Systems": {
+						"Sol": ["Earth", "Mars"],
+						"Achenar": lambda: load_stations("Achenar"),
+					},
+				}
+	"""
+	BACK = ".."
+
+	class Level(object):
+		"""
+			One level of the tree on the navigation stack, with its own cursor. The sorted index of
+			a branch is built when the level is first entered and kept for re-entry.
+		"""
+		def __init__(self, name, node, depth):
+			if callable(node):
+				node = node()
+			self.name = name
+			self.node = node
+			self.cursor = 0
+			self.offset = 1 if depth else 0
+			self.depth = depth
+			self.index = SortedIndex(node) if isinstance(node, dict) else None
+			self.children = {}
+
+		def is_leaf(self):
+			return self.index is None
+
+		def lines(self):
+			return [self.node] if isinstance(self.node, str) else self.node
+
+		def __len__(self):
+			if self.is_leaf():
+				return len(self.lines())
+			return len(self.index) + self.offset
+
+		def row(self, position):
+			if position < self.offset:
+				return X52ProTreeMfd.BACK
+			return self.index[position - self.offset]
+
+		def child(self, key):
+			if key not in self.children:
+				self.children[key] = X52ProTreeMfd.Level(key, self.node[key], self.depth + 1)
+			level = self.children[key]
+			level.cursor = 0
+			return level
+
+		def position_of(self, key):
+			return self.index.index_of(key) + self.offset
+
+	def __init__(self, **kwargs):
+		self.entries = self.update_mfd_data()
+		super().__init__(**kwargs)
+
+	def update_mfd_data(self):
+		return {}
+
+	@property
+	def entries(self):
+		return self._entries
+
+	@entries.setter
+	def entries(self, entries):
+		self._entries = entries
+		self.stack = [self.Level(None, entries, 0)]
+
+	@property
+	def level(self):
+		return self.stack[-1]
+
+	def path(self):
+		"""
+		Returns the names of the levels entered, top first
+		"""
+		return [level.name for level in self.stack[1:]]
+
+	def goto(self, path):
+		"""
+		Enters each name in path from the top level down, finding each by bisection. Raises ValueError if a name isn't found.
+		"""
+		del self.stack[1:]
+		for name in path:
+			level = self.level
+			if level.is_leaf():
+				raise ValueError("{!r} is a leaf".format(level.name))
+			level.cursor = level.position_of(name)
+			self.stack.append(level.child(name))
+
+	def back(self):
+		"""
+		Returns to the level above, with its cursor where it was
+		"""
+		if len(self.stack) > 1:
+			self.stack.pop()
+
+	def onScrollUp(self):
+		level = self.level
+		if len(level):
+			level.cursor = (level.cursor - 1) % len(level)
+
+	def onScrollDown(self):
+		level = self.level
+		if len(level):
+			level.cursor = (level.cursor + 1) % len(level)
+
+	def onScrollSelect(self):
+		level = self.level
+		if level.is_leaf() or level.cursor < level.offset:
+			self.back()
+		elif len(level):
+			self.stack.append(level.child(level.row(level.cursor)))
+
+	def visible_lines(self):
+		"""
+		Returns the three lines PageShow() displays
+		"""
+		level = self.level
+		count = len(level)
+		if not count:
+			return "", "", ""
+		cursor = level.cursor
+		if level.is_leaf():
+			lines = level.lines()
+			return lines[cursor % count], lines[(cursor + 1) % count], lines[(cursor + 2) % count]
+		return level.row((cursor - 1) % count), "> " + level.row(cursor), level.row((cursor + 1) % count)
+
+	def PageShow(self):
+		self.display(*self.visible_lines())
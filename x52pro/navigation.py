@@ -0,0 +1,460 @@
+"""
+Sorted indexes and data sources for navigating entries, independent of any device
+"""
+
+from __future__ import absolute_import, with_statement, print_function, division, unicode_literals
+
+import array
+import bisect
+import codecs
+import json
+import logging
+import os
+import threading
+
+
+class SortedIndex(object):
+	"""
+		Sorted view of a collection of entries. Built once from the entries, then kept sorted by
+		add() and remove() rather than re-sorted; version counts the changes.
+	"""
+	def __init__(self, entries=()):
+		self.version = 0
+		self._items = sorted(entries)
+
+	def __len__(self):
+		return len(self._items)
+
+	def __getitem__(self, position):
+		return self._items[position]
+
+	def __iter__(self):
+		return iter(self._items)
+
+	def index_of(self, entry):
+		"""
+		Returns the position of entry, found by bisection. Raises ValueError if it is not present.
+		"""
+		position = bisect.bisect_left(self._items, entry)
+		if position == len(self._items) or self._items[position] != entry:
+			raise ValueError("{!r} is not in the index".format(entry))
+		return position
+
+	def add(self, entry):
+		"""
+		Inserts entry in sorted position, returns the position
+		"""
+		position = bisect.bisect_right(self._items, entry)
+		self._items.insert(position, entry)
+		self.version += 1
+		return position
+
+	def remove(self, entry):
+		"""
+		Removes entry, returns the position it had
+		"""
+		position = self.index_of(entry)
+		del self._items[position]
+		self.version += 1
+		return position
+
+	def window(self, cursor, before=1, after=1):
+		"""
+		Returns the entries from before the cursor to after it, wrapping around at either end
+		"""
+		count = len(self._items)
+		return [self._items[(cursor + offset) % count] for offset in range(-before, after + 1)]
+
+
+class MfdDataSource(object):
+	"""
+		Entries that are fetched by position when they are about to be shown, instead of being
+		returned up front by update_mfd_data(). Return a data source from update_mfd_data() to open
+		huge lists instantly; the MFD reads it through a WindowedCache around the cursor. Entries
+		are shown in the order the source gives them, they are not sorted.
+
+		Subclasses implement __len__ and fetch(), for example over a database cursor:
+
+			class TradeSource(MfdDataSource):
+				def __len__(self):
+					return db.execute("SELECT COUNT(*) FROM trades").fetchone()[0]
+
+				def fetch(self, start, stop):
+					rows = db.execute("SELECT name FROM trades ORDER BY name LIMIT ? OFFSET ?", (stop - start, start))
+					return [row[0] for row in rows]
+	"""
+	def __len__(self):
+		raise NotImplementedError()
+
+	def fetch(self, start, stop):
+		"""
+		Returns a list of the entries from position start up to, not including, stop
+		"""
+		raise NotImplementedError()
+
+	def index_of(self, entry):
+		"""
+		Returns the position of entry. Sources that can look entries up quickly should override this scan.
+		"""
+		position = 0
+		count = len(self)
+		while position < count:
+			chunk = self.fetch(position, min(position + 1024, count))
+			if entry in chunk:
+				return position + chunk.index(entry)
+			position += len(chunk)
+		raise ValueError("{!r} is not in the data source".format(entry))
+
+	def detail(self, entry):
+		"""
+		Returns the detail lines of an entry, for X52ProPageableMfd
+		"""
+		raise NotImplementedError()
+
+
+class SequenceDataSource(MfdDataSource):
+	"""
+		Data source over a sequence that is already in display order
+	"""
+	def __init__(self, sequence):
+		self.sequence = sequence
+
+	def __len__(self):
+		return len(self.sequence)
+
+	def fetch(self, start, stop):
+		return list(self.sequence[start:stop])
+
+
+class LineFileDataSource(MfdDataSource):
+	"""
+		Data source over the lines of a text file. Opening is instant: the file is scanned on a
+		background thread, recording the offset of every step-th line, and len() counts the lines
+		found so far. Fetching seeks to the nearest recorded offset, so memory stays small no
+		matter how large the file is.
+	"""
+	def __init__(self, path, encoding="utf-8", step=1024):
+		self.path = path
+		self.encoding = encoding
+		self.step = step
+		self.indexed = threading.Event()
+		self._offsets = [0]
+		self._count = 0
+		self._file = open(path, "rb")
+		self._lock = threading.Lock()
+		self._thread = threading.Thread(target=self._scan, name="LineFileDataSource", daemon=True)
+		self._thread.start()
+
+	def _scan(self):
+		with open(self.path, "rb") as f:
+			offset = 0
+			count = 0
+			for line in f:
+				offset += len(line)
+				count += 1
+				if count % self.step == 0:
+					self._offsets.append(offset)
+				self._count = count
+		self.indexed.set()
+
+	def __len__(self):
+		return self._count
+
+	def fetch(self, start, stop):
+		block = start // self.step
+		with self._lock:
+			self._file.seek(self._offsets[block])
+			for skipped in range(start - block * self.step):
+				self._file.readline()
+			return [self._file.readline().decode(self.encoding).rstrip("\r\n") for position in range(start, stop)]
+
+	def close(self):
+		self._file.close()
+
+
+class JsonFileDataSource(MfdDataSource):
+	"""
+		Data source over the records of a JSON file: either a top-level array, or newline delimited
+		JSON with one record per line. Like LineFileDataSource, opening is instant and the file is
+		scanned on a background thread, but every record's offset is kept so fetching seeks straight
+		to it, and records are parsed as they are read instead of the file being json.load()ed whole.
+
+		A record is shown by entry_of(): a string as it is, the name_key field of an object, or the
+		first item of an array. detail_of() gives its detail lines for X52ProPageableMfd: the
+		detail_key field of an object, or else its other fields as "key: value" lines.
+
+		poll() checks the file's modification time and size. Records appended to the file are parsed
+		from where the last scan stopped and added to this source. A file that shrank, was replaced
+		or changed before that point is indexed by a new source, which poll() returns, so entries
+		already being read are never changed under the reader: X52ProDataMfd.refresh_mfd_data()
+		swaps the new source in. version counts the changes. A last line of newline delimited JSON
+		without its newline is taken to be still being written, and is left for the next poll().
+	"""
+	CHUNK_SIZE = 1 << 16
+	SIGNATURE_SIZE = 64
+
+	def __init__(self, path, encoding="utf-8", name_key="name", detail_key="detail"):
+		self.path = path
+		self.encoding = encoding
+		self.name_key = name_key
+		self.detail_key = detail_key
+		self.version = 0
+		self.indexed = threading.Event()
+		self._decoder = json.JSONDecoder()
+		self._lock = threading.Lock()
+		self._detail = None
+		# Offsets of the records, and the position of the first record with each entry's hash
+		self._offsets = array.array('q')
+		self._positions = {}
+		# Records published to readers, counted only once the byte offset their last one ends at is set
+		self._count = 0
+		# Byte offset the next scan starts from, and None until the format is known
+		self._scanned = 0
+		self._array = None
+		self._stat = None
+		self._signature = (b"", b"")
+		self._file = open(path, "rb")
+		self._thread = threading.Thread(target=self._scan_loop, name="JsonFileDataSource", daemon=True)
+		self._thread.start()
+
+	def _scan_loop(self):
+		self._scan()
+		self.version += 1
+		self.indexed.set()
+
+	def _file_stat(self):
+		st = os.stat(self.path)
+		return st.st_ino, st.st_mtime_ns, st.st_size
+
+	def _read_signature(self, f):
+		"""
+		Returns the first bytes of the file and the bytes before where the last scan stopped
+		"""
+		f.seek(0)
+		head = f.read(min(self.SIGNATURE_SIZE, self._scanned))
+		f.seek(max(0, self._scanned - self.SIGNATURE_SIZE))
+		return head, f.read(min(self.SIGNATURE_SIZE, self._scanned))
+
+	def _scan(self):
+		"""
+		Indexes the records from self._scanned to the end of the file
+		"""
+		self._stat = self._file_stat()
+		with open(self.path, "rb") as f:
+			if self._array is None:
+				start = f.read(self.CHUNK_SIZE).lstrip()
+				if not start:
+					return
+				self._array = start.startswith(b"[")
+			if self._array:
+				self._scan_array(f)
+			else:
+				self._scan_lines(f)
+			self._signature = self._read_signature(f)
+
+	def _scan_lines(self, f):
+		f.seek(self._scanned)
+		offset = self._scanned
+		for line in f:
+			if not line.endswith(b"\n"):
+				break
+			if line.strip():
+				try:
+					record = json.loads(line.decode(self.encoding))
+				except ValueError:
+					logging.warning("%s: skipped a line at offset %d that is not JSON", self.path, offset)
+				else:
+					self._add(offset, offset + len(line), record)
+					offset += len(line)
+					continue
+			offset += len(line)
+			self._scanned = offset
+
+	def _scan_array(self, f):
+		decoder = codecs.getincrementaldecoder(self.encoding)()
+		f.seek(self._scanned)
+		# offset is the byte offset of text[position]
+		offset = self._scanned
+		text = ""
+		position = 0
+		opened = self._scanned > 0
+		eof = False
+		while True:
+			while position < len(text) and (text[position] in " \t\r\n," or (text[position] == "[" and not opened)):
+				opened = opened or text[position] == "["
+				position += 1
+				offset += 1
+			if position < len(text) and text[position] == "]":
+				return
+			try:
+				if position == len(text):
+					raise ValueError("need more")
+				record, end = self._decoder.raw_decode(text, position)
+				if end == len(text) and not eof:
+					# A number at the end of the buffer may continue in the next chunk
+					raise ValueError("need more")
+			except ValueError:
+				if eof:
+					return
+				chunk = f.read(self.CHUNK_SIZE)
+				eof = not chunk
+				text = text[position:] + decoder.decode(chunk, final=eof)
+				position = 0
+				continue
+			start = offset
+			offset += len(text[position:end].encode(self.encoding))
+			position = end
+			self._add(start, offset, record)
+
+	def _add(self, offset, end, record):
+		"""
+		Indexes a record from byte offset up to end. It is published by counting it last, so a
+		reader never sees a record whose end isn't known yet.
+		"""
+		self._offsets.append(offset)
+		self._positions.setdefault(hash(self.entry_of(record)), len(self._offsets) - 1)
+		self._scanned = end
+		self._count = len(self._offsets)
+
+	def poll(self):
+		"""
+		Checks the file for changes. Returns the source holding the file's current records: this
+		one, with any appended records added and version incremented, or a new source indexed
+		over a file that was replaced or rewritten.
+		"""
+		if not self.indexed.is_set():
+			return self
+		stat = self._file_stat()
+		if stat == self._stat:
+			return self
+		inode, mtime, size = stat
+		with self._lock:
+			appended = inode == self._stat[0] and size >= self._scanned and self._read_signature(self._file) == self._signature
+		if not appended:
+			source = type(self)(self.path, self.encoding, self.name_key, self.detail_key)
+			source.indexed.wait()
+			# Carries on counting, so the new source never has the fingerprint of this one
+			source.version += self.version
+			return source
+		count = self._count
+		self._scan()
+		if self._count != count:
+			self.version += 1
+		return self
+
+	def __len__(self):
+		return self._count
+
+	def fetch(self, start, stop):
+		return [self.entry_of(record) for record in self.records(start, stop)]
+
+	def records(self, start, stop):
+		"""
+		Returns a list of the parsed records from position start up to, not including, stop
+		"""
+		if start >= stop:
+			return []
+		with self._lock:
+			offsets = self._offsets
+			if stop > self._count:
+				raise IndexError("records {} to {} of {}".format(start, stop, self._count))
+			begin = offsets[start]
+			end = offsets[stop] if stop < len(offsets) else self._scanned
+			self._file.seek(begin)
+			data = self._file.read(end - begin)
+		records = []
+		for position in range(start, stop):
+			record_end = offsets[position + 1] if position + 1 < stop else end
+			text = data[offsets[position] - begin:record_end - begin].decode(self.encoding)
+			records.append(self._decoder.raw_decode(text.lstrip())[0])
+		return records
+
+	def index_of(self, entry):
+		position = self._positions.get(hash(entry))
+		if position is None:
+			raise ValueError("{!r} is not in the data source".format(entry))
+		if self.fetch(position, position + 1) == [entry]:
+			return position
+		# Another entry with the same hash came first
+		return super().index_of(entry)
+
+	def detail(self, entry):
+		"""
+		Returns the detail lines of entry, the same list again while the file is unchanged
+		"""
+		if self._detail is not None and self._detail[:2] == (entry, self.version):
+			return self._detail[2]
+		position = self.index_of(entry)
+		lines = self.detail_of(self.records(position, position + 1)[0])
+		self._detail = (entry, self.version, lines)
+		return lines
+
+	def entry_of(self, record):
+		"""
+		Returns the entry shown for a record
+		"""
+		if isinstance(record, dict):
+			return str(record.get(self.name_key, ""))
+		if isinstance(record, list):
+			return str(record[0]) if record else ""
+		return str(record)
+
+	def detail_of(self, record):
+		"""
+		Returns the detail lines of a record
+		"""
+		if isinstance(record, dict):
+			detail = record.get(self.detail_key)
+			if detail is None:
+				lines = ["{}: {}".format(key, value) for key, value in record.items() if key != self.name_key]
+			elif isinstance(detail, list):
+				lines = [str(line) for line in detail]
+			else:
+				lines = [str(detail)]
+		elif isinstance(record, list):
+			lines = [str(line) for line in record[1:]]
+		else:
+			lines = [str(record)]
+		return lines or [""]
+
+	def close(self):
+		self._file.close()
+
+
+class WindowedCache(object):
+	"""
+		Read-ahead cache over an MfdDataSource, holding only the entries around the last position
+		read. Presents the same interface as SortedIndex, so X52ProDataMfd can use either.
+	"""
+	def __init__(self, source, read_ahead=32):
+		self.source = source
+		self.read_ahead = read_ahead
+		self.fetches = 0
+		self._start = 0
+		self._items = []
+
+	def __len__(self):
+		return len(self.source)
+
+	def __getitem__(self, position):
+		offset = position - self._start
+		if not 0 <= offset < len(self._items):
+			start = max(0, position - self.read_ahead)
+			self._items = self.source.fetch(start, min(len(self.source), position + self.read_ahead + 1))
+			self._start = start
+			self.fetches += 1
+			offset = position - start
+		return self._items[offset]
+
+	def index_of(self, entry):
+		return self.source.index_of(entry)
+
+	def window(self, cursor, before=1, after=1):
+		count = len(self.source)
+		return [self[(cursor + offset) % count] for offset in range(-before, after + 1)]
+
+	def invalidate(self):
+		"""
+		Drops the cached entries, for when the source has changed
+		"""
+		self._items = []
@@ -0,0 +1,479 @@
+"""
+Animation and other tracks stepped by a FrameScheduler
+"""
+
+from __future__ import absolute_import, with_statement, print_function, division, unicode_literals
+
+import heapq
+import itertools
+import logging
+import threading
+import weakref
+from time import (monotonic, thread_time)
+
+from .constants import *
+
+
+class LedAnimation(object):
+	"""
+		LED animation compiled into a keyframe table. Each frame is a bitmask of LED states over the
+		LEDs in mask, shown for interval seconds. Build animations once with the class methods and
+		play them on any number of pages with Page.play():
+
+			BLINK = LedAnimation.blink(["fire_a", "fire_b"], "red")
+			page.play(BLINK, duration=3)
+	"""
+	def __init__(self, mask, frames, interval, repeat=True):
+		"""
+		Required Arguments:
+		mask -- bitmask of the LEDs the animation controls
+		frames -- sequence of LED bitmasks, one per keyframe
+		interval -- seconds each keyframe is shown for
+		Optional Arguments:
+		repeat -- loop the frames, if False the animation ends after the last frame
+		"""
+		self.mask = mask
+		self.frames = tuple(bits & mask for bits in frames)
+		self.interval = interval
+		self.repeat = repeat
+
+	def __len__(self):
+		return len(self.frames)
+
+	@staticmethod
+	def group_bits(groups, colour):
+		"""
+		Returns (mask, bits) for named LED groups shown in colour. Single LED groups are lit by any colour but "off".
+		"""
+		mask, bits = 0, 0
+		for group in groups:
+			leds = LED_GROUPS[group]
+			if len(leds) == 1:
+				components = (0 if colour == "off" else 1,)
+			else:
+				components = LED_COLOURS[colour]
+			for led, on in zip(leds, components):
+				mask |= 1 << led
+				bits |= on << led
+		return mask, bits
+
+	@classmethod
+	def blink(cls, groups, colour="orange", interval=0.5):
+		"""
+		All groups on in colour, then off
+		"""
+		mask, bits = cls.group_bits(groups, colour)
+		return cls(mask, (bits, 0), interval)
+
+	@classmethod
+	def chase(cls, groups, colour="green", interval=0.1):
+		"""
+		One group at a time lit in colour, in the order given
+		"""
+		mask = cls.group_bits(groups, "off")[0]
+		return cls(mask, [cls.group_bits([group], colour)[1] for group in groups], interval)
+
+	@classmethod
+	def pulse(cls, groups, colour="red", period=1.0, duty=0.2, steps=10):
+		"""
+		Groups lit in colour for duty of every period seconds. LEDs are either on or off, so the pulse is a duty cycle over steps keyframes.
+		"""
+		mask, bits = cls.group_bits(groups, colour)
+		lit = max(1, int(round(steps * duty)))
+		return cls(mask, [bits] * lit + [0] * (steps - lit), period / steps)
+
+	@classmethod
+	def colour_cycle(cls, groups, colours=("red", "orange", "green"), interval=0.3):
+		"""
+		Groups shown in each colour in turn
+		"""
+		mask = cls.group_bits(groups, "off")[0]
+		return cls(mask, [cls.group_bits(groups, colour)[1] for colour in colours], interval)
+
+
+class LedPlayback(object):
+	"""
+		An LedAnimation playing on a page, stepped by a FrameScheduler. The frame shown is picked by
+		elapsed time, so a late step skips frames rather than falling behind. When playback ends the
+		LEDs it controlled are put back the way they were.
+	"""
+	def __init__(self, scheduler, page, animation, duration=None):
+		self.scheduler = scheduler
+		self.page = page
+		self.animation = animation
+		self.until = None if duration is None else monotonic() + duration
+		self.started = None
+		self.frames_played = 0
+		self.done = threading.Event()
+		self._index = 0
+		self._stopped = False
+		self._saved = page.leds & animation.mask
+
+	def step(self, due):
+		"""
+		Shows the frame due now. Returns when the next step is due, or None when playback has ended.
+		"""
+		if self.done.is_set():
+			return None
+		if self.started is None:
+			self.started = due
+		animation = self.animation
+		# Never step backwards, the division can round just below a frame boundary
+		index = max(self._index, int((due - self.started) / animation.interval))
+		if self._stopped or (self.until is not None and due >= self.until) or (not animation.repeat and index >= len(animation)):
+			self.page.set_leds(animation.mask, self._saved)
+			self.done.set()
+			return None
+		self.page.set_leds(animation.mask, animation.frames[index % len(animation)])
+		self.frames_played += 1
+		self._index = index + 1
+		next_due = self.started + (index + 1) * animation.interval
+		return next_due if self.until is None else min(next_due, self.until)
+
+	def stop(self):
+		"""
+		Ends playback and restores the LEDs
+		"""
+		self._stopped = True
+		self.scheduler.schedule(self)
+
+	def wait(self, timeout=None):
+		"""
+		Blocks until playback has ended. Returns False if timeout expired first.
+		"""
+		return self.done.wait(timeout)
+
+
+class FrameScheduler(object):
+	"""
+		Steps any number of tracks (objects with a step(due) method returning the next due time from
+		time.monotonic(), or None when finished) from a single thread.
+	"""
+	def __init__(self):
+		self.steps = 0
+		self.cpu_time = 0.0
+		self.started = monotonic()
+		self._queue = []
+		self._sequence = itertools.count()
+		self._condition = threading.Condition()
+		self._running = True
+		self.thread = threading.Thread(target=self._run, name="FrameScheduler", daemon=True)
+		self.thread.start()
+
+	def schedule(self, track, due=None):
+		"""
+		Steps track at due, or as soon as possible. Returns track.
+		"""
+		with self._condition:
+			heapq.heappush(self._queue, (monotonic() if due is None else due, next(self._sequence), track))
+			self._condition.notify()
+		return track
+
+	def play(self, page, animation, duration=None):
+		"""
+		Plays an LedAnimation on page. Returns the LedPlayback.
+		"""
+		return self.schedule(LedPlayback(self, page, animation, duration))
+
+	def _run(self):
+		while True:
+			with self._condition:
+				while self._running:
+					timeout = self._queue[0][0] - monotonic() if self._queue else None
+					if timeout is not None and timeout <= 0:
+						break
+					self._condition.wait(timeout)
+				if not self._running:
+					return
+				due, sequence, track = heapq.heappop(self._queue)
+			cpu = thread_time()
+			try:
+				next_due = track.step(due)
+			except Exception:
+				logging.exception("{} raised in step()".format(track))
+				next_due = None
+			self.cpu_time += thread_time() - cpu
+			self.steps += 1
+			if next_due is not None:
+				self.schedule(track, next_due)
+
+	def stats(self):
+		"""
+		Returns a dict of steps taken, CPU seconds spent stepping and the share of wall time that represents
+		"""
+		elapsed = monotonic() - self.started
+		return {
+			'steps': self.steps,
+			'cpu_time': self.cpu_time,
+			'elapsed': elapsed,
+			'cpu_percent': 100.0 * self.cpu_time / elapsed if elapsed else 0.0,
+		}
+
+	def stop(self):
+		"""
+		Stops the scheduler thread. Tracks still scheduled are dropped.
+		"""
+		with self._condition:
+			self._running = False
+			self._condition.notify()
+		if threading.current_thread() is not self.thread:
+			self.thread.join()
+
+
+class MarqueeTrack(object):
+	"""
+		Scrolls the overflowing lines of marquee pages one character every interval seconds, stepped
+		by a FrameScheduler. Each step sends only the overflowing lines of active pages, so pages
+		that aren't shown cost nothing. Unscheduled while there is nothing to scroll.
+	"""
+	def __init__(self, scheduler, interval=0.3):
+		self.scheduler = scheduler
+		self.interval = interval
+		self.tick = 0
+		self._lines = weakref.WeakKeyDictionary()
+		self._lock = threading.Lock()
+		self._scheduled = False
+
+	def add(self, page, line):
+		with self._lock:
+			self._lines.setdefault(page, set()).add(line)
+			if not self._scheduled:
+				self._scheduled = True
+				self.scheduler.schedule(self, monotonic() + self.interval)
+
+	def discard(self, page, line):
+		with self._lock:
+			lines = self._lines.get(page)
+			if lines:
+				lines.discard(line)
+				if not lines:
+					del self._lines[page]
+
+	def step(self, due):
+		with self._lock:
+			if not self._lines:
+				self._scheduled = False
+				return None
+			self.tick += 1
+			shown = [(page, tuple(lines)) for page, lines in self._lines.items() if page.active]
+		for page, lines in shown:
+			# One page failing mustn't unschedule the track and freeze the marquees on every page
+			try:
+				with page._lock:
+					if page.active and not page._frame_depth:
+						for line in lines:
+							page._flush_line(line)
+			except Exception:
+				logging.exception("Scrolling the marquees on page {} failed".format(page.name))
+		return due + self.interval
+
+
+class TelemetryTrack(object):
+	"""
+		Samples the TelemetryFeed of each telemetry page every interval seconds, stepped by a
+		FrameScheduler. A page is rendered only while it is active and only when its feed's
+		sequence number has changed since the page was last rendered, so a quiet feed or a hidden
+		page costs one read of the sequence number per frame. Unscheduled while no page has a feed.
+	"""
+	def __init__(self, scheduler, interval=0.1):
+		self.scheduler = scheduler
+		self.interval = interval
+		self.samples = 0
+		self.renders = 0
+		# page: [feed, render, sequence number last rendered]
+		self._pages = weakref.WeakKeyDictionary()
+		self._lock = threading.Lock()
+		self._scheduled = False
+
+	def add(self, page, feed, render):
+		with self._lock:
+			self._pages[page] = [feed, render, 0]
+			if not self._scheduled:
+				self._scheduled = True
+				self.scheduler.schedule(self)
+
+	def discard(self, page):
+		with self._lock:
+			self._pages.pop(page, None)
+
+	def step(self, due):
+		with self._lock:
+			if not self._pages:
+				self._scheduled = False
+				return None
+			shown = [(page, sampling) for page, sampling in self._pages.items() if page.active]
+		for page, sampling in shown:
+			feed, render, sequence = sampling
+			self.samples += 1
+			# One page failing mustn't unschedule the track and stop telemetry on every page
+			try:
+				sample = feed.read_changed(sequence)
+				if sample is None:
+					continue
+				# A render that fails is tried again on the next write, not every frame
+				sampling[2] = sample[0]
+				page.commit(render(sample[1]))
+			except Exception:
+				logging.exception("Rendering telemetry on page {} failed".format(page.name))
+				continue
+			self.renders += 1
+		return due + self.interval
+
+
+class CoalescingTrack(object):
+	"""
+		Collects line and LED updates for pages from any thread and applies them in frames,
+		stepped by a FrameScheduler interval seconds after the first update of a frame. An update
+		replaces any pending update to the same slot, a line or an LED of a page, so however fast
+		updates arrive each slot is written at most once a frame, and only if the page's shadow
+		copy shows it changed. Unscheduled while nothing is pending.
+	"""
+	def __init__(self, scheduler, interval=0.02):
+		self.scheduler = scheduler
+		self.interval = interval
+		self.updates = 0
+		self.coalesced = 0
+		self.frames = 0
+		# (page, is_led, slot): value
+		self._pending = {}
+		self._lock = threading.Lock()
+		# Held while a frame is applied, so frames reach the pages in order
+		self._apply_lock = threading.Lock()
+		self._scheduled = False
+
+	def set_line(self, page, line, value):
+		self._put((page, False, line), value)
+
+	def set_led(self, page, led, value):
+		self._put((page, True, led), value)
+
+	def _put(self, key, value):
+		with self._lock:
+			if key in self._pending:
+				self.coalesced += 1
+			self._pending[key] = value
+			self.updates += 1
+			if not self._scheduled:
+				self._scheduled = True
+				self.scheduler.schedule(self, monotonic() + self.interval)
+
+	def discard(self, page):
+		"""
+		Drops the pending updates of page
+		"""
+		with self._lock:
+			for key in [key for key in self._pending if key[0] is page]:
+				del self._pending[key]
+
+	def flush(self):
+		"""
+		Applies the pending updates now, one frame per page. Returns the number applied.
+		"""
+		with self._apply_lock:
+			with self._lock:
+				pending, self._pending = self._pending, {}
+				self._scheduled = False
+			if not pending:
+				return 0
+			pages = {}
+			for (page, is_led, slot), value in pending.items():
+				pages.setdefault(page, []).append((is_led, slot, value))
+			for page, updates in pages.items():
+				with page.frame():
+					for is_led, slot, value in updates:
+						if is_led:
+							page.set_led(slot, value)
+						else:
+							page[slot] = value
+			self.frames += 1
+		return len(pending)
+
+	def step(self, due):
+		self.flush()
+		return None
+
+
+class SoftButtonQueue(object):
+	"""
+		Queue of soft button states, stepped by a FrameScheduler. Each state is compared with the
+		buttons held before it, so every press is seen however quickly it follows the last one. Up and
+		down repeat while held: after repeat_delay seconds, every repeat_interval seconds, moving by the
+		step of the last (held seconds, step) pair in repeat_steps that has been reached. Each step
+		passes handler every move since the last, as a list of (button bit, count), so the handler can
+		apply them all and render once.
+	"""
+	BUTTONS = (SOFTBUTTON_SELECT, SOFTBUTTON_UP, SOFTBUTTON_DOWN)
+	REPEATING = SOFTBUTTON_UP | SOFTBUTTON_DOWN
+
+	def __init__(self, scheduler, handler, repeat_delay=0.4, repeat_interval=0.1, repeat_steps=((0, 1),)):
+		self.scheduler = scheduler
+		self.handler = handler
+		self.repeat_delay = repeat_delay
+		self.repeat_interval = repeat_interval
+		self.repeat_steps = repeat_steps
+		self.held = 0
+		self._pressed_at = {}
+		self._next_repeat = {}
+		self._events = []
+		self._due = None
+		self._lock = threading.Lock()
+
+	def put(self, bitmask):
+		"""
+		Queues the state of the soft buttons, as passed to the soft button callback, and steps as soon as possible
+		"""
+		with self._lock:
+			self._events.append(bitmask)
+			if self._due is None or self._due > monotonic():
+				self._due = monotonic()
+				self.scheduler.schedule(self, self._due)
+
+	def repeat_step(self, held):
+		"""
+		Returns how far a repeat moves once the button has been held for held seconds
+		"""
+		step = 1
+		for after, count in self.repeat_steps:
+			if held >= after:
+				step = count
+		return step
+
+	def step(self, due):
+		with self._lock:
+			if due != self._due:
+				# Superseded by an earlier step scheduled for a new event
+				return None
+			events, self._events = self._events, []
+		now = monotonic()
+		moves = []
+		for bitmask in events:
+			pressed = bitmask & ~self.held
+			released = self.held & ~bitmask
+			self.held = bitmask
+			for bit in self.BUTTONS:
+				if released & bit:
+					self._pressed_at.pop(bit, None)
+					self._next_repeat.pop(bit, None)
+				if pressed & bit:
+					moves.append((bit, 1))
+					if bit & self.REPEATING:
+						self._pressed_at[bit] = now
+						self._next_repeat[bit] = now + self.repeat_delay
+		for bit, at in self._next_repeat.items():
+			if at <= now:
+				moves.append((bit, self.repeat_step(now - self._pressed_at[bit])))
+				self._next_repeat[bit] = max(at + self.repeat_interval, now)
+		if moves:
+			# A handler that raises mustn't unschedule the queue and leave the soft buttons dead
+			try:
+				self.handler(moves)
+			except Exception:
+				logging.exception("Soft button handler failed")
+		with self._lock:
+			if self._events:
+				self._due = monotonic()
+			elif self._next_repeat:
+				self._due = min(self._next_repeat.values())
+			else:
+				self._due = None
+			return self._due
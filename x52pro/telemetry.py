@@ -0,0 +1,162 @@
+"""
+Telemetry feeds shared between processes
+"""
+
+from __future__ import absolute_import, with_statement, print_function, division, unicode_literals
+
+import collections
+import os
+import struct
+
+
+class TelemetryFeed(object):
+	"""
+		Latest values of a fixed set of telemetry fields in shared memory. A producer process
+		writes them as often as it likes, MFD processes sample them at their frame rate: only the
+		newest values matter, so nothing queues up and nothing is sent through a socket or a file.
+
+		The memory holds one record behind a seqlock. write() makes the sequence number odd,
+		writes the values and makes it even again; read() unpacks the values straight out of the
+		shared buffer and retries if the sequence number was odd or changed meanwhile, so a reader
+		never sees half a write and never blocks the producer. There must be one writer per feed.
+
+		fields is a sequence of (name, struct format character) pairs, the same in every process:
+
+			FIELDS = [("altitude", "d"), ("speed", "d"), ("gear", "?")]
+			feed = TelemetryFeed.create("flight", FIELDS)      # in the producer
+			feed.write(1520.0, 212.5, True)
+
+			feed = TelemetryFeed.attach("flight", FIELDS)      # in the MFD process
+			page.set_telemetry(feed, lambda values: ["ALT {:.0f}".format(values.altitude)])
+
+		create() and attach() use multiprocessing.shared_memory. Any other writable buffer of
+		size_of(fields) bytes, such as an mmap of a file, can be passed to the constructor instead.
+	"""
+	MAGIC = b"X52T"
+	LAYOUT_VERSION = 1
+	HEADER = struct.Struct("<4sHI48s")
+	SEQUENCE = struct.Struct("<Q")
+	SEQUENCE_OFFSET = 64
+	PAYLOAD_OFFSET = SEQUENCE_OFFSET + SEQUENCE.size
+	READ_RETRIES = 100
+
+	def __init__(self, buffer, fields, create=False, shared_memory=None):
+		self.fields = tuple(name for name, code in fields)
+		self.format = "<" + "".join(code for name, code in fields)
+		if len(self.format) > 48:
+			raise ValueError("too many fields for a telemetry feed: {}".format(self.format))
+		self.payload = struct.Struct(self.format)
+		self.Values = collections.namedtuple("Values", self.fields)
+		self.shared_memory = shared_memory
+		self._buffer = memoryview(buffer)
+		if len(self._buffer) < self.PAYLOAD_OFFSET + self.payload.size:
+			raise ValueError("buffer of {} bytes is too small for {}".format(len(self._buffer), self.format))
+		if create:
+			self.HEADER.pack_into(self._buffer, 0, self.MAGIC, self.LAYOUT_VERSION, self.payload.size, self.format.encode())
+			self.SEQUENCE.pack_into(self._buffer, self.SEQUENCE_OFFSET, 0)
+		else:
+			magic, version, size, layout = self.HEADER.unpack_from(self._buffer, 0)
+			if magic != self.MAGIC or version != self.LAYOUT_VERSION:
+				raise ValueError("buffer does not hold a telemetry feed")
+			if layout.rstrip(b"\0").decode() != self.format:
+				raise ValueError("telemetry feed has layout {}, not {}".format(layout.rstrip(b"\0").decode(), self.format))
+		# The writer carries on from the sequence number already published, rounded up to even
+		self._sequence = (self.sequence + 1) & ~1
+
+	@classmethod
+	def size_of(cls, fields):
+		"""
+		Returns the bytes a feed of fields needs
+		"""
+		return cls.PAYLOAD_OFFSET + struct.calcsize("<" + "".join(code for name, code in fields))
+
+	@classmethod
+	def create(cls, name, fields):
+		"""
+		Creates a feed in new shared memory called name, or a generated name if name is None
+		"""
+		from multiprocessing import shared_memory
+		memory = shared_memory.SharedMemory(name=name, create=True, size=cls.size_of(fields))
+		return cls(memory.buf, fields, create=True, shared_memory=memory)
+
+	@classmethod
+	def attach(cls, name, fields):
+		"""
+		Opens the feed in the shared memory called name, created by another process
+		"""
+		from multiprocessing import shared_memory
+		try:
+			memory = shared_memory.SharedMemory(name=name, track=False)
+		except TypeError:
+			# Before Python 3.13 the resource tracker would unlink the memory when this process exits
+			memory = shared_memory.SharedMemory(name=name)
+			if os.name == "posix":
+				from multiprocessing import resource_tracker
+				resource_tracker.unregister(memory._name, "shared_memory")
+		return cls(memory.buf, fields, shared_memory=memory)
+
+	@property
+	def name(self):
+		return self.shared_memory.name if self.shared_memory else None
+
+	@property
+	def sequence(self):
+		"""
+		Sequence number of the last write, odd while a write is under way
+		"""
+		return self.SEQUENCE.unpack_from(self._buffer, self.SEQUENCE_OFFSET)[0]
+
+	def write(self, *values):
+		"""
+		Publishes values, one for each field. Returns the new sequence number.
+		"""
+		# Packed before the sequence number is touched, so bad values leave the feed as it was
+		data = self.payload.pack(*values)
+		sequence = self._sequence
+		self.SEQUENCE.pack_into(self._buffer, self.SEQUENCE_OFFSET, sequence + 1)
+		self._buffer[self.PAYLOAD_OFFSET:self.PAYLOAD_OFFSET + len(data)] = data
+		self._sequence = sequence + 2
+		self.SEQUENCE.pack_into(self._buffer, self.SEQUENCE_OFFSET, sequence + 2)
+		return sequence + 2
+
+	def read(self):
+		"""
+		Returns the sequence number and Values of the last write, or None if writes kept
+		overlapping the read for READ_RETRIES attempts
+		"""
+		buffer = self._buffer
+		for attempt in range(self.READ_RETRIES):
+			before = self.SEQUENCE.unpack_from(buffer, self.SEQUENCE_OFFSET)[0]
+			if before & 1:
+				continue
+			values = self.payload.unpack_from(buffer, self.PAYLOAD_OFFSET)
+			if self.SEQUENCE.unpack_from(buffer, self.SEQUENCE_OFFSET)[0] == before:
+				return before, self.Values._make(values)
+		return None
+
+	def read_changed(self, since):
+		"""
+		Returns read() if there has been a write since sequence number since, otherwise None
+		without unpacking the values
+		"""
+		if self.SEQUENCE.unpack_from(self._buffer, self.SEQUENCE_OFFSET)[0] == since:
+			return None
+		return self.read()
+
+	def lines(self, values):
+		"""
+		Default rendering for Page.set_telemetry(): a "name value" line for each of the first three fields
+		"""
+		return ["{} {}".format(name, value) for name, value in zip(self.fields[:3], values)]
+
+	def close(self):
+		self._buffer.release()
+		if self.shared_memory:
+			self.shared_memory.close()
+
+	def unlink(self):
+		"""
+		Frees the shared memory, call once from the process that created the feed
+		"""
+		if self.shared_memory:
+			self.shared_memory.unlink()
@@ -0,0 +1,1251 @@
+"""
+Testing. Uncomment the routines to run at the bottom, then python -m x52pro.testing
+"""
+
+from __future__ import absolute_import, with_statement, print_function, division, unicode_literals
+
+import asyncio
+import contextlib
+import json
+import logging
+import os
+import sys
+import threading
+import tracemalloc
+from time import (monotonic, perf_counter, sleep, time)
+
+from x52pro import *
+from x52pro.layout import (marquee_frames, normalise_text, wrap_text)
+
+
+def test_direct_output_device():
+	# If you want it to go to a file?
+	# logging.basicConfig(filename='directoutput.log', filemode='w', level=logging.DEBUG, format='%(asctime)s %(name)s [%(filename)s:%(lineno)d] %(message)s')
+	# If you want less verbose logging?
+	# logging.basicConfig(level=logging.INFO, format='%(asctime)s %(name)s [%(filename)s:%(lineno)d] %(message)s')
+	logging.basicConfig(level=logging.DEBUG, format='%(asctime)s %(name)s [%(filename)s:%(lineno)d] %(message)s')
+
+	device = DirectOutputDevice(debug_level=1)
+	print("Device initialized")
+
+	device.AddPage(0, "Test", True)
+	print("Test Page added")
+
+	device.SetString(0, 0, "Test String")
+	print("Test String added")
+
+	device.AddPage(1, "Other", False)
+	device.AddPage(2, "Another", False)
+
+	while True:
+		try:
+			time.sleep(1)
+		except:
+			# This is used to catch Ctrl+C, calling finish method is *very* important to de-initalize device.
+			device.finish()
+			sys.exit()
+
+
+def test_x52_pro_output_device():
+	x52 = X52ProOutputDevice(debug_level=1)
+	print("X52 Connected")
+
+	x52.add_page("Page1")
+	print("Page1 page added")
+
+	x52.pages["Page1"][0] = "Test String"
+	try:
+		x52.pages["Page1"][5] = "FAIL"
+		raise ValueError("Your stick thinks it has 5 lines of MFD, I think it lies.")
+	except IndexError:
+		print("Your MFD has the correct number of lines of text")
+
+	x52.pages["Page1"][1] = "-- Page 1 [0]"
+
+	fireToggle = False
+	x52.pages["Page1"].fire(fireToggle)
+	x52.pages["Page1"].fire_a("amber")
+	x52.pages["Page1"].toggle_3_4("red")
+	x52.pages["Page1"].throttle_axis(~fireToggle)
+
+	print("Adding second page")
+	x52.add_page("Page2", active=False)
+	x52.pages["Page2"][0] = "Second Page Is Right Here"
+	x52.pages["Page2"][1] = "-- Page 2 [1]"
+	print("Looping")
+
+	loopNo = 0
+	while True:
+		try:
+			loopNo += 1
+			x52.pages["Page1"][2] = "Loop #" + str(loopNo)
+			sleep(0.25)
+			x52.pages["Page1"].fire_a("red")
+			sleep(0.25)
+			x52.pages["Page1"].fire_a("orange")
+			sleep(0.25)
+			x52.pages["Page1"].fire_a("green")
+			sleep(0.25)
+			x52.pages["Page1"].fire_a("off")
+			fireToggle = ~fireToggle
+			x52.pages["Page1"].fire(fireToggle)
+			x52.pages["Page1"].throttle_axis(~fireToggle)
+		except Exception as e:
+			print(e)
+			x52.finish()
+			sys.exit()
+
+
+def test_page_shadow():
+	direct_output = SimulatedDirectOutput()
+	x52 = X52ProOutputDevice(direct_output=direct_output)
+	page = x52.add_page("Page1")
+
+	page[0] = "Test String"
+	page[0] = "Test String"
+	assert direct_output.calls['SetString'] == 1
+	assert (page.lines_sent, page.lines_skipped) == (1, 1)
+
+	driver = X52ProMfdDriver(x52)
+	driver.display("Line 1", "Line 2", "Line 3")
+	sent = driver.page.lines_sent
+	driver.display("Line 1", "Line 2", "Changed")
+	assert driver.page.lines_sent == sent + 1, "Only the changed line should be resent"
+	assert driver.page.lines_skipped == 2
+
+	# Lines written while the page is inactive are held back until it is shown again
+	direct_output.activate_page(page.page_id)
+	direct_output.wait_idle()
+	driver.display("Line 1", "Hidden", "Changed")
+	assert driver.page.dirty_lines() == [1]
+	sent = direct_output.calls['SetString']
+	direct_output.activate_page(driver.page.page_id)
+	direct_output.wait_idle()
+	assert direct_output.calls['SetString'] == sent + 1
+	assert direct_output.line(driver.page.page_id, 1) == "Hidden"
+	print("Page shadow OK:", dict(direct_output.calls))
+
+
+def test_page_frame(latency=0.002, frames=50):
+	direct_output = SimulatedDirectOutput()
+	x52 = X52ProOutputDevice(direct_output=direct_output)
+	page = x52.add_page("Page1")
+
+	with page.frame():
+		page[0] = "Loading"
+		page[0] = "Loading."
+		page.fire_a("red")
+		page.fire_a("green")
+		assert direct_output.calls['SetString'] == 0, "Nothing is sent until the frame ends"
+		assert page[0] == "Loading."
+	assert direct_output.calls['SetString'] == 3
+	assert direct_output.calls['SetLed'] == 2, "Intermediate LED values are dropped"
+
+	# Throughput of a typical update (a progress line rewritten, one LED blinked) with and without frames
+	direct_output.latency = latency
+	for use_frame in (False, True):
+		direct_output.calls.clear()
+		started = time()
+		for frameNo in range(frames):
+			with page.frame() if use_frame else contextlib.ExitStack():
+				page[2] = "Working"
+				page[2] = "Working #" + str(frameNo)
+				page.fire(True)
+				page.fire(False)
+		elapsed = time() - started
+		print("frame={}: {:.0f} frames/s, {} DLL calls".format(use_frame, frames / elapsed, sum(direct_output.calls.values())))
+
+
+def test_threaded_output(latency=0.03, presses=20):
+	for threaded_output in (False, True):
+		direct_output = SimulatedDirectOutput(latency=latency)
+		x52 = X52ProOutputDevice(direct_output=direct_output, threaded_output=threaded_output)
+		driver = X52ProMfdDriver(x52)
+
+		# What a soft button callback does: redraw the three lines around the cursor
+		worst = 0
+		for cursor in range(presses):
+			started = time()
+			driver.display("Entry " + str(cursor - 1), "> Entry " + str(cursor), "Entry " + str(cursor + 1))
+			worst = max(worst, time() - started)
+		if x52.writer:
+			x52.writer.flush()
+			print("coalesced {} calls".format(x52.writer.calls_coalesced))
+		last = presses - 1
+		assert direct_output.line(driver.page.page_id, 1) == "> Entry " + str(last), "The final state must reach the device"
+		print("threaded_output={}: worst callback {:.1f} ms, {} SetString calls".format(threaded_output, worst * 1000, direct_output.calls['SetString']))
+		x52.finish()
+
+
+def test_failed_write_retried():
+	direct_output = SimulatedDirectOutput()
+	x52 = X52ProOutputDevice(direct_output=direct_output, threaded_output=True)
+	page = x52.add_page("Retry")
+	page.commit(["Title", "Line 1", "Line 2"])
+	x52.writer.flush()
+
+	direct_output.fail('SetString', E_PAGENOTACTIVE)
+	direct_output.fail('SetLed', E_PAGENOTACTIVE)
+	page[0] = "Hello"
+	page.set_led(3, True)
+	x52.writer.flush()
+	assert direct_output.line(page.page_id, 0) == "Title" and not direct_output.leds(page.page_id) & (1 << 3)
+	# The failed writes are no longer taken as shown, so a refresh sends them again
+	assert page.dirty_lines() == [0], page.dirty_lines()
+	page.refresh()
+	x52.writer.flush()
+	assert direct_output.line(page.page_id, 0) == "Hello"
+	assert direct_output.leds(page.page_id) & (1 << 3)
+	assert x52.writer.errors[E_PAGENOTACTIVE] == 2
+	x52.finish()
+	print("Failed write retried OK")
+
+
+def test_async_mfd(latency=0.005, updaters=2000):
+	async def run():
+		direct_output = SimulatedDirectOutput(latency=latency)
+		mfd = await AsyncX52ProMfd.open(direct_output=direct_output)
+		events = mfd.buttons()
+
+		async def updater(n):
+			await mfd.display("Updater", "#" + str(n))
+			await mfd.set_led(n % 20, n % 2)
+
+		started = time()
+		await asyncio.gather(*(updater(n) for n in range(updaters)))
+		print("{} updaters in {:.3f} s, {} DLL calls".format(updaters, time() - started, dict(direct_output.calls)))
+		assert direct_output.line(mfd.page.page_id, 1) == "#" + str(updaters - 1)
+
+		# Soft buttons arrive on a foreign thread and are marshalled into the loop
+		direct_output.press(SOFTBUTTON_SELECT)
+		buttons = await asyncio.wait_for(events.__anext__(), 1)
+		assert buttons.select
+		await events.aclose()
+		await mfd.close()
+
+	asyncio.run(run())
+
+
+def test_led_bitmask():
+	direct_output = SimulatedDirectOutput()
+	x52 = X52ProOutputDevice(direct_output=direct_output)
+	page = x52.add_page("Page1")
+
+	page.fire_a("orange")
+	assert direct_output.calls['SetLed'] == 2
+	page.fire_a("green")
+	assert direct_output.calls['SetLed'] == 3, "Only the red component flips"
+	page.fire_a("green")
+	assert direct_output.calls['SetLed'] == 3 and page.leds_skipped == 3
+	assert page.leds == 0b100 and page.get_led(2)
+
+	# One attention() step flips 10 of the 20 LEDs
+	driver = X52ProMfdDriver(x52)
+	direct_output.calls.clear()
+	driver.attention(0.2).wait()
+	print("attention(0.2): {} SetLed calls for {} LED updates".format(direct_output.calls['SetLed'], driver.page.leds_sent + driver.page.leds_skipped))
+
+
+def test_led_animation(seconds=2.0):
+	direct_output = SimulatedDirectOutput()
+	x52 = X52ProOutputDevice(direct_output=direct_output)
+	page1 = x52.add_page("Page1")
+	page2 = x52.add_page("Page2", active=False)
+	page1.fire_b("green")
+
+	blink = LedAnimation.blink(["fire_a", "fire_b"], "red", 0.25)
+	playbacks = [
+		page1.play(blink, seconds),
+		page1.play(LedAnimation.chase(["toggle_1_2", "toggle_3_4", "toggle_5_6"], "green", 0.1), seconds),
+		page2.play(LedAnimation.pulse(["clutch", "throttle_axis"], "red", 0.5), seconds),
+		page2.play(LedAnimation.colour_cycle(["pov_2"]), seconds),
+	]
+	for playback in playbacks:
+		playback.wait()
+	assert page1.leds & blink.mask == LedAnimation.group_bits(["fire_b"], "green")[1], "LEDs are restored when playback ends"
+
+	stats = x52.scheduler.stats()
+	print("{} animations for {:.1f} s: {} steps, {:.0f} SetLed/s, {:.2f}% CPU".format(
+		len(playbacks), seconds, stats['steps'], direct_output.calls['SetLed'] / stats['elapsed'], stats['cpu_percent']))
+	x52.finish()
+
+
+def test_simulated_direct_output():
+	direct_output = SimulatedDirectOutput()
+	x52 = X52ProOutputDevice(direct_output=direct_output)
+	page = x52.add_page("Page1")
+	x52.add_page("Page2", active=False)
+	page[0] = "Hello"
+	page.fire_a("red")
+	assert direct_output.line(page.page_id, 0) == "Hello"
+	assert direct_output.leds(page.page_id) == 0b10
+
+	# Soft buttons are delivered on the simulator's thread
+	pressed = []
+	x52.OnSoftButton = lambda buttons: pressed.append((buttons.up, threading.current_thread().name))
+	direct_output.press(SOFTBUTTON_UP)
+	direct_output.wait_idle()
+	assert pressed == [(True, "SimulatedDirectOutput")]
+
+	# So is the page callback when removing the active page shows the next one
+	shown = []
+	x52.OnPage = lambda page_id, activated: shown.append((page_id, activated, threading.current_thread().name))
+	other = x52.add_page("Page3", active=False)
+	assert direct_output.RemovePage(x52.device_handle, page.page_id) == S_OK
+	assert direct_output.active_page() == x52.pages["Page2"].page_id
+	direct_output.wait_idle()
+	assert shown == [(x52.pages["Page2"].page_id, True, "SimulatedDirectOutput")], shown
+	del x52.OnPage
+	assert direct_output.AddPage(x52.device_handle, page.page_id, "Page1", True) == S_OK
+	x52.remove_page("Page3")
+	assert direct_output.RemovePage(x52.device_handle, other.page_id) == S_OK
+
+	direct_output.fail('SetString', E_HANDLE)
+	try:
+		page[1] = "Fails"
+		raise AssertionError("SetString should have failed")
+	except DirectOutputError as e:
+		assert e.error_code == E_HANDLE
+	print("Simulated DirectOutput OK:", dict(direct_output.calls))
+
+
+def test_data_source(lines=200000):
+	import tempfile
+	import tracemalloc
+
+	with tempfile.NamedTemporaryFile("w", suffix=".txt", delete=False) as f:
+		for n in range(lines):
+			f.write("Entry {:07d}\n".format(n))
+
+	class FileListMfd(X52ProScrollableMfd):
+		def update_mfd_data(self):
+			return LineFileDataSource(f.name)
+
+	tracemalloc.start()
+	started = time()
+	source = LineFileDataSource(f.name)
+	opened = time() - started
+	source.indexed.wait()
+	cache = WindowedCache(source)
+	for cursor in range(-500, 500):
+		cache.window(cursor % len(cache))
+	assert cache.window(lines - 1) == ["Entry {:07d}".format(n) for n in (lines - 2, lines - 1, 0)]
+	peak = tracemalloc.get_traced_memory()[1]
+	tracemalloc.stop()
+	print("{} lines: opened in {:.1f} ms, 1000 scroll steps with {} fetches, peak {:.0f} KiB".format(lines, opened * 1000, cache.fetches, peak / 1024))
+
+	mfd = FileListMfd(direct_output=SimulatedDirectOutput())
+	mfd.entries.indexed.wait()
+	mfd.onScrollUp()
+	mfd.PageShow()
+	assert mfd.mfd_driver.page[1] == "> Entry {:07d}".format(lines - 1)
+	mfd.entries.close()
+	source.close()
+	mfd.finish()
+	os.unlink(f.name)
+
+
+def test_json_data_source(records=100000):
+	import tempfile
+
+	def record(n):
+		return {"name": "System {:06d}".format(n), "detail": ["Star [K]", "Dist {}ly".format(n), "Trade \u00e9 {}".format(n)]}
+
+	with tempfile.NamedTemporaryFile("w", suffix=".json", encoding="utf-8", delete=False) as f:
+		json.dump([record(n) for n in range(records)], f, indent=1, ensure_ascii=False)
+	with tempfile.NamedTemporaryFile("w", suffix=".ndjson", encoding="utf-8", delete=False) as g:
+		for n in range(records):
+			g.write(json.dumps(record(n), ensure_ascii=False) + "\n")
+
+	for path in (f.name, g.name):
+		started = time()
+		source = JsonFileDataSource(path)
+		opened = time() - started
+		source.indexed.wait()
+		scanned = time() - started
+		assert len(source) == records, len(source)
+		assert source.fetch(records - 2, records) == ["System {:06d}".format(n) for n in (records - 2, records - 1)]
+		assert source.index_of("System {:06d}".format(records // 2)) == records // 2
+		assert source.detail("System 000007") == ["Star [K]", "Dist 7ly", "Trade \u00e9 7"]
+		assert source.detail("System 000007") is source.detail("System 000007")
+		print("{}: {} records opened in {:.1f} ms, indexed in {:.0f} ms".format(os.path.splitext(path)[1], records, opened * 1000, scanned * 1000))
+		source.close()
+
+	# Only the appended tail is parsed, and a line still being written waits for its newline
+	source = JsonFileDataSource(g.name)
+	source.indexed.wait()
+	parsed = []
+	source._add = lambda offset, end, record: (parsed.append(offset), JsonFileDataSource._add(source, offset, end, record))
+	version = source.version
+	assert source.poll() is source and source.version == version
+	with open(g.name, "a", encoding="utf-8") as a:
+		a.write(json.dumps(record(records)) + "\n" + json.dumps(record(records + 1)) + "\n" + '{"name": "Sys')
+	assert source.poll() is source
+	assert len(source) == records + 2 and len(parsed) == 2 and source.version == version + 1
+	with open(g.name, "a", encoding="utf-8") as a:
+		a.write('tem X"}\n')
+	assert source.poll() is source and source.fetch(records + 1, records + 3) == ["System {:06d}".format(records + 1), "System X"]
+	assert len(parsed) == 3
+
+	# A replaced file is indexed by a new source, leaving the old one as it was for whoever is reading it
+	with open(g.name + ".new", "w", encoding="utf-8") as r:
+		r.write("[" + ", ".join(json.dumps(record(n)) for n in range(5)) + "]")
+	os.replace(g.name + ".new", g.name)
+	replaced = source.poll()
+	assert replaced is not source and len(source) == records + 3 and source.fetch(records, records + 1) == ["System {:06d}".format(records)]
+	assert len(replaced) == 5 and replaced.fetch(4, 5) == ["System 000004"] and replaced.version > source.version
+	source.close()
+	# and records appended to an array are found behind its closing bracket
+	source = replaced
+	with open(g.name, "rb+") as a:
+		a.seek(-1, os.SEEK_END)
+		a.write((", " + json.dumps(record(5)) + "]").encode())
+	assert source.poll() is source and len(source) == 6 and source.fetch(5, 6) == ["System 000005"]
+	source.close()
+
+	class JsonRouteMfd(X52ProJsonPageableMfd):
+		watch_interval = 0.01
+
+	mfd = JsonRouteMfd(f.name, direct_output=SimulatedDirectOutput())
+	mfd.json_source.indexed.wait()
+	mfd.onScrollUp()
+	mfd.PageShow()
+	assert mfd.mfd_driver.page[1] == "> System {:06d}".format(records - 1), mfd.mfd_driver.page[:]
+	mfd.onScrollSelect()
+	mfd.PageShow()
+	assert mfd.mfd_driver.page[:] == ["Star [K]", "Dist {}ly".format(records - 1), "Trade \u00e9 {}".format(records - 1)]
+	# A record appended while the detail view is open is picked up by the watcher
+	with open(f.name, "rb+") as a:
+		a.seek(-1, os.SEEK_END)
+		a.write((",\n" + json.dumps(record(records)) + "\n]").encode())
+	deadline = time() + 2
+	while len(mfd.json_source) == records and time() < deadline:
+		sleep(0.01)
+	mfd.onScrollSelect()
+	mfd.onScrollDown()
+	mfd.PageShow()
+	assert mfd.mfd_driver.page[1] == "> System {:06d}".format(records), mfd.mfd_driver.page[:]
+	mfd.finish()
+	os.unlink(f.name)
+	os.unlink(g.name)
+	print("JSON data source OK")
+
+
+def test_json_replace_while_scrolling(replacements=5, records=2000):
+	import tempfile
+
+	def write(path, count):
+		with open(path + ".new", "w", encoding="utf-8") as f:
+			for n in range(count):
+				f.write(json.dumps({"name": "System {:06d}".format(n)}) + "\n")
+		os.replace(path + ".new", path)
+
+	with tempfile.NamedTemporaryFile("w", suffix=".ndjson", delete=False) as f:
+		pass
+	write(f.name, records)
+
+	class ScrollingJsonMfd(X52ProJsonScrollableMfd):
+		watch_interval = 0.005
+
+	errors = []
+
+	class Errors(logging.Handler):
+		def emit(self, record):
+			errors.append(record.getMessage())
+
+	handler = Errors(logging.ERROR)
+	logging.getLogger().addHandler(handler)
+	mfd = ScrollingJsonMfd(f.name, direct_output=SimulatedDirectOutput())
+	mfd.json_source.indexed.wait()
+	stop = threading.Event()
+
+	def scroll():
+		# Far down the list, so a smaller file swapped in under the cursor would be read past its end
+		while not stop.is_set():
+			try:
+				mfd._on_button_moves([(SOFTBUTTON_UP, 3)])
+			except Exception as e:
+				errors.append(repr(e))
+
+	scroller = threading.Thread(target=scroll)
+	scroller.start()
+	try:
+		for replacement in range(replacements):
+			count = records // 10 if replacement % 2 == 0 else records
+			write(f.name, count)
+			deadline = time() + 5
+			while len(mfd.index) != count and time() < deadline:
+				sleep(0.005)
+			assert len(mfd.index) == count, (len(mfd.index), count)
+	finally:
+		stop.set()
+		scroller.join()
+		logging.getLogger().removeHandler(handler)
+	assert not errors, errors[:5]
+	mfd.finish()
+	os.unlink(f.name)
+	print("JSON replace while scrolling OK")
+
+
+def test_live_refresh():
+	class LiveListMfd(X52ProScrollableMfd):
+		data = ["Entry {:03d}".format(n) for n in range(0, 200, 2)]
+
+		def update_mfd_data(self):
+			return list(self.data)
+
+	direct_output = SimulatedDirectOutput()
+	mfd = LiveListMfd(direct_output=direct_output)
+	for step in range(10):
+		mfd.onScrollDown()
+	mfd.PageShow()
+	assert mfd.mfd_driver.page[1] == "> Entry 020"
+
+	sent = direct_output.calls['SetString']
+	assert not mfd.refresh_mfd_data(), "Unchanged data is not swapped in"
+	LiveListMfd.data = LiveListMfd.data + ["Entry 199"]
+	assert not mfd.refresh_mfd_data(), "A change outside the visible lines is not rendered"
+	assert direct_output.calls['SetString'] == sent
+
+	# Entries inserted before the cursor keep it on the same entry, and the new neighbour is rendered
+	mfd.start_refresh(0.01)
+	LiveListMfd.data = LiveListMfd.data + ["Entry 001", "Entry 019"]
+	deadline = time() + 2
+	while mfd.mfd_driver.page[0] != "Entry 019" and time() < deadline:
+		sleep(0.01)
+	assert mfd.mfd_driver.page[:] == ["Entry 019", "> Entry 020", "Entry 022"], mfd.mfd_driver.page[:]
+	assert direct_output.calls['SetString'] == sent + 1
+	mfd.finish()
+	print("Live refresh OK")
+
+
+def test_add_remove_entry():
+	class ListMfd(X52ProScrollableMfd):
+		def update_mfd_data(self):
+			return ["Entry {:03d}".format(n) for n in range(0, 20, 2)]
+
+	class DictMfd(X52ProScrollableMfd):
+		def update_mfd_data(self):
+			return dict(("Entry {:03d}".format(n), n) for n in range(0, 20, 2))
+
+	for cls in (ListMfd, DictMfd):
+		mfd = cls(direct_output=SimulatedDirectOutput())
+		for step in range(3):
+			mfd.onScrollDown()
+		assert mfd.index[mfd.cursor] == "Entry 006"
+
+		# Entries before the cursor move it along, entries after it leave it alone
+		mfd.add_entry("Entry 003", 3)
+		assert (mfd.cursor, mfd.index[mfd.cursor]) == (4, "Entry 006"), mfd.cursor
+		mfd.add_entry("Entry 007", 7)
+		assert (mfd.cursor, mfd.index[mfd.cursor]) == (4, "Entry 006"), mfd.cursor
+		assert list(mfd.index) == sorted(mfd.index) and len(mfd.index) == 12
+
+		mfd.remove_entry("Entry 000")
+		assert (mfd.cursor, mfd.index[mfd.cursor]) == (3, "Entry 006"), mfd.cursor
+		mfd.remove_entry("Entry 018")
+		assert (mfd.cursor, mfd.index[mfd.cursor]) == (3, "Entry 006"), mfd.cursor
+		mfd.remove_entry("Entry 006")
+		assert (mfd.cursor, mfd.index[mfd.cursor]) == (3, "Entry 007"), "The cursor moves onto the next entry"
+
+		# Removing the last entry under the cursor wraps it to the top
+		while mfd.index[mfd.cursor] != "Entry 016":
+			mfd.onScrollDown()
+		mfd.remove_entry("Entry 016")
+		assert mfd.cursor == 0, mfd.cursor
+		mfd.finish()
+
+	# Adding a key a dict already holds replaces its value, the index and cursor stay as they were
+	mfd = DictMfd(direct_output=SimulatedDirectOutput())
+	mfd.onScrollDown()
+	mfd.add_entry("Entry 000", "zero")
+	assert len(mfd.index) == 10 and list(mfd.index).count("Entry 000") == 1
+	assert (mfd.cursor, mfd.index[mfd.cursor]) == (1, "Entry 002"), mfd.cursor
+	assert mfd._entries["Entry 000"] == "zero"
+	mfd.finish()
+
+	# In a detail view the cursor is on a detail line, entries added or removed elsewhere leave it alone
+	class DetailMfd(X52ProPageableMfd):
+		def update_mfd_data(self):
+			return {"b": ["b1", "b2", "b3", "b4"], "c": ["c1"], "e": []}
+
+	mfd = DetailMfd(direct_output=SimulatedDirectOutput())
+	mfd.onScrollSelect()
+	assert mfd.visible_lines() == ("b1", "b2", "b3")
+	mfd.add_entry("a", ["a1"])
+	mfd.remove_entry("c")
+	assert (mfd.mode, mfd.visible_lines()) == ('1', ("b1", "b2", "b3")), mfd.visible_lines()
+	mfd.onScrollSelect()
+	assert (mfd.mode, mfd.index[mfd.cursor]) == ('0', "b")
+
+	# Removing the entry shown in detail returns to the overview
+	mfd.onScrollSelect()
+	mfd.onScrollDown()
+	mfd.remove_entry("b")
+	assert (mfd.mode, mfd.cursor) == ('0', 0)
+	mfd.onScrollSelect()
+	assert (mfd.mode, mfd.entry, mfd.visible_lines()) == ('1', "a", ("a1", "a1", "a1"))
+
+	# An entry without detail lines shows blank lines and scrolls nowhere
+	mfd.onScrollSelect()
+	mfd.onScrollDown()
+	mfd.onScrollSelect()
+	assert (mfd.mode, mfd.entry) == ('1', "e")
+	mfd.onScrollDown()
+	mfd.onScrollUp()
+	assert mfd.visible_lines() == ("", "", "")
+	mfd.finish()
+	print("Add and remove entry OK")
+
+
+def test_tree_mfd():
+	loaded = []
+
+	def load_stations():
+		loaded.append("Achenar")
+		return {"Dawes Hub": ["Pad L", "Refuel"], "Macmillan Port": "No market"}
+
+	class TestTreeMfd(X52ProTreeMfd):
+		def update_mfd_data(self):
+			return {
+				"Systems": {
+					"Sol": {"Earth": ["Abraham Lincoln", "Galileo"], "Mars": ["Daedalus"]},
+					"Achenar": load_stations,
+				},
+				"Settings": ["Volume 5"],
+			}
+
+	mfd = TestTreeMfd(direct_output=SimulatedDirectOutput())
+	assert mfd.visible_lines() == ("Systems", "> Settings", "Systems")
+	mfd.onScrollDown()
+	mfd.onScrollSelect()
+	assert mfd.path() == ["Systems"] and loaded == []
+	assert mfd.visible_lines() == ("Sol", "> ..", "Achenar")
+	mfd.onScrollDown()
+	mfd.onScrollSelect()
+	assert loaded == ["Achenar"], "Lazy children materialise when entered"
+	mfd.onScrollDown()
+	mfd.onScrollDown()
+	mfd.onScrollSelect()
+	assert mfd.visible_lines() == ("No market", "No market", "No market")
+	mfd.onScrollSelect()
+	assert mfd.path() == ["Systems", "Achenar"] and mfd.level.cursor == 2, "Back restores the cursor"
+
+	mfd.goto(["Systems", "Sol", "Earth"])
+	mfd.PageShow()
+	assert mfd.mfd_driver.page[0] == "Abraham Lincoln"
+	mfd.finish()
+	print("Tree MFD OK")
+
+
+def test_word_wrap(paragraphs=2000):
+	document = ["-- Document ----"] + ["Paragraph {} reflowed to the width of the display automatically".format(n) for n in range(paragraphs)]
+
+	class TestWrapMfd(X52ProPageableMfd):
+		def update_mfd_data(self):
+			return {"Document": document, "Short": ["Fits"]}
+
+	mfd = TestWrapMfd(direct_output=SimulatedDirectOutput())
+	mfd.onScrollSelect()
+	started = perf_counter()
+	rows = mfd.detail_lines("Document")
+	first = perf_counter() - started
+	assert rows[0] == "-- Document ----" and all(len(row) <= 16 for row in rows)
+	assert rows[1:5] == ["Paragraph 0", "reflowed to the", "width of the", "display"]
+
+	misses = wrap_text.cache_info().misses
+	mfd.onScrollSelect()
+	mfd.onScrollDown()
+	mfd.onScrollSelect()
+	started = perf_counter()
+	for n in range(100):
+		mfd.onScrollDown()
+		mfd.PageShow()
+	again = (perf_counter() - started) / 100
+	mfd.onScrollSelect()
+	mfd.onScrollUp()
+	mfd.onScrollSelect()
+	assert mfd.detail_lines("Document") is rows, "Re-entering a detail view reuses its layout"
+	mfd.refresh_mfd_data()
+	assert wrap_text.cache_info().misses == misses, "Unchanged text is never wrapped again"
+	print("{} paragraphs into {} rows: first view {:.1f} ms, then {:.3f} ms per scroll".format(paragraphs, len(rows), 1e3 * first, 1e3 * again))
+	mfd.finish()
+
+
+def test_charset(repeats=10000):
+	assert normalise_text("Caf\u00e9 \u201cNo\u00ebl\u201d \u2013 5\u00b0") == 'Cafe "Noel" - 5o'
+	assert normalise_text("Tab\there\u0301\u200b \u4e2d") == "Tab here ?"
+	assert normalise_text("Longer than sixteen", clip=True) == "Longer than sixt"
+	assert normalise_text("Short", pad=True) == "Short" + " " * 11
+
+	direct_output = SimulatedDirectOutput()
+	x52 = X52ProOutputDevice(direct_output=direct_output)
+	page = x52.add_page("Charset")
+	page.set_layout(clip=True, pad=True)
+	page[0] = "\u00c5ngstr\u00f6m \u2192 \u00c6sir, \u0141\u00f3d\u017a"
+	assert direct_output.line(page.page_id, 0) == "Angstrom > AEsir"
+	page[1] = "Fuel"
+	assert direct_output.line(page.page_id, 1) == "Fuel            "
+
+	strings = ["Syst\u00e8me {}".format(n % 50) for n in range(repeats)]
+	for string in strings[:50]:
+		page[2] = string
+	tracemalloc.start()
+	before = tracemalloc.get_traced_memory()[0]
+	for string in strings:
+		page[2] = string
+	after = tracemalloc.get_traced_memory()[0]
+	tracemalloc.stop()
+	assert after - before < 1024, "Repeated strings are served from the cache"
+	print("{} updates cycling 50 strings: {} bytes retained, cache {}".format(repeats, after - before, normalise_text.cache_info()))
+	x52.finish()
+
+
+def test_hotplug():
+	direct_output = SimulatedDirectOutput()
+	x52 = X52ProOutputDevice(direct_output=direct_output)
+	x52.SetProfile("C:\\Profiles\\test.pr0")
+	hidden = x52.add_page("Hidden", active=False)
+	hidden[0] = "Hidden line"
+	page = x52.add_page("Shown")
+	page[0] = "Before"
+	page[2] = "Bottom"
+	page.fire_a("green")
+
+	direct_output.unplug(1)
+	direct_output.wait_idle()
+	assert x52.device_handle is None
+	page[0] = "While unplugged"
+	page[2] = ""
+	page.set_led(0, True)
+
+	direct_output.calls.clear()
+	started = monotonic()
+	direct_output.plug(2)
+	direct_output.wait_idle()
+	elapsed = monotonic() - started
+	assert x52.device_handle == 2 and x52.reconnects == 1
+	assert direct_output.line(page.page_id, 0, device_handle=2) == "While unplugged"
+	assert direct_output.line(page.page_id, 2, device_handle=2) == ""
+	assert direct_output.leds(page.page_id, device_handle=2) == 0b101
+	assert direct_output.active_page(device_handle=2) == page.page_id
+	assert direct_output.profiles[2] == "C:\\Profiles\\test.pr0"
+	assert direct_output.calls['SetString'] == 1 and direct_output.calls['SetLed'] == 2, "Only non-blank lines and lit LEDs are replayed"
+
+	direct_output.activate_page(hidden.page_id, device_handle=2)
+	direct_output.wait_idle()
+	assert direct_output.line(hidden.page_id, 0, device_handle=2) == "Hidden line"
+	print("Reconnected in {:.2f} ms ({:.2f} ms to callback), {} DLL calls".format(1e3 * x52.recovery_time, 1e3 * elapsed, sum(direct_output.calls.values())))
+	x52.finish()
+
+
+def test_device_pool(devices=4, frames=50, latency=0.002):
+	def run(count):
+		direct_output = SimulatedDirectOutput(latency={'SetString': latency}, devices=count)
+		pool = X52ProDevicePool(direct_output=direct_output)
+		page = pool.add_page("Pool")
+		started = monotonic()
+		for frame in range(frames):
+			page[0] = "Frame {}".format(frame)
+			page[1] = "Line {}".format(frame)
+			pool.flush()
+		rate = count * frames * 2 / (monotonic() - started)
+		return direct_output, pool, page, rate
+
+	direct_output, pool, page, single = run(1)
+	pool.finish()
+	direct_output, pool, page, rate = run(devices)
+	print("{} devices: {:.0f} line updates/s, 1 device: {:.0f} line updates/s".format(devices, rate, single))
+	assert rate > single * devices / 2, "Devices are written in parallel"
+	assert all(direct_output.line(0, 0, device_handle=handle) == "Frame {}".format(frames - 1) for handle in range(1, devices + 1))
+
+	pool.device(2).pages["Pool"][2] = "Only on 2"
+	page.fire_a("red")
+	# Only page methods fan out, misspelt names and attributes that aren't methods raise
+	for name in ("fire_z", "lines_sent", "WIDTH"):
+		try:
+			getattr(page, name)
+			raise AssertionError("{} should have raised AttributeError".format(name))
+		except AttributeError:
+			pass
+	direct_output.plug(devices + 1)
+	direct_output.wait_idle()
+	pool.flush()
+	assert len(pool) == devices + 1
+	assert direct_output.line(0, 0, device_handle=devices + 1) == "Frame {}".format(frames - 1), "New devices get the pool's pages"
+	assert direct_output.line(0, 2, device_handle=2) == "Only on 2" and direct_output.line(0, 2, device_handle=1) == ""
+	assert direct_output.leds(0, device_handle=devices + 1) == direct_output.leds(0, device_handle=1) == 0b10
+
+	direct_output.unplug(1)
+	direct_output.wait_idle()
+	page[0] = "Still running"
+	pool.flush()
+	assert direct_output.line(0, 0, device_handle=2) == "Still running"
+	direct_output.plug(1)
+	direct_output.wait_idle()
+	pool.flush()
+	assert len(pool) == devices + 1 and direct_output.line(0, 0, device_handle=1) == "Still running"
+	pool.finish()
+	print("Device pool OK")
+
+
+def test_callback_thunks():
+	import ctypes
+	import gc
+	from x52pro.dll import DirectOutput
+
+	class DirectOutputDLL(object):
+		def __init__(self):
+			self.registered = []
+
+		def __getattr__(self, name):
+			def call(*args):
+				self.registered.append((name,) + args[:2])
+				return S_OK
+			return call
+
+	# The ctypes prototypes of DirectOutput.__init__ without loading the DLL, which needs Windows
+	direct_output = DirectOutput.__new__(DirectOutput)
+	direct_output.callbacks = {}
+	direct_output.DirectOutputDLL = DirectOutputDLL()
+	direct_output.OnSoftButton_Proto = ctypes.CFUNCTYPE(None, ctypes.c_void_p, ctypes.c_ulong, ctypes.c_void_p)
+	direct_output.OnPage_Proto = ctypes.CFUNCTYPE(None, ctypes.c_void_p, ctypes.c_ulong, ctypes.c_bool, ctypes.c_void_p)
+	pressed = []
+	for device_handle in (1, 2):
+		direct_output.RegisterSoftButtonCallback(device_handle, lambda hDevice, dwButtons, pvContext, handle=device_handle: pressed.append(handle))
+		direct_output.RegisterPageCallback(device_handle, lambda hDevice, dwPage, bActivated, pvContext: None)
+	gc.collect()
+	# Every thunk handed to the DLL is still referenced, and still calls its device's function
+	for name, device_handle, thunk in direct_output.DirectOutputDLL.registered:
+		kind = 'softbutton' if name.endswith('SoftButtonCallback') else 'page'
+		assert direct_output.callbacks[(kind, device_handle)] is thunk
+	direct_output.callbacks[('softbutton', 1)](None, 0, None)
+	direct_output.callbacks[('softbutton', 2)](None, 0, None)
+	assert pressed == [1, 2], pressed
+	print("Callback thunks OK")
+
+
+def test_star_import():
+	import __future__
+	import x52pro
+
+	namespace = {}
+	exec("from x52pro import *", namespace)
+	exported = set(namespace) - {'__builtins__'}
+	assert exported == set(x52pro.__all__)
+	assert not [name for name in exported if isinstance(namespace[name], __future__._Feature)], "No __future__ features"
+	assert {'X52ProOutputDevice', 'AsyncX52ProMfd', 'X52ProDisplayDaemon'} <= exported and 'DirectOutput' not in exported
+	print("Star import OK: {} names".format(len(exported)))
+
+
+def test_soft_button_repeat(entries=10000):
+	class TestRepeatMfd(X52ProScrollableMfd):
+		REPEAT_DELAY = 0.1
+		REPEAT_INTERVAL = 0.02
+		REPEAT_STEPS = ((0, 1), (0.2, 10), (0.4, 100))
+
+		def update_mfd_data(self):
+			return ["Entry {:05d}".format(n) for n in range(entries)]
+
+	direct_output = SimulatedDirectOutput()
+	mfd = TestRepeatMfd(direct_output=direct_output)
+	shown = []
+	show = mfd.PageShow
+	mfd.PageShow = lambda: (shown.append(mfd.cursor), show())
+
+	# A double tap within a few milliseconds moves twice
+	for n in range(2):
+		direct_output.press(SOFTBUTTON_DOWN)
+		direct_output.press(0)
+	direct_output.wait_idle()
+	sleep(0.05)
+	assert mfd.cursor == 2, mfd.cursor
+
+	started = monotonic()
+	direct_output.press(SOFTBUTTON_DOWN)
+	direct_output.wait_idle()
+	while mfd.cursor < 2000 and monotonic() - started < 5:
+		sleep(0.01)
+	direct_output.press(0)
+	direct_output.wait_idle()
+	elapsed = monotonic() - started
+	sleep(0.05)
+	cursor = mfd.cursor
+	sleep(0.1)
+	assert mfd.cursor == cursor, "Repeat stops on release"
+	assert shown[-1] == cursor and mfd.mfd_driver.page[1].endswith("{:05d}".format(cursor)), "The display shows the newest cursor"
+	print("Held down for {:.2f} s: cursor at {} after {} renders".format(elapsed, cursor, len(shown)))
+
+	# A handler that raises is logged, and the next presses are still handled
+	failures = []
+	scroll_down = mfd.onScrollDown
+
+	def failing_scroll_down():
+		if not failures:
+			failures.append(mfd.cursor)
+			raise ValueError("scroll failed")
+		scroll_down()
+
+	mfd.onScrollDown = failing_scroll_down
+	logging.disable(logging.ERROR)
+	try:
+		for n in range(4):
+			direct_output.press(SOFTBUTTON_DOWN)
+			direct_output.press(0)
+			direct_output.wait_idle()
+			sleep(0.05)
+	finally:
+		logging.disable(logging.NOTSET)
+	assert failures == [cursor] and mfd.cursor == cursor + 3, (failures, mfd.cursor)
+	mfd.finish()
+
+
+def test_instrumentation(writes=2000):
+	import tempfile
+
+	def run(instrument):
+		direct_output = SimulatedDirectOutput()
+		x52 = X52ProOutputDevice(direct_output=direct_output, instrument=instrument)
+		page = x52.add_page("Instrumented")
+		started = perf_counter()
+		for n in range(writes):
+			page[n % 3] = "Write {}".format(n // 6)
+		return direct_output, x52, page, perf_counter() - started
+
+	direct_output, x52, page, plain = run(False)
+	assert x52.instrumentation is None and x52.snapshot()['writes_skipped'] > 0
+	x52.finish()
+
+	direct_output, x52, page, instrumented = run(True)
+	x52.OnSoftButton = lambda buttons: page.__setitem__(0, "Pressed")
+	direct_output.press(SOFTBUTTON_SELECT)
+	direct_output.wait_idle()
+	direct_output.fail('AddPage', E_INVALIDARG)
+	x52.add_page("Failing", active=False)
+
+	snapshot = x52.snapshot()
+	assert snapshot['latency']['SetString']['count'] == snapshot['calls']['SetString']
+	assert snapshot['errors'] == {'AddPage': {hex(E_INVALIDARG): 1}}
+	assert snapshot['callbacks']['softbutton'] == 1 and snapshot['callback_to_render']['count'] == 1
+	assert snapshot['pages']['Instrumented']['lines_skipped'] == snapshot['writes_skipped']
+
+	with tempfile.TemporaryDirectory() as directory:
+		path = os.path.join(directory, "x52pro.json")
+		x52.start_dump(path, interval=0.05)
+		sleep(0.2)
+		x52.stop_dump()
+		with open(path) as f:
+			assert json.load(f)['calls']['SetString'] == snapshot['calls']['SetString']
+	print("{} writes: {:.1f} ms plain, {:.1f} ms instrumented, SetString p50 {:.1f} us".format(writes, 1e3 * plain, 1e3 * instrumented, 1e6 * snapshot['latency']['SetString']['p50']))
+	x52.finish()
+
+
+def test_ready(starts=10):
+	class TestReadyMfd(X52ProScrollableMfd):
+		def update_mfd_data(self):
+			return ["Entry 1", "Entry 2", "Entry 3"]
+
+	for threaded_output in (False, True):
+		started = monotonic()
+		for n in range(starts):
+			direct_output = SimulatedDirectOutput()
+			mfd = TestReadyMfd(direct_output=direct_output, threaded_output=threaded_output)
+			assert mfd.ready.done() and mfd.ready.result() is mfd
+			if mfd.writer:
+				mfd.writer.flush()
+			assert direct_output.line(0, 1) == "> Entry 1"
+			mfd.finish()
+		print("threaded_output={}: {:.1f} ms to first frame".format(threaded_output, 1e3 * (monotonic() - started) / starts))
+
+	# Not waiting, the page is only shown once the device activates it
+	direct_output = SimulatedDirectOutput()
+	direct_output.fail('SetString', E_PAGENOTACTIVE, count=None)
+	mfd = TestReadyMfd(direct_output=direct_output, threaded_output=True, wait_ready=False)
+	assert not mfd.ready.done()
+	sleep(0.05)
+	assert not mfd.ready.done()
+	other = mfd.add_page("Other", active=False)
+	mfd.writer.flush()
+	direct_output.activate_page(other.page_id)
+	direct_output.wait_idle()
+	assert not mfd.ready.done()
+	direct_output.fail('SetString', E_PAGENOTACTIVE, count=0)
+	direct_output.activate_page(0)
+	assert mfd.ready.result(1) is mfd
+	mfd.writer.flush()
+	assert direct_output.line(0, 1) == "> Entry 1"
+	mfd.finish()
+	print("Ready OK")
+
+
+def test_marquee(seconds=1.0, hidden_pages=50):
+	direct_output = SimulatedDirectOutput()
+	x52 = X52ProOutputDevice(direct_output=direct_output)
+	x52.marquee.interval = 0.05
+	for pageNo in range(hidden_pages):
+		page = x52.add_page("Hidden" + str(pageNo), active=False)
+		page.set_marquee()
+		page[0] = "Hidden page {} holding a long line".format(pageNo)
+	page = x52.add_page("Shown")
+	page.set_marquee()
+	page[0] = "Fits"
+	page[1] = "Entry 1 Entry 1 Entry 1"
+	assert direct_output.line(page.page_id, 1) == "Entry 1 Entry 1 "
+
+	direct_output.calls.clear()
+	sleep(seconds)
+	steps = x52.marquee.tick
+	assert direct_output.calls['SetString'] <= steps, "Only the overflowing line of the active page is sent"
+	assert direct_output.line(page.page_id, 0) == "Fits"
+	assert marquee_frames.cache_info().currsize <= hidden_pages + 1
+	print("{} marquee steps over {} pages: {} SetString calls".format(steps, hidden_pages + 1, direct_output.calls['SetString']))
+
+	# A step that raises is logged, and the marquees keep scrolling
+	failures = []
+	flush_line = page._flush_line
+
+	def failing_flush_line(line):
+		if not failures:
+			failures.append(line)
+			raise IOError("flush failed")
+		flush_line(line)
+
+	page._flush_line = failing_flush_line
+	logging.disable(logging.ERROR)
+	try:
+		deadline = time() + 2
+		while not failures and time() < deadline:
+			sleep(0.01)
+		shown = direct_output.line(page.page_id, 1)
+		deadline = time() + 2
+		while direct_output.line(page.page_id, 1) == shown and time() < deadline:
+			sleep(0.01)
+	finally:
+		logging.disable(logging.NOTSET)
+	assert failures == [1] and direct_output.line(page.page_id, 1) != shown, (failures, shown)
+	x52.finish()
+
+
+def test_display_daemon(clients=8, writes=2000):
+	import tempfile
+	from x52pro.daemon import (EVENT_BUTTONS, RECORD, iter_records, private_directory)
+
+	address = os.path.join(tempfile.mkdtemp(), "x52pro.sock") if os.name != 'nt' else r'\\.\pipe\x52pro-test'
+	direct_output = SimulatedDirectOutput()
+	daemon = X52ProDisplayDaemon(address=address, direct_output=direct_output)
+	connections = [X52ProDisplayClient(address) for n in range(clients)]
+	# Every client numbers its pages from 0, each gets pages of its own on the device
+	pages = [client.add_page("Status", active=n == 0) for n, client in enumerate(connections)]
+	for client in connections:
+		assert client.sync(2)
+	assert len(daemon.device.pages) == clients
+
+	started = time()
+	for n in range(writes):
+		page = pages[n % clients]
+		with page.frame():
+			page[0] = "Write {}".format(n)
+			page.set_led(n % 20, n & 1)
+	for client in connections:
+		assert client.sync(2)
+	elapsed = time() - started
+	stats = daemon.stats()
+	for n, page in enumerate(pages):
+		device_page = daemon.device.pages["{}/0:Status".format(n + 1)]
+		assert device_page[0] == page[0], (device_page[0], page[0])
+	assert stats['coalesced'] > 0 and direct_output.calls['SetString'] < writes, (stats, direct_output.calls)
+	assert direct_output.line(daemon.device.pages["1/0:Status"].page_id, 0) == pages[0][0]
+
+	# Events go to the client owning the page
+	direct_output.activate_page(daemon.device.pages["2/0:Status"].page_id)
+	assert connections[1].poll_event(2) == ('page', pages[1], True)
+	assert connections[0].poll_event(2) == ('page', pages[0], False)
+	direct_output.press(SOFTBUTTON_SELECT)
+	kind, page, buttons = connections[1].poll_event(2)
+	assert (kind, page, buttons.select) == ('buttons', pages[1], True)
+
+	# A page added as the active page hides the active page of another client, which is told
+	connections[2].add_page("Map")
+	assert connections[1].poll_event(2) == ('page', pages[1], False)
+	assert not pages[1].active and connections[2].poll_event(0.1) is None
+	connections[2].remove_page("Map")
+	assert connections[2].sync(2)
+
+	# A client that goes away takes its pages with it
+	connections.pop().close()
+	deadline = time() + 2
+	while len(daemon.device.pages) == clients and time() < deadline:
+		sleep(0.01)
+	assert len(daemon.device.pages) == clients - 1
+	print("Display daemon OK: {} writes from {} clients in {:.1f} ms, {}, {}".format(writes, clients, elapsed * 1000, stats, dict(direct_output.calls)))
+	for client in connections:
+		client.close()
+	daemon.finish()
+
+	# Events for a client that isn't reading are dropped, the callback thread never waits for it
+	class StuckConnection(object):
+		def __init__(self):
+			self.released = threading.Event()
+			self.sent = []
+
+		def send_bytes(self, data):
+			self.released.wait()
+			self.sent.append(bytes(data))
+
+		def close(self):
+			self.released.set()
+
+	connection = StuckConnection()
+	session = X52ProDisplayDaemon.Session(1, connection)
+	events = session.OUTBOX_SIZE * 2
+	started = time()
+	for n in range(events):
+		session.send(EVENT_BUTTONS, n, 0)
+	assert time() - started < 0.5
+	assert 0 < session.dropped <= events - session.OUTBOX_SIZE, session.dropped
+	connection.released.set()
+	deadline = time() + 2
+	while sum(len(data) for data in connection.sent) < (events - session.dropped) * RECORD.size and time() < deadline:
+		sleep(0.01)
+	records = [page for data in connection.sent for op, page, slot, payload in iter_records(data)]
+	assert len(records) == events - session.dropped and records == sorted(records), records
+	session.close()
+
+	# The socket's directory is made for this user alone, and refused once anyone else can use it
+	if os.name != 'nt':
+		path = os.path.join(tempfile.mkdtemp(), "x52pro-user", "x52pro.sock")
+		directory = private_directory(path, create=True)
+		assert os.stat(directory).st_mode & 0o777 == 0o700
+		os.chmod(directory, 0o777)
+		try:
+			private_directory(path)
+			assert False, "A directory others can write to is refused"
+		except OSError:
+			pass
+		os.rmdir(directory)
+
+
+def test_bench_report():
+	import subprocess
+
+	# The report goes to stdout, where nothing else may be printed
+	bench = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "bench.py")
+	result = subprocess.run([sys.executable, bench, "--cases", "daemon", "--sizes", "10", "--budget", "0.05", "--max-ops", "200"],
+		stdout=subprocess.PIPE, universal_newlines=True, check=True)
+	report = json.loads(result.stdout)
+	assert report['results'] and all(result['case'].startswith("daemon") for result in report['results']), report['results']
+	print("Bench report OK: {} daemon cases".format(len(report['results'])))
+
+
+TELEMETRY_FIELDS = [("frame", "q"), ("altitude", "d"), ("check", "q")]
+
+
+def _telemetry_producer(name, seconds, rate):
+	feed = TelemetryFeed.attach(name, TELEMETRY_FIELDS)
+	n = 0
+	stop = monotonic() + seconds
+	while monotonic() < stop:
+		n += 1
+		feed.write(n, n * 0.5, -n)
+		sleep(1 / rate)
+	feed.close()
+
+
+def test_telemetry(seconds=1.0, rate=500):
+	import subprocess
+
+	feed = TelemetryFeed.create(None, TELEMETRY_FIELDS)
+	assert feed.read_changed(0) is None, "Nothing is rendered before the first write"
+	direct_output = SimulatedDirectOutput()
+	x52 = X52ProOutputDevice(direct_output=direct_output)
+	page = x52.add_page("Telemetry")
+	hidden = x52.add_page("Hidden", active=False)
+	page.set_telemetry(feed, lambda values: ["Frame {}".format(values.frame), "ALT {:.1f}".format(values.altitude)])
+	hidden.set_telemetry(feed)
+
+	# A separate program, as a flight telemetry producer would be
+	producer = subprocess.Popen([sys.executable, "-c", "from x52pro.testing import _telemetry_producer; _telemetry_producer({!r}, {}, {})".format(feed.name, seconds, rate)])
+	# Read as fast as possible meanwhile: every snapshot must come from a single write
+	reads = torn = 0
+	while producer.poll() is None:
+		sample = feed.read()
+		if sample is not None:
+			reads += 1
+			frame, altitude, check = sample[1]
+			torn += not (check == -frame and altitude == frame * 0.5)
+	assert producer.returncode == 0
+	sequence, values = feed.read()
+	track = x52.telemetry
+	sleep(3 * track.interval)
+	renders, sent = track.renders, direct_output.calls['SetString']
+	assert page[0] == "Frame {}".format(values.frame), page[:]
+	assert torn == 0, "{} torn reads".format(torn)
+	assert sequence == 2 * values.frame
+	assert renders <= seconds / track.interval + 3, renders
+	assert hidden[0] == "", "Inactive pages are not rendered"
+	sleep(3 * track.interval)
+	assert (track.renders, direct_output.calls['SetString']) == (renders, sent), "A quiet feed renders nothing"
+	print("Telemetry OK: {} writes, {} reads, {} frames rendered from {} samples".format(values.frame, reads, renders, track.samples))
+
+	# A render that raises is logged, and the track keeps sampling every page
+	failures = []
+
+	def render(values):
+		if not failures:
+			failures.append(values.frame)
+			raise ValueError("render failed")
+		return ["Again {}".format(values.frame)]
+
+	logging.disable(logging.ERROR)
+	try:
+		page.set_telemetry(feed, render)
+		feed.write(1, 0.5, -1)
+		deadline = time() + 2
+		while not failures and time() < deadline:
+			sleep(0.01)
+		feed.write(2, 1.0, -2)
+		deadline = time() + 2
+		while page[0] != "Again 2" and time() < deadline:
+			sleep(0.01)
+	finally:
+		logging.disable(logging.NOTSET)
+	assert failures == [1] and page[0] == "Again 2", (failures, page[:])
+
+	hidden.set_telemetry(None)
+	page.set_telemetry(None)
+	x52.finish()
+	feed.close()
+	feed.unlink()
+
+
+if __name__ == '__main__':
+	# test_direct_output_device()
+	# test_x52_pro_output_device()
+	# test_page_shadow()
+	# test_page_frame()
+	# test_threaded_output()
+	# test_failed_write_retried()
+	# test_async_mfd()
+	# test_led_bitmask()
+	# test_led_animation()
+	# test_simulated_direct_output()
+	# test_data_source()
+	# test_json_data_source()
+	# test_json_replace_while_scrolling()
+	# test_live_refresh()
+	# test_add_remove_entry()
+	# test_tree_mfd()
+	# test_marquee()
+	# test_word_wrap()
+	# test_charset()
+	# test_hotplug()
+	# test_device_pool()
+	# test_callback_thunks()
+	# test_star_import()
+	# test_soft_button_repeat()
+	# test_instrumentation()
+	# test_ready()
+	# test_telemetry()
+	# test_display_daemon()
+	# test_bench_report()
+	pass